@@ -0,0 +1,97 @@
+import datetime
+import os
+import time
+import config
+import job_ledger
+
+
+def _expiry_of(video_file):
+    """Returns the file's expiry as a Unix timestamp, estimated if the server did not report one."""
+    expiration = getattr(video_file, "expiration_time", None)
+    if isinstance(expiration, datetime.datetime):
+        if expiration.tzinfo is None:
+            expiration = expiration.replace(tzinfo=datetime.timezone.utc)
+        return expiration.timestamp()
+    return time.time() + config.AI_FILE_TTL_HOURS * 3600
+
+
+class AIFileStore(object):
+    """
+    Remembers which file on the AI service holds each uploaded video, so a
+    retry or a second prompt can use the server copy instead of uploading the
+    video again.
+
+    The file is recorded on the video's job in the job ledger, which is the
+    only record of it; without the ledger (config.USE_JOB_LEDGER off) nothing
+    is remembered. An upload is only reused while the video's size and
+    modification time are unchanged and the server copy has not expired.
+    """
+    def __init__(self, ledger):
+        self.ledger = ledger
+
+    def get(self, video_path):
+        """Returns the server-side file name for the video, or None if there is no usable upload."""
+        if self.ledger is None:
+            return None
+        job = self.ledger.get(video_path, os.stat(video_path))
+        if job is None or not job["ai_file"]:
+            return None
+        # Leave enough time to finish generating before the server deletes it
+        if (job["ai_file_expires"] or 0) - config.AI_FILE_REUSE_MARGIN_MINUTES * 60 < time.time():
+            return None
+        return job["ai_file"]
+
+    def save(self, video_path, video_file):
+        """Records a new upload of the video, which moves its job to ai_uploaded."""
+        if self.ledger is not None:
+            self.ledger.record(video_path, job_ledger.AI_UPLOADED, os.stat(video_path), ai_file=video_file.name,
+                               ai_file_expires=_expiry_of(video_file))
+
+    def clear(self, video_path):
+        if self.ledger is not None:
+            self.ledger.clear_ai_file(video_path)
+
+    def tracked_names(self):
+        """Returns the server-side names of all unexpired tracked files."""
+        if self.ledger is None:
+            return set()
+        now = time.time()
+        return {name for name, expires in self.ledger.ai_files().items() if expires > now}
+
+    def forget(self, names):
+        """Drops the entries for the given server-side names, and any that have expired."""
+        if self.ledger is not None:
+            self.ledger.forget_ai_files(names, time.time())
+
+
+def sweep_orphaned_files(genai, store):
+    """
+    Deletes files this tool uploaded to the AI service that nothing refers
+    to any more, such as uploads left behind by a crashed run. Only files
+    whose display name starts with config.AI_FILE_DISPLAY_PREFIX are
+    considered, and files the store still tracks are kept for reuse.
+
+    Returns:
+        int: The number of files deleted.
+    """
+    tracked = store.tracked_names()
+    deleted = set()
+    for video_file in genai.list_files():
+        display_name = getattr(video_file, "display_name", "") or ""
+        if not display_name.startswith(config.AI_FILE_DISPLAY_PREFIX) or video_file.name in tracked:
+            continue
+        try:
+            genai.delete_file(video_file.name)
+            deleted.add(video_file.name)
+        except Exception as e:
+            print("Could not delete orphaned AI file '%s': %s" % (display_name, e))
+    # Expired entries are gone from the server as well
+    store.forget(deleted)
+    if deleted:
+        print("Deleted %d orphaned file(s) from the AI service." % len(deleted))
+    return len(deleted)
+
+
+def get_shared_store():
+    """Returns the AI file store backed by the process-wide job ledger."""
+    return AIFileStore(job_ledger.get_shared_ledger())
@@ -0,0 +1,272 @@
+import contextlib
+import http.client
+import socket
+import threading
+import time
+import httplib2
+import config
+from metrics import metrics
+
+# Outcomes of a call to a remote service
+OK = "ok"
+THROTTLED = "throttled"    # 429, 5xx or a rate limit error: the service is pushing back
+UNREACHABLE = "unreachable"  # The connection failed
+
+# Errors of the network or HTTP transport. Other OSErrors, such as a missing
+# file or a full disk, are local and say nothing about the service.
+TRANSPORT_ERRORS = (httplib2.HttpLib2Error, http.client.HTTPException, ConnectionError, socket.timeout,
+                    socket.gaierror)
+
+
+def classify(error):
+    """
+    Tells whether an exception means the service is overloaded or
+    unreachable.
+
+    Handles HttpError from googleapiclient (status in error.resp) and
+    google.api_core errors from the Gemini client (status in error.code).
+
+    Returns:
+        str: THROTTLED or UNREACHABLE, or None for errors that say nothing
+            about the service's health, such as a bad request.
+    """
+    status = None
+    resp = getattr(error, "resp", None)
+    if resp is not None:
+        status = getattr(resp, "status", None)
+    elif isinstance(getattr(error, "code", None), int):
+        status = error.code
+    if status == 429 or status in config.RETRIABLE_STATUS_CODES:
+        return THROTTLED
+    if status == 403:
+        content = getattr(error, "content", b"") or b""
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", "replace")
+        if "rateLimitExceeded" in content:
+            return THROTTLED
+    if isinstance(error, TRANSPORT_ERRORS):
+        return UNREACHABLE
+    return None
+
+
+class AdaptiveConcurrency(object):
+    """
+    Limits how many jobs run against a service at once, with additive
+    increase and multiplicative decrease (AIMD).
+
+    Every push-back (429/5xx, a failed connection, or latency above
+    `latency_tolerance` times the best recent average) cuts the limit by
+    `decrease_factor`, at most once per `decrease_interval` seconds so one
+    burst of failures counts once. After `limit` successful calls in a row
+    the limit grows by one, up to `max_limit`.
+    """
+    def __init__(self, name, max_limit, min_limit=1, decrease_factor=None, latency_tolerance=None,
+                 decrease_interval=5.0):
+        self.name = name
+        self.max_limit = max(min_limit, max_limit)
+        self.min_limit = min_limit
+        self.limit = self.max_limit
+        self.decrease_factor = decrease_factor if decrease_factor is not None else config.ADAPTIVE_DECREASE_FACTOR
+        self.latency_tolerance = (latency_tolerance if latency_tolerance is not None
+                                  else config.ADAPTIVE_LATENCY_TOLERANCE)
+        self.decrease_interval = decrease_interval
+        self._in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._latency_average = None
+        self._best_latency = None
+        self._latency_samples = 0
+        self._condition = threading.Condition()
+
+    def set_max_limit(self, max_limit):
+        with self._condition:
+            self.max_limit = max(self.min_limit, max_limit)
+            self.limit = min(self.limit, self.max_limit)
+            self._condition.notify_all()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def record(self, outcome, latency=None):
+        """Adjusts the limit after a call. `latency` is only given for calls of a roughly constant cost."""
+        if outcome is None or not config.ADAPTIVE_CONCURRENCY:
+            return
+        with self._condition:
+            if outcome != OK:
+                self._decrease("%s responses" % outcome)
+            elif latency is not None and self._latency_congested(latency):
+                self._decrease("slow responses")
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self._successes = 0
+                    self.limit += 1
+                    print("%s concurrency raised to %d." % (self.name, self.limit))
+                    self._condition.notify()
+
+    def _latency_congested(self, latency):
+        self._latency_samples += 1
+        if self._latency_average is None:
+            self._latency_average = latency
+        else:
+            self._latency_average = 0.8 * self._latency_average + 0.2 * latency
+        if self._latency_samples < 5 or not self.latency_tolerance:
+            return False
+        # The baseline drifts up slowly so one unusually fast spell does not pin the limit down
+        if self._best_latency is None:
+            self._best_latency = self._latency_average
+        else:
+            self._best_latency = min(self._best_latency * 1.01, self._latency_average)
+        return self._latency_average > self._best_latency * self.latency_tolerance
+
+    def _decrease(self, reason):
+        self._successes = 0
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_interval:
+            return
+        self._last_decrease = now
+        new_limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+        if new_limit < self.limit:
+            self.limit = new_limit
+            print("%s concurrency lowered to %d after %s." % (self.name, self.limit, reason))
+
+
+class CircuitBreaker(object):
+    """
+    Pauses calls to a service during an outage instead of letting every job
+    fail.
+
+    After `failure_threshold` push-backs in a row the breaker opens and
+    callers wait for `cooldown` seconds. Then a single probe call is let
+    through: if it succeeds, calls resume; if not, the breaker opens again
+    with double the cooldown, up to `max_cooldown`.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name, failure_threshold=None, cooldown=None, max_cooldown=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.CIRCUIT_BREAKER_FAILURES
+        self.base_cooldown = cooldown if cooldown is not None else config.CIRCUIT_BREAKER_COOLDOWN_SECONDS
+        self.max_cooldown = max_cooldown if max_cooldown is not None else config.CIRCUIT_BREAKER_MAX_COOLDOWN_SECONDS
+        self.state = self.CLOSED
+        self._cooldown = self.base_cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._probe_deadline = None
+        self._condition = threading.Condition()
+
+    def is_open(self):
+        with self._condition:
+            return self.state != self.CLOSED
+
+    def wait_until_closed(self, stop_event=None):
+        """
+        Blocks while the breaker is open. Returns False if stop_event was set
+        while waiting, True otherwise.
+        """
+        with self._condition:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                now = time.monotonic()
+                if self.state == self.CLOSED:
+                    return True
+                if self.state == self.OPEN and now >= self._open_until:
+                    self.state = self.HALF_OPEN
+                    self._probe_deadline = None
+                if self.state == self.HALF_OPEN and (self._probe_deadline is None or now >= self._probe_deadline):
+                    # Let one call through to test the service; if it never reports back, allow another
+                    self._probe_deadline = now + max(self._cooldown, 60)
+                    return True
+                wake_at = self._open_until if self.state == self.OPEN else self._probe_deadline
+                self._condition.wait(min(max(0.05, wake_at - now), 1.0))
+
+    def record(self, outcome):
+        with self._condition:
+            if outcome in (THROTTLED, UNREACHABLE):
+                self._failures += 1
+                if self.state == self.HALF_OPEN:
+                    self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                    self._open()
+                elif self.state == self.CLOSED and self._failures >= self.failure_threshold:
+                    self._open()
+                return
+            # Any answer that is not push-back shows the service is up again
+            self._failures = 0
+            if self.state != self.CLOSED:
+                print("%s is responding again, resuming." % self.name)
+                self.state = self.CLOSED
+                self._cooldown = self.base_cooldown
+                self._condition.notify_all()
+
+    def _open(self):
+        self.state = self.OPEN
+        self._open_until = time.monotonic() + self._cooldown
+        metrics.increment("%s_paused" % self.name.lower())
+        print("%s keeps failing, pausing calls for %.0fs." % (self.name, self._cooldown))
+
+
+class ServiceGuard(object):
+    """Adaptive concurrency and a circuit breaker for one remote service."""
+    def __init__(self, name, max_concurrency):
+        self.name = name
+        self.concurrency = AdaptiveConcurrency(name, max_concurrency)
+        self.breaker = CircuitBreaker(name)
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Holds one of the service's concurrency slots for a whole job."""
+        self.concurrency.acquire()
+        try:
+            yield
+        finally:
+            self.concurrency.release()
+
+    @contextlib.contextmanager
+    def call(self, measure_latency=False, stop_event=None):
+        """
+        Wraps a single request: waits while the breaker is open, then records
+        the outcome. Set measure_latency for requests whose cost does not
+        depend on the size of the video.
+        """
+        self.breaker.wait_until_closed(stop_event)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            outcome = classify(e)
+            if outcome is not None:
+                metrics.increment("%s_pushback" % self.name.lower())
+            self.concurrency.record(outcome)
+            self.breaker.record(outcome)
+            raise
+        self.concurrency.record(OK, time.monotonic() - started if measure_latency else None)
+        self.breaker.record(OK)
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(name, max_concurrency=None):
+    """
+    Returns the process-wide guard for a service, so what it learned carries
+    over between runs. The concurrency ceiling is updated if given.
+    """
+    with _guards_lock:
+        guard = _guards.get(name)
+        if guard is None:
+            guard = _guards[name] = ServiceGuard(name, max_concurrency or 1)
+        elif max_concurrency and guard.concurrency.max_limit != max_concurrency:
+            guard.concurrency.set_max_limit(max_concurrency)
+        return guard
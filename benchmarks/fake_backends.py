@@ -0,0 +1,290 @@
+"""
+Local stand-ins for the Gemini file/model API and the YouTube resumable
+upload endpoint, so the pipeline can be benchmarked without a network,
+API key or quota.
+
+FakeGenAI replaces the `google.generativeai` module inside
+video_processor. FakeYouTubeServer answers the HTTP requests that
+googleapiclient makes for videos.insert; each worker gets its own
+connection from connection(), while the upload sessions are shared.
+
+Both simulate request latency, a bandwidth limit shared by all
+connections, and a configurable rate of server errors.
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+
+import httplib2
+from google.api_core import exceptions as api_exceptions
+
+from rate_limiter import RateLimiter
+
+# Bandwidth is consumed in slices of this size so concurrent transfers share the link
+_TRANSFER_SLICE_BYTES = 256 * 1024
+
+
+def _mbps_limiter(mbps):
+    if not mbps or mbps <= 0:
+        return None
+    bytes_per_second = mbps * 1000 * 1000 / 8
+    return RateLimiter(bytes_per_second, capacity=_TRANSFER_SLICE_BYTES)
+
+
+def _transfer(limiter, size):
+    if limiter is None:
+        return
+    remaining = size
+    while remaining > 0:
+        amount = min(remaining, _TRANSFER_SLICE_BYTES)
+        limiter.acquire(amount)
+        remaining -= amount
+
+
+class _State(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeFile(object):
+    def __init__(self, name, display_name, size_bytes, ready_at):
+        self.name = name
+        self.display_name = display_name
+        self.uri = "https://generativelanguage.invalid/v1beta/" + name
+        self.mime_type = "video/mp4"
+        self.size_bytes = size_bytes
+        self.ready_at = ready_at
+        self.state = _State("PROCESSING")
+
+
+class _FakeModalityTokenCount(object):
+    def __init__(self, modality, token_count):
+        self.modality = _State(modality)
+        self.token_count = token_count
+
+
+class _FakeUsage(object):
+    def __init__(self, text_token_count, video_token_count, candidates_token_count):
+        self.prompt_token_count = text_token_count + video_token_count
+        self.prompt_tokens_details = [_FakeModalityTokenCount("TEXT", text_token_count),
+                                      _FakeModalityTokenCount("VIDEO", video_token_count)]
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = self.prompt_token_count + candidates_token_count
+
+
+class _FakeResponse(object):
+    def __init__(self, text, usage_metadata):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class _FakeModel(object):
+    def __init__(self, service, model_name=None, **kwargs):
+        self.service = service
+        self.model_name = model_name
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        return self.service._generate(self.model_name, contents, generation_config)
+
+
+class FakeGenAI(object):
+    """
+    Module-like replacement for `google.generativeai`.
+
+    Args:
+        latency (float): Seconds added to every API call.
+        upload_mbps (float): Upload bandwidth shared by all workers, in
+            megabits per second. 0 means unlimited.
+        processing_seconds (float): Time a file stays PROCESSING after upload.
+        processing_seconds_per_mb (float): Extra processing time per megabyte.
+        generate_seconds (float): Time a generate_content call takes.
+        error_rate (float): Fraction of upload and generate calls that fail
+            with a 500 or 503 error.
+        seed (int): Seed for the error sampling.
+    """
+    def __init__(self, latency=0.1, upload_mbps=0, processing_seconds=2.0, processing_seconds_per_mb=0.0,
+                 generate_seconds=3.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.processing_seconds = processing_seconds
+        self.processing_seconds_per_mb = processing_seconds_per_mb
+        self.generate_seconds = generate_seconds
+        self.error_rate = error_rate
+        self._bandwidth = _mbps_limiter(upload_mbps)
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._files = {}
+        self._lock = threading.Lock()
+        self.calls = {"upload_file": 0, "get_file": 0, "delete_file": 0, "generate_content": 0, "errors": 0}
+
+    def _count(self, call):
+        with self._lock:
+            self.calls[call] += 1
+
+    def _maybe_fail(self):
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.calls["errors"] += 1
+                error = self._random.choice([api_exceptions.InternalServerError, api_exceptions.ServiceUnavailable])
+        if failed:
+            raise error("Simulated server error")
+
+    def configure(self, **kwargs):
+        pass
+
+    def upload_file(self, path, display_name=None, **kwargs):
+        self._count("upload_file")
+        time.sleep(self.latency)
+        self._maybe_fail()
+        with open(path, "rb") as f:
+            f.seek(0, 2)
+            size = f.tell()
+        _transfer(self._bandwidth, size)
+        delay = self.processing_seconds + self.processing_seconds_per_mb * size / (1024 * 1024)
+        video_file = _FakeFile("files/fake-%d" % next(self._ids), display_name or path, size, time.monotonic() + delay)
+        with self._lock:
+            self._files[video_file.name] = video_file
+        return video_file
+
+    def get_file(self, name):
+        self._count("get_file")
+        time.sleep(self.latency)
+        with self._lock:
+            video_file = self._files[name]
+        if video_file.state.name == "PROCESSING" and time.monotonic() >= video_file.ready_at:
+            video_file.state = _State("ACTIVE")
+        return video_file
+
+    def list_files(self, **kwargs):
+        with self._lock:
+            return list(self._files.values())
+
+    def delete_file(self, name):
+        self._count("delete_file")
+        time.sleep(self.latency)
+        with self._lock:
+            self._files.pop(getattr(name, "name", name), None)
+
+    def GenerativeModel(self, model_name=None, **kwargs):
+        return _FakeModel(self, model_name, **kwargs)
+
+    def _generate(self, model_name, contents, generation_config=None):
+        self._count("generate_content")
+        time.sleep(self.latency)
+        self._maybe_fail()
+        time.sleep(self.generate_seconds)
+        text = "A synthetic description produced by the offline benchmark."
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            text = json.dumps({"description": text, "title": "Synthetic benchmark video",
+                               "tags": ["benchmark", "synthetic"], "category_id": "24"})
+        # Roughly what Gemini charges for a video: 300 tokens a second, taking 500 KB as one second
+        video_tokens = sum(int(part.size_bytes / 500000.0 * 300) for part in contents if isinstance(part, _FakeFile))
+        return _FakeResponse(text, _FakeUsage(300, video_tokens, len(text.split())))
+
+
+class FakeYouTubeServer(object):
+    """
+    Shared state of a fake YouTube upload endpoint.
+
+    Args:
+        latency (float): Seconds added to every request.
+        upload_mbps (float): Upload bandwidth shared by all connections, in
+            megabits per second. 0 means unlimited.
+        error_rate (float): Fraction of chunk requests answered with a 500
+            or 503 status.
+        exception_rate (float): Fraction of chunk requests that fail with a
+            dropped connection (a retriable exception in the uploader).
+        seed (int): Seed for the error sampling.
+    """
+    def __init__(self, latency=0.05, upload_mbps=0, error_rate=0.0, exception_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.exception_rate = exception_rate
+        self._bandwidth = _mbps_limiter(upload_mbps)
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.calls = {"insert": 0, "chunks": 0, "status_queries": 0, "errors": 0, "exceptions": 0}
+
+    def connection(self):
+        """Returns an httplib2.Http stand-in for one worker."""
+        return FakeYouTubeHttp(self)
+
+    def _sample_failure(self):
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.exception_rate:
+                self.calls["exceptions"] += 1
+                return "exception"
+            if roll < self.exception_rate + self.error_rate:
+                self.calls["errors"] += 1
+                return self._random.choice([500, 503])
+        return None
+
+    def request(self, uri, method="GET", body=None, headers=None):
+        time.sleep(self.latency)
+        headers = headers or {}
+
+        if method == "POST":
+            with self._lock:
+                self.calls["insert"] += 1
+                session_id = "session-%d" % next(self._ids)
+                self._sessions[session_id] = 0
+            return httplib2.Response({"status": 200, "location": "https://upload.invalid/" + session_id}), b""
+
+        session_id = uri.rsplit("/", 1)[1]
+        content_range = headers.get("Content-Range", headers.get("content-range", ""))
+        with self._lock:
+            received = self._sessions.get(session_id)
+        if received is None:
+            return httplib2.Response({"status": 404}), b'{"error": {"message": "Upload session not found"}}'
+
+        if content_range.startswith("bytes */"):
+            with self._lock:
+                self.calls["status_queries"] += 1
+            response_headers = {"status": 308}
+            if received:
+                response_headers["range"] = "bytes=0-%d" % (received - 1)
+            return httplib2.Response(response_headers), b""
+
+        match = re.match(r"bytes (\d+)-(\d+)/(\S+)", content_range)
+        start, end, total = int(match.group(1)), int(match.group(2)), match.group(3)
+        data = body.read() if hasattr(body, "read") else body
+        with self._lock:
+            self.calls["chunks"] += 1
+
+        failure = self._sample_failure()
+        if failure == "exception":
+            # The connection drops part way through the chunk
+            _transfer(self._bandwidth, len(data) // 2)
+            raise ConnectionResetError("Simulated dropped connection")
+        _transfer(self._bandwidth, len(data))
+        if failure:
+            return httplib2.Response({"status": failure}), b'{"error": {"message": "Simulated backend error"}}'
+
+        with self._lock:
+            # Chunks are only accepted in order, as on the real endpoint
+            if start == self._sessions[session_id]:
+                self._sessions[session_id] = end + 1
+            received = self._sessions[session_id]
+        if total != "*" and received == int(total):
+            body = {"id": "fake%s" % session_id.split("-")[1], "kind": "youtube#video"}
+            return httplib2.Response({"status": 200}), json.dumps(body).encode("utf-8")
+        return httplib2.Response({"status": 308, "range": "bytes=0-%d" % (received - 1)}), b""
+
+
+class FakeYouTubeHttp(object):
+    """The per-worker connection handed to googleapiclient."""
+    def __init__(self, server):
+        self.server = server
+        self.timeout = None
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        return self.server.request(uri, method, body, headers)
+
+    def close(self):
+        pass
@@ -0,0 +1,250 @@
+"""
+Measures end-to-end throughput of description generation and YouTube
+uploads without a network connection.
+
+Synthetic video files are created in a temporary directory, and the
+Gemini and YouTube APIs are replaced by the local fakes in
+fake_backends.py. process_videos and start_yt_upload then run unchanged,
+with the concurrency settings from settings.json unless overridden. The
+wall-clock time, files per hour and per-stage latencies are reported for
+each step.
+
+    python benchmarks/pipeline_benchmark.py [--files 20] [--file-size-mb 20] [--output results.json]
+    python benchmarks/pipeline_benchmark.py --ai-error-rate 0.05 --yt-upload-mbps 40
+    python benchmarks/pipeline_benchmark.py --compare baseline.json --max-regression 0.2
+
+With --compare, the exit code is 1 if the files per hour of any step drop
+below the baseline by more than the allowed fraction.
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import client_sessions  # noqa: E402
+import config  # noqa: E402
+import pipeline  # noqa: E402
+import video_processor  # noqa: E402
+import youtube_uploader  # noqa: E402
+from googleapiclient.discovery import build_from_document  # noqa: E402
+from metrics import metrics  # noqa: E402
+from fake_backends import FakeGenAI, FakeYouTubeServer  # noqa: E402
+
+
+def _mp4_headers(duration_seconds, size_bytes):
+    """Returns ftyp and moov boxes for a video with one 1280x720 track, and the mdat header."""
+    timescale = 1000
+    duration = int(duration_seconds * timescale)
+    ftyp = struct.pack(">I4s4sI4s4s", 24, b"ftyp", b"isom", 512, b"isom", b"mp41")
+    mvhd_body = struct.pack(">B3xIIII", 0, 0, 0, timescale, duration) + bytes(80)
+    tkhd_body = struct.pack(">B3xIIIIII", 0, 0, 0, 1, 0, duration, 0) + bytes(48) + struct.pack(
+        ">II", 1280 << 16, 720 << 16)
+    mvhd = struct.pack(">I4s", 8 + len(mvhd_body), b"mvhd") + mvhd_body
+    tkhd = struct.pack(">I4s", 8 + len(tkhd_body), b"tkhd") + tkhd_body
+    trak = struct.pack(">I4s", 8 + len(tkhd), b"trak") + tkhd
+    moov = struct.pack(">I4s", 8 + len(mvhd) + len(trak), b"moov") + mvhd + trak
+    headers = ftyp + moov
+    mdat = struct.pack(">I4s", max(8, size_bytes - len(headers)), b"mdat")
+    return headers + mdat
+
+
+def create_synthetic_videos(directory, count, size_bytes):
+    """
+    Creates `count` sparse .mp4 files of the given size. Each has valid
+    container headers, so the media probe accepts it, with a duration of
+    roughly one second per 500 KB.
+    """
+    for index in range(count):
+        with open(os.path.join(directory, "Benchmark.Video.%03d.2001.mp4" % index), "wb") as f:
+            f.write(_mp4_headers(max(1.0, size_bytes / 500000.0), size_bytes))
+            f.truncate(max(size_bytes, f.tell()))
+
+
+def _configure(args, work_dir):
+    config.load_settings()
+    # Every run starts from scratch and keeps its state files out of the repo
+    config.GOOGLE_AI_API_KEY = "offline-benchmark"
+    config.USE_DESCRIPTION_CACHE = False
+    config.INCREMENTAL_MODE = False
+    config.USE_PROXY = False
+    config.QUOTA_STATE_FILE = os.path.join(work_dir, "youtube_quota.json")
+    config.UPLOAD_PROFILES = []
+    config.JOB_LEDGER_FILE = os.path.join(work_dir, "job_ledger.db")
+    config.USAGE_LEDGER_FILE = os.path.join(work_dir, "usage_ledger.db")
+    config.DISCOVERY_CACHE_DIR = os.path.join(work_dir, "discovery_cache")
+    config.AI_BUDGET_USD = 0
+    config.AI_TOKEN_BUDGET = 0
+    config.YOUTUBE_DAILY_QUOTA = (args.files + 1) * config.VIDEOS_INSERT_QUOTA_COST
+    config.METRICS_SUMMARY_INTERVAL_SECONDS = 0
+    config.METRICS_REPORT_FILE = ""
+    config.METRICS_PROMETHEUS_FILE = ""
+    config.POLL_FIRST_CHECK_SECONDS = args.poll_first_check
+    if args.concurrent_jobs:
+        config.MAX_CONCURRENT_JOBS = args.concurrent_jobs
+    if args.concurrent_uploads:
+        config.MAX_CONCURRENT_UPLOADS = args.concurrent_uploads
+    if args.ai_requests_per_minute is not None:
+        config.AI_REQUESTS_PER_MINUTE = args.ai_requests_per_minute
+
+
+def _install_fakes(genai, youtube_server):
+    # Clients pooled by an earlier step belong to the previous fakes
+    client_sessions.reset()
+    video_processor.genai = genai
+    youtube_uploader.get_credentials = lambda upload_args, profile=None: None
+    youtube_uploader.build_service = lambda credentials: build_from_document(
+        client_sessions.discovery_document(config.YOUTUBE_API_SERVICE_NAME, config.YOUTUBE_API_VERSION),
+        http=youtube_server.connection())
+
+
+def _step_result(files, succeeded, failed, wall_seconds):
+    snapshot = metrics.snapshot()
+    return {
+        "files": files,
+        "succeeded": succeeded,
+        "failed": failed,
+        "wall_seconds": wall_seconds,
+        "files_per_hour": succeeded * 3600.0 / wall_seconds if wall_seconds > 0 else 0.0,
+        "stages": {stage: {"p50_seconds": values["p50_seconds"], "p95_seconds": values["p95_seconds"]}
+                   for stage, values in snapshot["stages"].items()},
+    }
+
+
+@contextlib.contextmanager
+def _quiet(verbose):
+    if verbose:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def run_benchmark(args):
+    genai = FakeGenAI(latency=args.ai_latency, upload_mbps=args.ai_upload_mbps,
+                      processing_seconds=args.ai_processing_seconds,
+                      processing_seconds_per_mb=args.ai_processing_seconds_per_mb,
+                      generate_seconds=args.ai_generate_seconds, error_rate=args.ai_error_rate, seed=args.seed)
+    youtube_server = FakeYouTubeServer(latency=args.yt_latency, upload_mbps=args.yt_upload_mbps,
+                                       error_rate=args.yt_error_rate, exception_rate=args.yt_exception_rate,
+                                       seed=args.seed)
+    _install_fakes(genai, youtube_server)
+
+    work_dir = tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    video_dir = os.path.join(work_dir, "videos")
+    os.makedirs(video_dir)
+    try:
+        _configure(args, work_dir)
+        create_synthetic_videos(video_dir, args.files, int(args.file_size_mb * 1024 * 1024))
+        upload_args = youtube_uploader.parse_upload_args([])
+        results = {}
+
+        if args.pipeline:
+            started = time.monotonic()
+            with _quiet(args.verbose):
+                summary = pipeline.run_pipeline(video_dir, lambda: None, upload_args)
+            upload_summary = summary["upload"]
+            results["pipeline"] = _step_result(args.files, upload_summary["uploaded"],
+                                               len(upload_summary["failed"]), time.monotonic() - started)
+        else:
+            started = time.monotonic()
+            with _quiet(args.verbose):
+                summary = video_processor.process_videos(video_dir, lambda: None)
+            results["generate"] = _step_result(args.files, summary["described"], len(summary["failed"]),
+                                               time.monotonic() - started)
+
+            started = time.monotonic()
+            with _quiet(args.verbose):
+                summary = youtube_uploader.start_yt_upload(video_dir, lambda: None, upload_args)
+            results["upload"] = _step_result(args.files, summary["uploaded"], len(summary["failed"]),
+                                             time.monotonic() - started)
+
+        results["backend_calls"] = {"genai": dict(genai.calls), "youtube": dict(youtube_server.calls)}
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(results, baseline, max_regression):
+    regressions = []
+    for step, values in results.items():
+        previous = baseline.get(step, {}).get("files_per_hour") if isinstance(values, dict) else None
+        if not previous or "files_per_hour" not in values:
+            continue
+        current = values["files_per_hour"]
+        if current < previous * (1 - max_regression):
+            regressions.append("%s: %.1f -> %.1f files/hour (%.0f%%)"
+                               % (step, previous, current, (current / previous - 1) * 100))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark with fake Gemini and YouTube backends.")
+    parser.add_argument("--files", type=int, default=20, help="Number of synthetic videos (default: %(default)s).")
+    parser.add_argument("--file-size-mb", type=float, default=20, help="Size of each video (default: %(default)s).")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Run generation and upload together with run_pipeline instead of one after the other.")
+    parser.add_argument("--concurrent-jobs", type=int, help="Override max_concurrent_jobs.")
+    parser.add_argument("--concurrent-uploads", type=int, help="Override max_concurrent_uploads.")
+    parser.add_argument("--ai-requests-per-minute", type=float, help="Override ai_requests_per_minute.")
+    parser.add_argument("--poll-first-check", type=float, default=0.5,
+                        help="Seconds before the first AI file status check (default: %(default)s).")
+    parser.add_argument("--ai-latency", type=float, default=0.1, help="Seconds per AI API call (default: %(default)s).")
+    parser.add_argument("--ai-upload-mbps", type=float, default=100,
+                        help="AI upload bandwidth in megabits per second, 0 for unlimited (default: %(default)s).")
+    parser.add_argument("--ai-processing-seconds", type=float, default=2.0,
+                        help="Time a file stays PROCESSING (default: %(default)s).")
+    parser.add_argument("--ai-processing-seconds-per-mb", type=float, default=0.0,
+                        help="Extra PROCESSING time per megabyte (default: %(default)s).")
+    parser.add_argument("--ai-generate-seconds", type=float, default=3.0,
+                        help="Time a generate_content call takes (default: %(default)s).")
+    parser.add_argument("--ai-error-rate", type=float, default=0.0,
+                        help="Fraction of AI calls failing with 500/503 (default: %(default)s).")
+    parser.add_argument("--yt-latency", type=float, default=0.05,
+                        help="Seconds per YouTube request (default: %(default)s).")
+    parser.add_argument("--yt-upload-mbps", type=float, default=100,
+                        help="YouTube upload bandwidth in megabits per second, 0 for unlimited (default: %(default)s).")
+    parser.add_argument("--yt-error-rate", type=float, default=0.0,
+                        help="Fraction of upload chunks answered with 500/503 (default: %(default)s).")
+    parser.add_argument("--yt-exception-rate", type=float, default=0.0,
+                        help="Fraction of upload chunks that drop the connection (default: %(default)s).")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the simulated errors (default: %(default)s).")
+    parser.add_argument("--verbose", action="store_true", help="Show the application log.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed throughput drop against the baseline, as a fraction (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args)
+    for step, values in results.items():
+        if step == "backend_calls":
+            continue
+        print("%-10s %3d/%d files %9.2fs %10.1f files/hour"
+              % (step, values["succeeded"], values["files"], values["wall_seconds"], values["files_per_hour"]))
+        for stage, latency in sorted(values["stages"].items()):
+            print("    %-20s p50 %7.2fs  p95 %7.2fs" % (stage, latency["p50_seconds"], latency["p95_seconds"]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            print("REGRESSION %s" % regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Measures how long the GUI takes to start.
+
+For each module, a fresh interpreter is started and the import time is
+recorded. The time to first window is measured from interpreter start until
+the main window is mapped on screen. Each measurement is repeated and the
+median is reported.
+
+    python benchmarks/startup_benchmark.py [--repeat 5] [--output results.json]
+    python benchmarks/startup_benchmark.py --compare baseline.json --max-regression 0.2
+
+With --compare, the exit code is 1 if any median is slower than the
+baseline by more than the allowed fraction.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_TARGETS = ["config", "ui", "video_processor", "youtube_uploader", "pipeline"]
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+# The window sends sys.stdout to its log, so the timing goes to the real stdout
+FIRST_WINDOW_SNIPPET = """
+import sys
+import time
+started = time.perf_counter()
+import ui
+app = ui.App()
+app.withdraw()
+app.deiconify()
+while not app.winfo_viewable():
+    app.update()
+print(time.perf_counter() - started, file=sys.__stdout__)
+app.destroy()
+"""
+
+
+def _run_snippet(snippet):
+    result = subprocess.run([sys.executable, "-c", snippet], cwd=REPO_ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    lines = result.stdout.strip().splitlines()
+    try:
+        return float(lines[-1])
+    except (IndexError, ValueError):
+        raise RuntimeError("no timing in the output")
+
+
+def _median_of(snippet, repeat):
+    return statistics.median(_run_snippet(snippet) for _ in range(repeat))
+
+
+def run_benchmark(repeat):
+    results = {}
+    for module in IMPORT_TARGETS:
+        key = "import_%s" % module
+        try:
+            results[key] = _median_of(IMPORT_SNIPPET.format(module=module), repeat)
+        except RuntimeError as e:
+            print("Skipping %s: %s" % (key, e), file=sys.stderr)
+    try:
+        results["time_to_first_window"] = _median_of(FIRST_WINDOW_SNIPPET, repeat)
+    except RuntimeError as e:
+        # No display (or no Tk) on this machine
+        print("Skipping time_to_first_window: %s" % e, file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, max_regression):
+    regressions = []
+    for key, value in results.items():
+        previous = baseline.get(key)
+        if previous and value > previous * (1 + max_regression):
+            regressions.append("%s: %.3fs -> %.3fs (+%.0f%%)" % (key, previous, value, (value / previous - 1) * 100))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GUI import and startup time benchmark.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (default: %(default)s).")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline, as a fraction (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.repeat)
+    for key, value in results.items():
+        print("%-28s %8.3fs" % (key, value))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            print("REGRESSION %s" % regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
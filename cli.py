@@ -0,0 +1,172 @@
+"""
+Command-line entry point that runs without Tkinter, for headless machines
+and scheduled jobs.
+
+    python cli.py generate <directory>
+    python cli.py upload <directory>
+    python cli.py pipeline <directory> [--daemon] [--interval SECONDS]
+    python cli.py watch <directory> [--upload]
+
+Progress is written to stdout as one JSON object per line. Log messages go
+to stderr. The exit code is non-zero if any file failed or the run stopped
+early. Unrecognised flags, such as --noauth_local_webserver or --keywords,
+are passed through to the YouTube uploader.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import config
+
+
+class ProgressWriter(object):
+    """Writes machine-readable progress events as JSON lines."""
+    def __init__(self, stream):
+        self.stream = stream
+
+    def emit(self, event, **fields):
+        fields["event"] = event
+        fields["time"] = time.time()
+        self.stream.write(json.dumps(fields) + "\n")
+        self.stream.flush()
+
+
+def _run_generate(directory, upload_args, progress):
+    import video_processor
+    summary = video_processor.process_videos(
+        directory, lambda: None,
+        on_file_done=lambda video, description: progress.emit("described", video=video, description=description))
+    return summary, _generate_failed(summary)
+
+
+def _run_upload(directory, upload_args, progress):
+    import youtube_uploader
+    summary = youtube_uploader.start_yt_upload(
+        directory, lambda: None, upload_args,
+        on_uploaded=lambda video, video_id: progress.emit("uploaded", video=video, video_id=video_id))
+    return summary, _upload_failed(summary)
+
+
+def _run_pipeline(directory, upload_args, progress):
+    import pipeline
+    summary = pipeline.run_pipeline(
+        directory, lambda: None, upload_args,
+        on_file_done=lambda video, description: progress.emit("described", video=video, description=description),
+        on_uploaded=lambda video, video_id: progress.emit("uploaded", video=video, video_id=video_id))
+    failed = (summary["generate"] is None or _generate_failed(summary["generate"]) or
+              summary["upload"] is None or _upload_failed(summary["upload"]))
+    return summary, failed
+
+
+def _run_watch(directory, upload_args, progress):
+    import pipeline
+    stop_event = threading.Event()
+    result = {"summary": {"error": "Watching stopped unexpectedly."}}
+
+    def watch():
+        result["summary"] = pipeline.watch_folder(
+            directory, stop_event, upload=upload_args is not None, upload_args=upload_args,
+            on_file_done=lambda video, description: progress.emit("described", video=video, description=description),
+            on_uploaded=lambda video, video_id: progress.emit("uploaded", video=video, video_id=video_id))
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        while watcher.is_alive():
+            watcher.join(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+        watcher.join()
+    summary = result["summary"]
+    upload_summary = summary.get("upload")
+    failed = bool(summary.get("error") or summary.get("failed") or
+                  (upload_summary is not None and _upload_failed(upload_summary)))
+    return summary, failed
+
+
+def _generate_failed(summary):
+    return bool(summary["error"] or summary["failed"] or summary["stopped"])
+
+
+def _upload_failed(summary):
+    return bool(summary["failed"] or summary["stopped"])
+
+
+COMMANDS = {
+    "generate": (_run_generate, "Generate descriptions for the videos in a directory."),
+    "upload": (_run_upload, "Upload the videos in a directory to YouTube."),
+    "pipeline": (_run_pipeline, "Generate descriptions and upload each video as soon as it is described."),
+    "watch": (_run_watch, "Describe new videos as they arrive in a directory, until interrupted."),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="YouTube AI description manager without the GUI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument("directory", help="Directory holding the videos.")
+        subparser.add_argument("--settings", default=config.CONFIG_FILE,
+                               help="Path to settings.json (default: %(default)s).")
+        subparser.add_argument("--incremental", action="store_true",
+                               help="Skip unchanged videos that already have descriptions.")
+        if name == "watch":
+            subparser.add_argument("--upload", action="store_true",
+                                   help="Upload each video to YouTube once it is described.")
+            subparser.set_defaults(daemon=False)
+        else:
+            subparser.add_argument("--daemon", action="store_true",
+                                   help="Keep working through the directory, running again every --interval seconds.")
+            subparser.add_argument("--interval", type=float, default=300,
+                                   help="Seconds between runs in daemon mode (default: %(default)s).")
+    return parser
+
+
+def main(argv=None):
+    args, passthrough = build_parser().parse_known_args(argv)
+    progress = ProgressWriter(sys.stdout)
+
+    if not os.path.isdir(args.directory):
+        progress.emit("error", message=f"'{args.directory}' is not a directory.")
+        return 2
+
+    # Logs from the processing modules go to stderr so stdout stays machine-readable
+    with contextlib.redirect_stdout(sys.stderr):
+        config.load_settings(args.settings)
+        # A daemon must not describe the same videos on every pass
+        if args.incremental or args.daemon:
+            config.INCREMENTAL_MODE = True
+
+        upload_args = None
+        if args.command in ("upload", "pipeline") or getattr(args, "upload", False):
+            import youtube_uploader
+            upload_args = youtube_uploader.parse_upload_args(passthrough)
+
+        run, _ = COMMANDS[args.command]
+        exit_code = 0
+        while True:
+            progress.emit("started", command=args.command, directory=args.directory)
+            try:
+                summary, failed = run(args.directory, upload_args, progress)
+            except KeyboardInterrupt:
+                progress.emit("interrupted", command=args.command)
+                return 130
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+                summary, failed = {"error": str(e)}, True
+            progress.emit("finished", command=args.command, summary=summary, ok=not failed)
+            exit_code = 1 if failed else 0
+
+            if not args.daemon:
+                return exit_code
+            try:
+                time.sleep(args.interval)
+            except KeyboardInterrupt:
+                return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import contextlib
+import datetime
+import json
+import os
+import re
+import threading
+import time
+import httplib2
+import config
+from metrics import metrics
+
+# Used when the library has no bundled copy of a discovery document
+_DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest"
+
+
+class ClientPool(object):
+    """
+    Keeps built API clients, such as a YouTube service with its HTTP
+    connection or a Gemini model, so that workers in later jobs and runs get
+    a ready client instead of building one. A client is only used by one
+    worker at a time; the pool grows to the largest number of workers that
+    ran at once.
+
+    The time spent building each client is recorded as a "<name>_client_setup"
+    metric, and clients handed out again are counted, so the setup time
+    saved can be reported.
+    """
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.metric_name = re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") + "_client_setup"
+        self.created = 0
+        self.reused = 0
+        self.setup_seconds = 0.0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def checkout(self):
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+        started = time.monotonic()
+        client = self.factory()
+        seconds = time.monotonic() - started
+        metrics.record(self.metric_name, seconds)
+        with self._lock:
+            self.created += 1
+            self.setup_seconds += seconds
+        return client
+
+    def checkin(self, client):
+        with self._lock:
+            self._idle.append(client)
+
+    @contextlib.contextmanager
+    def client(self):
+        """Checks a client out for the duration of a with block."""
+        client = self.checkout()
+        try:
+            yield client
+        finally:
+            self.checkin(client)
+
+    def saved_seconds(self):
+        """Estimated setup time saved by reusing clients instead of building new ones."""
+        with self._lock:
+            if not self.created:
+                return 0.0
+            return self.reused * self.setup_seconds / self.created
+
+    def summary_line(self):
+        with self._lock:
+            created, reused, setup_seconds = self.created, self.reused, self.setup_seconds
+        return ("%s clients: %d built (%.2fs setup), %d reused, saving about %.2fs."
+                % (self.name, created, setup_seconds, reused, self.saved_seconds()))
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, factory, key=None):
+    """
+    Returns the process-wide pool of clients called `name`, creating it with
+    `factory` on first use. Clients built from different settings, such as
+    other credentials, need a different `key`.
+    """
+    with _pools_lock:
+        pool = _pools.get((name, key))
+        if pool is None:
+            pool = _pools[(name, key)] = ClientPool(name, factory)
+        return pool
+
+
+def reset():
+    """Forgets every pooled client and cached credential, for example after switching API backends."""
+    with _pools_lock:
+        _pools.clear()
+    with _credentials_lock:
+        _credentials.clear()
+    with _documents_lock:
+        _documents.clear()
+
+
+_documents = {}
+_documents_lock = threading.Lock()
+# Held while a document is read or fetched, so workers starting together load it once
+_documents_load_lock = threading.Lock()
+
+
+def _fetch_discovery_document(api, version):
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+        document = get_static_doc(api, version)
+        if document:
+            return document
+    except ImportError:
+        pass
+    response, content = httplib2.Http().request(_DISCOVERY_URL.format(api=api, version=version))
+    if response.status != 200:
+        raise ValueError("Discovery document for %s %s returned HTTP %d" % (api, version, response.status))
+    return content.decode("utf-8")
+
+
+def discovery_document(api, version):
+    """
+    Returns the parsed discovery document of an API, so services can be
+    built with build_from_document without reading it again. The document
+    is kept in memory and in config.DISCOVERY_CACHE_DIR for
+    config.DISCOVERY_CACHE_MAX_AGE_HOURS.
+
+    Returns:
+        dict: The discovery document, or None if it could not be loaded.
+    """
+    key = (api, version)
+    with _documents_lock:
+        document = _documents.get(key)
+    if document is not None:
+        return document
+    with _documents_load_lock:
+        with _documents_lock:
+            document = _documents.get(key)
+        if document is None:
+            document = _load_discovery_document(api, version)
+        if document is not None:
+            with _documents_lock:
+                _documents[key] = document
+        return document
+
+
+def _load_discovery_document(api, version):
+    cache_path = None
+    if config.DISCOVERY_CACHE_DIR:
+        cache_path = os.path.join(config.DISCOVERY_CACHE_DIR, "%s.%s.json" % (api, version))
+    try:
+        if (cache_path and os.path.exists(cache_path) and
+                time.time() - os.path.getmtime(cache_path) < config.DISCOVERY_CACHE_MAX_AGE_HOURS * 3600):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                document = json.load(f)
+        else:
+            text = _fetch_discovery_document(api, version)
+            document = json.loads(text)
+            if cache_path:
+                os.makedirs(config.DISCOVERY_CACHE_DIR, exist_ok=True)
+                temp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(temp_path, cache_path)
+    except Exception as e:
+        print("Could not load the %s %s discovery document: %s" % (api, version, e))
+        return None
+    return document
+
+
+_credentials = {}
+_credentials_lock = threading.Lock()
+_refresher = {"thread": None}
+
+
+def credentials_for(token_file, authorize):
+    """
+    Returns the credentials stored in token_file, authorizing with
+    `authorize` only the first time or once they have become invalid. The
+    same object is handed out on every run, so clients pooled with it stay
+    valid, and its access token is refreshed in the background before it
+    expires.
+    """
+    with _credentials_lock:
+        credentials = _credentials.get(token_file)
+    if credentials is not None and not getattr(credentials, "invalid", False):
+        return credentials
+    credentials = authorize()
+    if credentials is None:
+        return None
+    with _credentials_lock:
+        _credentials[token_file] = credentials
+        if config.OAUTH_REFRESH_MARGIN_SECONDS > 0 and _refresher["thread"] is None:
+            _refresher["thread"] = threading.Thread(target=_refresh_loop, daemon=True)
+            _refresher["thread"].start()
+    return credentials
+
+
+def _seconds_until_expiry(credentials):
+    expiry = getattr(credentials, "token_expiry", None)
+    if not isinstance(expiry, datetime.datetime):
+        return None
+    # oauth2client keeps the expiry as a naive UTC time
+    if expiry.tzinfo is not None:
+        expiry = expiry.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return (expiry - now).total_seconds()
+
+
+def _refresh_loop():
+    while True:
+        with _credentials_lock:
+            entries = list(_credentials.items())
+        for token_file, credentials in entries:
+            remaining = _seconds_until_expiry(credentials)
+            if remaining is None or remaining > config.OAUTH_REFRESH_MARGIN_SECONDS:
+                continue
+            started = time.monotonic()
+            try:
+                credentials.refresh(httplib2.Http())
+            except Exception as e:
+                # Forgotten, so the next run authorizes again instead of this loop retrying a revoked token
+                print("Could not refresh the OAuth token in '%s', it will be loaded again on the next run: %s"
+                      % (token_file, e))
+                with _credentials_lock:
+                    if _credentials.get(token_file) is credentials:
+                        del _credentials[token_file]
+                continue
+            metrics.record("oauth_refresh", time.monotonic() - started)
+        time.sleep(30)
@@ -1,4 +1,6 @@
 import os
+import sys
+import json
 import httplib2
 import http.client
 
@@ -8,6 +10,203 @@ GOOGLE_AI_API_KEY = ""
 MAX_CONSECUTIVE_ERRORS = 3
 MAX_RETRIES = 10
 
+# Number of YouTube uploads that run at the same time, and an optional cap
+# on their combined bandwidth in megabits per second (0 disables the cap).
+MAX_CONCURRENT_UPLOADS = 2
+UPLOAD_BANDWIDTH_LIMIT_MBPS = 0
+
+# YouTube uploads are sent in chunks, starting at UPLOAD_CHUNK_SIZE bytes and
+# adapting to the measured throughput so each chunk takes about
+# UPLOAD_CHUNK_TARGET_SECONDS. Sizes must be multiples of 256 KB. The session
+# URI and confirmed offset of unfinished uploads are kept in
+# UPLOAD_SESSIONS_FILENAME in the source directory so they can be resumed.
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_MIN_CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_CHUNK_SIZE = 128 * 1024 * 1024
+UPLOAD_CHUNK_TARGET_SECONDS = 10
+UPLOAD_SESSIONS_FILENAME = ".upload_sessions.json"
+
+# YouTube Data API quota. Each videos.insert costs VIDEOS_INSERT_QUOTA_COST
+# units out of a daily budget that resets at midnight Pacific time. Units
+# spent are saved in QUOTA_STATE_FILE across runs. When the budget is used
+# up, uploads wait for the reset instead of quitting, unless
+# QUOTA_WAIT_FOR_RESET is False.
+YOUTUBE_DAILY_QUOTA = 10000
+VIDEOS_INSERT_QUOTA_COST = 1600
+QUOTA_STATE_FILE = "youtube_quota.json"
+QUOTA_WAIT_FOR_RESET = True
+QUOTA_RESET_MARGIN_SECONDS = 300
+
+# Upload with several YouTube credentials at once, each with its own quota.
+# Every entry is a dict with a "name" and optionally "client_secrets",
+# "token_file", "daily_quota", "quota_state_file", "workers" and "patterns"
+# (shell patterns of filenames only that profile uploads); missing keys fall
+# back to the settings above. Other videos go to whichever profile has a
+# free worker and quota left. Empty means the single default profile.
+UPLOAD_PROFILES = []
+
+# Order of the upload queue. Files matching UPLOAD_PRIORITY_PATTERNS (shell
+# patterns such as "*trailer*") go first, in pattern order. The rest follow by
+# UPLOAD_ORDER: "name", "smallest", "largest", "shortest" or "longest" (the
+# last two by the duration in the video's headers, see PROBE_MEDIA).
+UPLOAD_ORDER = "name"
+UPLOAD_PRIORITY_PATTERNS = []
+
+# In the combined generate-and-upload pipeline, the most videos that may wait
+# between the two stages before description generation pauses.
+PIPELINE_QUEUE_SIZE = 4
+
+# The log window is refreshed every LOG_FLUSH_INTERVAL_MS and keeps at most
+# LOG_MAX_LINES lines. If LOG_FILE is set, the full log is also written
+# there, rotating after LOG_FILE_MAX_BYTES with LOG_FILE_BACKUPS old files.
+LOG_FLUSH_INTERVAL_MS = 50
+LOG_MAX_LINES = 5000
+LOG_FILE = ""
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+# Run metrics. A live summary of throughput, stage latency and ETA is logged
+# every METRICS_SUMMARY_INTERVAL_SECONDS (0 disables it). At the end of a run
+# the figures are written as JSON to METRICS_REPORT_FILE and, if set, in the
+# Prometheus textfile format to METRICS_PROMETHEUS_FILE.
+METRICS_SUMMARY_INTERVAL_SECONDS = 60
+METRICS_REPORT_FILE = "run_report.json"
+METRICS_PROMETHEUS_FILE = ""
+
+# Number of videos that are uploaded to and described by the AI service at
+# the same time, and how many AI requests all of those workers may start per
+# minute combined.
+MAX_CONCURRENT_JOBS = 3
+AI_REQUESTS_PER_MINUTE = 30
+
+# Back-pressure from Gemini and YouTube. While a service answers with 429/5xx
+# errors, drops connections, or its status checks take more than
+# ADAPTIVE_LATENCY_TOLERANCE times longer than usual (0 ignores latency), the
+# number of jobs in flight is multiplied by ADAPTIVE_DECREASE_FACTOR. It grows
+# back by one per round of successful calls, up to MAX_CONCURRENT_JOBS or
+# MAX_CONCURRENT_UPLOADS. After CIRCUIT_BREAKER_FAILURES such errors in a row,
+# calls pause for CIRCUIT_BREAKER_COOLDOWN_SECONDS. Then one test call goes
+# through: if it succeeds calls resume, otherwise the pause doubles, up to
+# CIRCUIT_BREAKER_MAX_COOLDOWN_SECONDS. A video whose description failed this
+# way is retried up to MAX_SERVICE_RETRIES times; failures while calls are
+# paused do not count against that. Local errors, such as a missing file,
+# fail the video at once.
+ADAPTIVE_CONCURRENCY = True
+ADAPTIVE_DECREASE_FACTOR = 0.5
+ADAPTIVE_LATENCY_TOLERANCE = 3.0
+CIRCUIT_BREAKER_FAILURES = 5
+CIRCUIT_BREAKER_COOLDOWN_SECONDS = 30
+CIRCUIT_BREAKER_MAX_COOLDOWN_SECONDS = 600
+MAX_SERVICE_RETRIES = 3
+
+# How uploaded AI files are polled while the server is processing them. The
+# first check happens quickly, later checks back off up to the maximum
+# interval. When POLL_SECONDS_PER_MB is set, the first check is delayed by
+# that many seconds per megabyte of video.
+POLL_FIRST_CHECK_SECONDS = 2
+POLL_MAX_INTERVAL_SECONDS = 30
+POLL_SECONDS_PER_MB = 0
+
+# Generated descriptions are cached by the hash of the video contents, the
+# prompt and the model, so renamed or copied videos are not described again.
+# The least recently used entries are evicted beyond the entry limit or age.
+USE_DESCRIPTION_CACHE = True
+DESCRIPTION_CACHE_FILE = "description_cache.db"
+DESCRIPTION_CACHE_MAX_ENTRIES = 5000
+DESCRIPTION_CACHE_MAX_AGE_DAYS = 180
+
+# When enabled, the single request that describes a video also returns a
+# title, tags and category as JSON. They are saved in a .json file next to the
+# description and used for the upload; otherwise the title is taken from the
+# filename and tags only come from --keywords.
+GENERATE_METADATA = False
+
+# Before a video is sent anywhere, its container headers (MP4/MOV, MKV/WebM,
+# AVI) are read to find its duration and to skip files that are truncated or
+# corrupt. PROCESS_ORDER sets the order descriptions are generated in:
+# "name", "shortest" or "longest". Ordering by duration reads every video's
+# headers before work starts. Durations also make the ETA more accurate.
+PROBE_MEDIA = True
+PROCESS_ORDER = "name"
+
+# Gemini usage. The tokens (prompt, video and output), bytes uploaded and time
+# of every request are recorded in USAGE_LEDGER_FILE (empty disables it), and
+# priced with the rates per million tokens below. AI_BUDGET_USD and
+# AI_TOKEN_BUDGET (0 disables either) cap usage per AI_BUDGET_PERIOD, "run"
+# or "day". Once AI_BUDGET_SLOWDOWN_FRACTION of a budget is used, videos are
+# described one at a time. A video whose estimated usage would go over the
+# budget is not started: with "day" the run waits for midnight, with "run"
+# it stops. A video estimated to need more than the whole budget is skipped
+# as failed. The watch mode counts as one run. Until there is history, a video is estimated at
+# AI_TOKENS_PER_VIDEO_SECOND input tokens per second of its duration.
+USAGE_LEDGER_FILE = "usage_ledger.db"
+AI_INPUT_PRICE_PER_MILLION_TOKENS = 0.30
+AI_OUTPUT_PRICE_PER_MILLION_TOKENS = 2.50
+AI_BUDGET_USD = 0
+AI_TOKEN_BUDGET = 0
+AI_BUDGET_PERIOD = "day"
+AI_BUDGET_SLOWDOWN_FRACTION = 0.8
+AI_TOKENS_PER_VIDEO_SECOND = 300
+
+# Clients are kept and reused. Each worker holds one YouTube service (with its
+# keep-alive HTTP connection) and one Gemini model, and hands them to the next
+# job and run instead of building new ones. The YouTube discovery document is
+# cached in DISCOVERY_CACHE_DIR (empty keeps it in memory only) for
+# DISCOVERY_CACHE_MAX_AGE_HOURS. OAuth access tokens are refreshed in the
+# background OAUTH_REFRESH_MARGIN_SECONDS before they expire (0 disables
+# this, leaving the refresh to the first request after expiry).
+DISCOVERY_CACHE_DIR = ".discovery_cache"
+DISCOVERY_CACHE_MAX_AGE_HOURS = 24 * 7
+OAUTH_REFRESH_MARGIN_SECONDS = 300
+
+# Videos uploaded to the AI service are remembered in the job ledger (see
+# USE_JOB_LEDGER below) until their description is written, so a failed
+# attempt can be retried against the server copy for as long as it is kept
+# (AI_FILE_TTL_HOURS, unless the service reports an expiry) minus
+# AI_FILE_REUSE_MARGIN_MINUTES. Uploads are named with AI_FILE_DISPLAY_PREFIX,
+# and with AI_FILE_CLEANUP_ON_START any such file no longer remembered is
+# deleted from the service when a run starts. Other copies of the tool that
+# share the API key but not the ledger should use a different prefix, or
+# their uploads in progress are deleted too.
+AI_FILE_DISPLAY_PREFIX = "yt-ai-desc:"
+AI_FILE_TTL_HOURS = 48
+AI_FILE_REUSE_MARGIN_MINUTES = 60
+AI_FILE_CLEANUP_ON_START = True
+
+# The job ledger records each video's progress (queued, uploaded to the AI
+# service, described, uploaded to YouTube with its video ID, moved) in
+# SQLite, so an interrupted run never uploads the same video twice.
+USE_JOB_LEDGER = True
+JOB_LEDGER_FILE = "job_ledger.db"
+
+# In incremental mode only videos that are new or changed since their
+# description was written are processed. The manifest recording each video's
+# size, modification time and status lives in the source directory.
+INCREMENTAL_MODE = False
+MANIFEST_FILENAME = ".description_manifest.json"
+
+# Whether subdirectories of the source directory are scanned for videos.
+# "Uploaded" and hidden folders are always skipped.
+SCAN_RECURSIVE = True
+
+# Watch mode reports a video once its size and modification time have not
+# changed for WATCH_SETTLE_SECONDS. WATCH_POLL_SECONDS is how often files
+# are checked, and how often folders are polled where inotify is unavailable.
+WATCH_SETTLE_SECONDS = 10
+WATCH_POLL_SECONDS = 2
+
+# When enabled, a small proxy of each video is encoded locally and uploaded
+# to the AI service instead of the original. Encoding runs in its own
+# workers so it overlaps with the uploads of other files.
+USE_PROXY = False
+PROXY_WORKERS = 1
+PROXY_HEIGHT = 360
+PROXY_FPS = 10
+PROXY_ENCODER_COMMAND = ["ffmpeg", "-y", "-loglevel", "error", "-i", "{input}",
+                         "-vf", "scale=-2:{height},fps={fps}",
+                         "-c:v", "libx264", "-preset", "veryfast", "-crf", "30",
+                         "-c:a", "aac", "-b:a", "64k", "{output}"]
+
 # Explicitly tell the underlying HTTP transport library not to retry, since
 # we are handling retry logic ourselves.
 httplib2.RETRIES = 1
@@ -59,3 +258,115 @@ https://developers.google.com/api-client-library/python/guide/aaa_client_secrets
                                    CLIENT_SECRETS_FILE))
 
 VALID_PRIVACY_STATUSES = ("public", "private", "unlisted")
+
+# YouTube video categories the model may choose from, by categoryId.
+VIDEO_CATEGORIES = {
+    "1": "Film & Animation",
+    "2": "Autos & Vehicles",
+    "10": "Music",
+    "15": "Pets & Animals",
+    "17": "Sports",
+    "19": "Travel & Events",
+    "20": "Gaming",
+    "22": "People & Blogs",
+    "23": "Comedy",
+    "24": "Entertainment",
+    "25": "News & Politics",
+    "26": "Howto & Style",
+    "27": "Education",
+    "28": "Science & Technology",
+}
+DEFAULT_VIDEO_CATEGORY = "24"
+
+
+# settings.json key, attribute of this module and type of each user setting.
+SETTINGS = [
+    ("google_ai_api_key", "GOOGLE_AI_API_KEY", str),
+    ("max_consecutive_errors", "MAX_CONSECUTIVE_ERRORS", int),
+    ("max_upload_retries", "MAX_RETRIES", int),
+    ("max_concurrent_jobs", "MAX_CONCURRENT_JOBS", int),
+    ("max_concurrent_uploads", "MAX_CONCURRENT_UPLOADS", int),
+    ("upload_bandwidth_limit_mbps", "UPLOAD_BANDWIDTH_LIMIT_MBPS", float),
+    ("youtube_daily_quota", "YOUTUBE_DAILY_QUOTA", int),
+    ("quota_wait_for_reset", "QUOTA_WAIT_FOR_RESET", bool),
+    ("upload_profiles", "UPLOAD_PROFILES", list),
+    ("upload_order", "UPLOAD_ORDER", str),
+    ("upload_priority_patterns", "UPLOAD_PRIORITY_PATTERNS", list),
+    ("pipeline_queue_size", "PIPELINE_QUEUE_SIZE", int),
+    ("ai_requests_per_minute", "AI_REQUESTS_PER_MINUTE", float),
+    ("adaptive_concurrency", "ADAPTIVE_CONCURRENCY", bool),
+    ("adaptive_decrease_factor", "ADAPTIVE_DECREASE_FACTOR", float),
+    ("adaptive_latency_tolerance", "ADAPTIVE_LATENCY_TOLERANCE", float),
+    ("circuit_breaker_failures", "CIRCUIT_BREAKER_FAILURES", int),
+    ("circuit_breaker_cooldown_seconds", "CIRCUIT_BREAKER_COOLDOWN_SECONDS", float),
+    ("circuit_breaker_max_cooldown_seconds", "CIRCUIT_BREAKER_MAX_COOLDOWN_SECONDS", float),
+    ("max_service_retries", "MAX_SERVICE_RETRIES", int),
+    ("poll_seconds_per_mb", "POLL_SECONDS_PER_MB", float),
+    ("use_description_cache", "USE_DESCRIPTION_CACHE", bool),
+    ("description_cache_max_entries", "DESCRIPTION_CACHE_MAX_ENTRIES", int),
+    ("description_cache_max_age_days", "DESCRIPTION_CACHE_MAX_AGE_DAYS", int),
+    ("use_proxy", "USE_PROXY", bool),
+    ("proxy_height", "PROXY_HEIGHT", int),
+    ("proxy_fps", "PROXY_FPS", int),
+    ("proxy_encoder_command", "PROXY_ENCODER_COMMAND", list),
+    ("incremental_mode", "INCREMENTAL_MODE", bool),
+    ("use_job_ledger", "USE_JOB_LEDGER", bool),
+    ("generate_metadata", "GENERATE_METADATA", bool),
+    ("probe_media", "PROBE_MEDIA", bool),
+    ("process_order", "PROCESS_ORDER", str),
+    ("usage_ledger_file", "USAGE_LEDGER_FILE", str),
+    ("ai_input_price_per_million_tokens", "AI_INPUT_PRICE_PER_MILLION_TOKENS", float),
+    ("ai_output_price_per_million_tokens", "AI_OUTPUT_PRICE_PER_MILLION_TOKENS", float),
+    ("ai_budget_usd", "AI_BUDGET_USD", float),
+    ("ai_token_budget", "AI_TOKEN_BUDGET", int),
+    ("ai_budget_period", "AI_BUDGET_PERIOD", str),
+    ("ai_budget_slowdown_fraction", "AI_BUDGET_SLOWDOWN_FRACTION", float),
+    ("ai_tokens_per_video_second", "AI_TOKENS_PER_VIDEO_SECOND", float),
+    ("discovery_cache_dir", "DISCOVERY_CACHE_DIR", str),
+    ("discovery_cache_max_age_hours", "DISCOVERY_CACHE_MAX_AGE_HOURS", float),
+    ("oauth_refresh_margin_seconds", "OAUTH_REFRESH_MARGIN_SECONDS", float),
+    ("ai_file_display_prefix", "AI_FILE_DISPLAY_PREFIX", str),
+    ("ai_file_ttl_hours", "AI_FILE_TTL_HOURS", float),
+    ("ai_file_reuse_margin_minutes", "AI_FILE_REUSE_MARGIN_MINUTES", float),
+    ("ai_file_cleanup_on_start", "AI_FILE_CLEANUP_ON_START", bool),
+    ("job_ledger_file", "JOB_LEDGER_FILE", str),
+    ("scan_recursive", "SCAN_RECURSIVE", bool),
+    ("watch_settle_seconds", "WATCH_SETTLE_SECONDS", float),
+    ("watch_poll_seconds", "WATCH_POLL_SECONDS", float),
+    ("log_max_lines", "LOG_MAX_LINES", int),
+    ("log_file", "LOG_FILE", str),
+    ("log_file_max_bytes", "LOG_FILE_MAX_BYTES", int),
+    ("log_file_backups", "LOG_FILE_BACKUPS", int),
+    ("metrics_summary_interval_seconds", "METRICS_SUMMARY_INTERVAL_SECONDS", float),
+    ("metrics_report_file", "METRICS_REPORT_FILE", str),
+    ("metrics_prometheus_file", "METRICS_PROMETHEUS_FILE", str),
+]
+
+
+def apply_settings(data):
+    """Applies the values of a settings.json dictionary to this module."""
+    module = sys.modules[__name__]
+    for key, name, convert in SETTINGS:
+        if key in data:
+            setattr(module, name, convert(data[key]))
+
+
+def load_settings(path=None):
+    """
+    Reads settings.json and applies it to this module.
+
+    Returns:
+        dict: The raw settings, or an empty dict if the file is missing or
+            unreadable.
+    """
+    path = path or CONFIG_FILE
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        apply_settings(data)
+        return data
+    except Exception as e:
+        print(f"Failed to load config: {e}")
+        return {}
@@ -0,0 +1,98 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import config
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Computes the SHA-256 of a file, reading it in fixed-size chunks so memory
+    use stays flat regardless of the file size.
+
+    Args:
+        path (str): The path to the file.
+        chunk_size (int): The number of bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DescriptionCache(object):
+    """
+    Persistent SQLite cache mapping video content, prompt and model to the
+    generated text. Entries are evicted by age and by total count.
+    """
+    def __init__(self, path=None, max_entries=None, max_age_days=None):
+        self.path = path or config.DESCRIPTION_CACHE_FILE
+        self.max_entries = max_entries if max_entries is not None else config.DESCRIPTION_CACHE_MAX_ENTRIES
+        self.max_age_days = max_age_days if max_age_days is not None else config.DESCRIPTION_CACHE_MAX_AGE_DAYS
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS descriptions ("
+                " key TEXT PRIMARY KEY,"
+                " text TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(video_hash, prompt, model_name):
+        """Combines the video hash, prompt and model name into a cache key."""
+        digest = hashlib.sha256()
+        for part in (video_hash, prompt, model_name):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns the cached text for the key, or None on a miss."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT text FROM descriptions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE descriptions SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, text):
+        """Stores the text for the key and evicts stale entries."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO descriptions (key, text, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, text, now, now))
+            self._evict(now)
+
+    def _evict(self, now):
+        if self.max_age_days:
+            cutoff = now - self.max_age_days * 86400
+            self._conn.execute("DELETE FROM descriptions WHERE last_used < ?", (cutoff,))
+        if self.max_entries:
+            # Drop the least recently used entries beyond the limit
+            self._conn.execute(
+                "DELETE FROM descriptions WHERE key IN ("
+                " SELECT key FROM descriptions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """Returns the process-wide description cache, opening it on first use."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = DescriptionCache()
+        return _shared_cache
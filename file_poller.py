@@ -0,0 +1,128 @@
+import random
+import threading
+import time
+import config
+
+
+class _PendingFile(object):
+    def __init__(self, video_file, first_delay, label):
+        self.file = video_file
+        self.label = label
+        self.started = time.monotonic()
+        self.interval = first_delay
+        self.next_check = self.started + first_delay
+        self.polls = 0
+        self.error = None
+        self.done = threading.Event()
+
+
+class FilePoller(object):
+    """
+    Watches the processing state of uploaded AI files from a single thread.
+
+    Each file is first checked after a short delay (or after an estimate based
+    on its size), then with jittered exponential backoff. However many files
+    are in flight, only one thread sleeps and calls get_file.
+    """
+    def __init__(self, get_file, first_check=None, max_interval=None,
+                 backoff=1.6, jitter=0.25, seconds_per_mb=None):
+        self.get_file = get_file
+        self.first_check = first_check if first_check is not None else config.POLL_FIRST_CHECK_SECONDS
+        self.max_interval = max_interval if max_interval is not None else config.POLL_MAX_INTERVAL_SECONDS
+        self.backoff = backoff
+        self.jitter = jitter
+        self.seconds_per_mb = seconds_per_mb if seconds_per_mb is not None else config.POLL_SECONDS_PER_MB
+        # (label, seconds until ACTIVE, number of get_file calls) for every finished file
+        self.timings = []
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def _first_delay(self, size_bytes):
+        delay = self.first_check
+        if self.seconds_per_mb and size_bytes:
+            estimate = size_bytes / (1024 * 1024) * self.seconds_per_mb
+            delay = max(delay, min(estimate, self.max_interval))
+        return delay
+
+    def _next_interval(self, interval):
+        interval = min(interval * self.backoff, self.max_interval)
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def wait_until_ready(self, video_file, size_bytes=None, label=None):
+        """
+        Blocks until the file leaves the PROCESSING state.
+
+        Args:
+            video_file: The file object returned by genai.upload_file.
+            size_bytes (int): Optional size of the uploaded video, used to
+                estimate the processing time before the first check.
+            label (str): Name to use when reporting the timing.
+
+        Returns:
+            The refreshed file object.
+        """
+        if video_file.state.name != "PROCESSING":
+            return video_file
+
+        entry = _PendingFile(video_file, self._first_delay(size_bytes), label or video_file.name)
+        with self._condition:
+            self._pending[video_file.name] = entry
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+        entry.done.wait()
+        if entry.error is not None:
+            raise entry.error
+        return entry.file
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._pending:
+                    self._thread = None
+                    return
+                now = time.monotonic()
+                due = [e for e in self._pending.values() if e.next_check <= now]
+                if not due:
+                    earliest = min(e.next_check for e in self._pending.values())
+                    self._condition.wait(earliest - now)
+                    continue
+
+            for entry in due:
+                self._poll(entry)
+
+    def _poll(self, entry):
+        try:
+            entry.file = self.get_file(entry.file.name)
+            entry.polls += 1
+        except Exception as e:
+            entry.error = e
+
+        if entry.error is None and entry.file.state.name == "PROCESSING":
+            entry.interval = self._next_interval(entry.interval)
+            entry.next_check = time.monotonic() + entry.interval
+            return
+
+        with self._condition:
+            self._pending.pop(entry.file.name, None)
+        if entry.error is None:
+            elapsed = time.monotonic() - entry.started
+            self.timings.append((entry.label, elapsed, entry.polls))
+            print(f"'{entry.label}' reached {entry.file.state.name} after {elapsed:.1f}s ({entry.polls} check(s)).")
+        entry.done.set()
+
+
+_shared_poller = None
+_shared_poller_lock = threading.Lock()
+
+
+def get_shared_poller(get_file):
+    """Returns the process-wide poller, creating it on first use."""
+    global _shared_poller
+    with _shared_poller_lock:
+        if _shared_poller is None:
+            _shared_poller = FilePoller(get_file)
+        return _shared_poller
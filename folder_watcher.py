@@ -0,0 +1,202 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+import config
+import media_catalog
+
+# inotify event flags, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _scan_dir(path):
+    """Lists the videos and the watchable subdirectories directly inside a folder."""
+    try:
+        videos, subdirs = media_catalog.scan_folder(path)
+    except OSError:
+        return [], []
+    return [entry.path for entry in videos], subdirs
+
+
+class _InotifyBackend(object):
+    """Reports changed paths using Linux inotify, through libc so no extra package is needed."""
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith("linux") and ctypes.util.find_library("c") is not None
+
+    def add_dir(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd >= 0:
+            self._dirs[wd] = path
+
+    def wait(self, timeout):
+        """
+        Returns (changed paths, new directories, overflowed) for the events
+        that arrive within the timeout.
+        """
+        changed, new_dirs, overflowed = set(), [], False
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return changed, new_dirs, overflowed
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed, new_dirs, overflowed
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + name_length].rstrip(b"\0")
+            offset += _EVENT_HEADER.size + name_length
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+                continue
+            parent = self._dirs.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and media_catalog.is_scanned_directory(os.path.basename(path)):
+                    new_dirs.append(path)
+            else:
+                changed.add(path)
+        return changed, new_dirs, overflowed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingBackend(object):
+    """
+    Reports changed paths by polling. Only folders whose modification time
+    changed are listed again, so a large, quiet tree costs one stat per
+    folder per poll.
+    """
+    def __init__(self):
+        self._dirs = {}
+
+    def add_dir(self, path):
+        try:
+            self._dirs[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            pass
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        changed, new_dirs = set(), []
+        for path, mtime_ns in list(self._dirs.items()):
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                del self._dirs[path]
+                continue
+            if current == mtime_ns:
+                continue
+            self._dirs[path] = current
+            videos, subdirs = _scan_dir(path)
+            changed.update(videos)
+            new_dirs.extend(subdir for subdir in subdirs if subdir not in self._dirs)
+        return changed, new_dirs, False
+
+    def close(self):
+        pass
+
+
+class FolderWatcher(object):
+    """
+    Watches a source directory and reports each video once it has finished
+    being written, meaning its size and modification time have not changed
+    for config.WATCH_SETTLE_SECONDS.
+
+    inotify is used where available, with a polling fallback elsewhere.
+    Videos already in the directory when watching starts are reported too.
+    """
+    def __init__(self, directory, on_ready, recursive=None):
+        self.directory = directory
+        self.on_ready = on_ready
+        self.recursive = config.SCAN_RECURSIVE if recursive is None else recursive
+        # path -> (size, mtime_ns, time the values were last seen to change)
+        self._candidates = {}
+        # path -> (size, mtime_ns) when it was reported
+        self._reported = {}
+
+    def _create_backend(self):
+        if _InotifyBackend.available():
+            try:
+                return _InotifyBackend()
+            except OSError as e:
+                print(f"inotify unavailable ({e}), falling back to polling.")
+        return _PollingBackend()
+
+    def _add_tree(self, backend, path):
+        """Starts watching a folder (and its subfolders) and tracks the videos in it."""
+        pending = [path]
+        while pending:
+            current = pending.pop()
+            backend.add_dir(current)
+            videos, subdirs = _scan_dir(current)
+            for video_path in videos:
+                self._track(video_path)
+            if self.recursive:
+                pending.extend(subdirs)
+
+    def _track(self, path):
+        if media_catalog.is_video(path) and path not in self._candidates:
+            self._candidates[path] = (None, None, time.monotonic())
+
+    def _check_candidates(self):
+        now = time.monotonic()
+        for path, (size, mtime_ns, since) in list(self._candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Deleted or moved away before it settled
+                del self._candidates[path]
+                continue
+
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != (size, mtime_ns) or stat.st_size == 0:
+                self._candidates[path] = current + (now,)
+            elif now - since >= config.WATCH_SETTLE_SECONDS:
+                del self._candidates[path]
+                if self._reported.get(path) != current:
+                    self._reported[path] = current
+                    self.on_ready(path)
+
+    def run(self, stop_event):
+        """Watches until stop_event is set."""
+        backend = self._create_backend()
+        print(f"Watching '{os.path.abspath(self.directory)}' for new videos ({type(backend).__name__.strip('_')}).")
+        try:
+            self._add_tree(backend, self.directory)
+            while not stop_event.is_set():
+                changed, new_dirs, overflowed = backend.wait(config.WATCH_POLL_SECONDS)
+                if overflowed:
+                    # Events were lost, so look at everything once more
+                    self._add_tree(backend, self.directory)
+                for path in changed:
+                    self._track(path)
+                if self.recursive:
+                    for path in new_dirs:
+                        self._add_tree(backend, path)
+                self._check_candidates()
+        finally:
+            backend.close()
+        print("Stopped watching.")
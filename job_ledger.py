@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import threading
+import time
+import config
+import media_catalog
+
+QUEUED = "queued"
+AI_UPLOADED = "ai_uploaded"
+DESCRIBED = "described"
+YT_UPLOADED = "yt_uploaded"
+MOVED = "moved"
+FAILED = "failed"
+
+STATES = [QUEUED, AI_UPLOADED, DESCRIBED, YT_UPLOADED, MOVED, FAILED]
+
+
+_COLUMNS = ("path, size, mtime_ns, state, ai_file, ai_file_expires, video_id, description_path, moved_path,"
+            " error, updated")
+
+
+def _fingerprint(stat):
+    return stat.st_size, stat.st_mtime_ns
+
+
+class JobLedger(object):
+    """
+    Durable record of where each video is in the workflow, kept in SQLite in
+    WAL mode so a state change is on disk before the next step starts.
+
+    A job moves through queued, ai_uploaded, described, yt_uploaded (with the
+    YouTube video ID) and moved, or ends in failed. While a video's upload to
+    the AI service may still be reused, its server-side name and expiry are
+    kept in ai_file and ai_file_expires. Jobs are keyed by the absolute path
+    the video had in the source directory, together with its size and
+    modification time, so a different file dropped in under the same name
+    starts a fresh job.
+    """
+    def __init__(self, path=None):
+        self.path = path or config.JOB_LEDGER_FILE
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL survives a process crash without an fsync per write
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " path TEXT PRIMARY KEY,"
+                " size INTEGER,"
+                " mtime_ns INTEGER,"
+                " state TEXT NOT NULL,"
+                " ai_file TEXT,"
+                " ai_file_expires REAL,"
+                " video_id TEXT,"
+                " description_path TEXT,"
+                " moved_path TEXT,"
+                " error TEXT,"
+                " updated REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+            if "ai_file_expires" not in columns:
+                # Ledgers from before AI file reuse moved here
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN ai_file_expires REAL")
+
+    def _row(self, path):
+        cursor = self._conn.execute("SELECT %s FROM jobs WHERE path = ?" % _COLUMNS, (path,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([column[0] for column in cursor.description], row))
+
+    def get(self, video_path, stat=None):
+        """
+        Returns the job for a video as a dict, or None if there is none.
+
+        When `stat` is given, a job recorded for a different version of the
+        file is treated as missing.
+        """
+        with self._lock:
+            job = self._row(os.path.abspath(video_path))
+        if job is not None and stat is not None and (job["size"], job["mtime_ns"]) != _fingerprint(stat):
+            return None
+        return job
+
+    def record(self, video_path, state, stat=None, **fields):
+        """
+        Records a state transition for a video.
+
+        Args:
+            video_path (str): The path of the video in the source directory.
+            state (str): One of STATES.
+            stat (os.stat_result): The video's stat. Needed when the job is
+                first recorded; if it differs from the recorded file, the
+                job starts over.
+            **fields: Any of ai_file, ai_file_expires, video_id,
+                description_path, moved_path and error to store with the
+                transition.
+        """
+        path = os.path.abspath(video_path)
+        with self._lock, self._conn:
+            job = self._row(path)
+            if stat is not None and (job is None or (job["size"], job["mtime_ns"]) != _fingerprint(stat)):
+                size, mtime_ns = _fingerprint(stat)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs (path, size, mtime_ns, state, updated) VALUES (?, ?, ?, ?, ?)",
+                    (path, size, mtime_ns, state, time.time()))
+            elif job is None:
+                self._conn.execute("INSERT INTO jobs (path, state, updated) VALUES (?, ?, ?)",
+                                   (path, state, time.time()))
+            columns = ["state = ?", "updated = ?"]
+            values = [state, time.time()]
+            if state != FAILED:
+                fields.setdefault("error", None)
+            for name in ("ai_file", "ai_file_expires", "video_id", "description_path", "moved_path", "error"):
+                if name in fields:
+                    columns.append("%s = ?" % name)
+                    values.append(fields[name])
+            self._conn.execute("UPDATE jobs SET %s WHERE path = ?" % ", ".join(columns), values + [path])
+
+    def jobs_in_state(self, state, directory=None):
+        """Returns the jobs in a state, optionally limited to a directory tree."""
+        query = "SELECT %s FROM jobs WHERE state = ?" % _COLUMNS
+        values = [state]
+        if directory:
+            query += " AND path >= ? AND path < ?"
+            values += self._prefix_range(directory)
+        with self._lock:
+            cursor = self._conn.execute(query, values)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def ai_files(self):
+        """Returns {server-side name: expiry as a Unix timestamp} for every AI file still recorded."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ai_file, ai_file_expires FROM jobs WHERE ai_file IS NOT NULL").fetchall()
+        return {name: expires or 0 for name, expires in rows}
+
+    def clear_ai_file(self, video_path):
+        """Forgets a video's AI file without changing the job's state."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET ai_file = NULL, ai_file_expires = NULL WHERE path = ?",
+                               (os.path.abspath(video_path),))
+
+    def forget_ai_files(self, names, expired_before):
+        """Forgets the given AI files, and any that expired before the given Unix time."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET ai_file = NULL, ai_file_expires = NULL"
+                               " WHERE ai_file IS NOT NULL AND ai_file_expires <= ?", (expired_before,))
+            self._conn.executemany("UPDATE jobs SET ai_file = NULL, ai_file_expires = NULL WHERE ai_file = ?",
+                                   [(name,) for name in names])
+
+    def counts(self, directory=None):
+        """
+        Returns the number of jobs in each state, for progress displays.
+        This is a single indexed query and cheap enough to poll.
+        """
+        query = "SELECT state, COUNT(*) FROM jobs"
+        values = []
+        if directory:
+            query += " WHERE path >= ? AND path < ?"
+            values = self._prefix_range(directory)
+        query += " GROUP BY state"
+        with self._lock:
+            counts = dict(self._conn.execute(query, values).fetchall())
+        return {state: counts.get(state, 0) for state in STATES}
+
+    @staticmethod
+    def _prefix_range(directory):
+        # Every path under the directory sorts between "dir/" and "dir0"
+        prefix = os.path.join(os.path.abspath(directory), "")
+        return [prefix, prefix[:-1] + chr(ord(os.sep) + 1)]
+
+    def recover(self, directory):
+        """
+        Finishes jobs that were uploaded to YouTube but not fully moved into
+        Uploaded before the program stopped. Videos still in the source
+        directory are left for the upload workers, which move them without
+        uploading them again.
+
+        Returns:
+            int: The number of jobs completed.
+        """
+        recovered = 0
+        for job in self.jobs_in_state(YT_UPLOADED, directory):
+            video_path = job["path"]
+            uploaded_dir = os.path.join(os.path.dirname(video_path), "Uploaded")
+            moved_path = os.path.join(uploaded_dir, os.path.basename(video_path))
+            if os.path.exists(video_path) or not os.path.exists(moved_path):
+                continue
+            # The video was moved; bring its description and metadata along if that step was cut short
+            leftovers = [job["description_path"], media_catalog.metadata_path_for(video_path)]
+            try:
+                for path in leftovers:
+                    if path and os.path.exists(path):
+                        os.rename(path, os.path.join(uploaded_dir, os.path.basename(path)))
+            except OSError as e:
+                print("Could not move '%s' into Uploaded: %s" % (os.path.basename(path), e))
+                continue
+            self.record(video_path, MOVED, moved_path=moved_path)
+            recovered += 1
+        if recovered:
+            print("Recovered %d upload(s) that were not moved into Uploaded." % recovered)
+        return recovered
+
+
+_shared_ledger = None
+_shared_ledger_lock = threading.Lock()
+
+
+def get_shared_ledger():
+    """
+    Returns the process-wide job ledger, opening it on first use, or None
+    when config.USE_JOB_LEDGER is off.
+    """
+    global _shared_ledger
+    if not config.USE_JOB_LEDGER:
+        return None
+    with _shared_ledger_lock:
+        if _shared_ledger is None:
+            _shared_ledger = JobLedger()
+        return _shared_ledger
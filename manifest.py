@@ -0,0 +1,93 @@
+import json
+import os
+import config
+from media_catalog import description_path_for
+
+
+class Manifest(object):
+    """
+    Records the size, modification time and description status of every
+    video in a directory, so that re-runs only touch new or modified files.
+
+    Planning only needs one os.stat per video and no network access.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, config.MANIFEST_FILENAME)
+        self.entries = {}
+        self.skipped_count = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("files", {})
+            except Exception as e:
+                print(f"Could not read manifest '{self.path}', starting a new one: {e}")
+
+    def _key(self, video_path):
+        return os.path.relpath(video_path, self.directory).replace(os.sep, "/")
+
+    def needs_processing(self, video_path, stat=None):
+        """
+        Returns True if the video is new, has changed since it was described,
+        or has no description file on disk.
+        """
+        stat = stat or os.stat(video_path)
+        description_path = description_path_for(video_path)
+        entry = self.entries.get(self._key(video_path))
+
+        if entry is None:
+            # Adopt descriptions written before the manifest existed, as long
+            # as they are newer than the video.
+            try:
+                description_stat = os.stat(description_path)
+            except OSError:
+                return True
+            if description_stat.st_mtime_ns < stat.st_mtime_ns:
+                return True
+            self.mark_described(video_path, description_path, stat)
+            return False
+
+        if entry.get("status") != "described":
+            return True
+        if entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+            return True
+        return not os.path.exists(description_path)
+
+    def filter(self, entries, on_skipped=None):
+        """
+        Lazily yields the catalog entries that need a description, counting
+        the skipped ones in skipped_count. on_skipped, if given, is called
+        with each skipped entry.
+        """
+        for entry in entries:
+            if self.needs_processing(entry.path, entry.stat()):
+                yield entry
+            else:
+                self.skipped_count += 1
+                if on_skipped:
+                    on_skipped(entry)
+
+    def _record(self, video_path, status, stat=None, **extra):
+        stat = stat or os.stat(video_path)
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "status": status}
+        entry.update(extra)
+        self.entries[self._key(video_path)] = entry
+
+    def mark_described(self, video_path, description_path, stat=None):
+        self._record(video_path, "described", stat, description=os.path.basename(description_path))
+
+    def mark_failed(self, video_path, error):
+        try:
+            self._record(video_path, "failed", error=str(error))
+        except OSError:
+            pass
+
+    def save(self):
+        """Writes the manifest atomically so a crash never leaves it half written."""
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "files": self.entries}, f, indent=1)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"Failed to save manifest: {e}")
@@ -0,0 +1,147 @@
+import os
+import config
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv"}
+
+# Folders that hold finished work and are never scanned
+SKIPPED_DIRECTORIES = {"Uploaded"}
+
+# YouTube's limit on the combined length of a video's tags
+MAX_TAGS_LENGTH = 500
+
+
+def description_path_for(video_path):
+    """Returns the path of the description file that belongs to a video."""
+    return os.path.splitext(video_path)[0] + ".txt"
+
+
+def metadata_path_for(video_path):
+    """Returns the path of the generated title, tags and category file that belongs to a video."""
+    return os.path.splitext(video_path)[0] + ".json"
+
+
+def limit_tags(tags, max_length=MAX_TAGS_LENGTH):
+    """
+    Tidies a list of tags for YouTube: angle brackets (which YouTube
+    rejects), extra whitespace, blanks and duplicates are removed, and tags
+    that would take the combined length over max_length are dropped, the
+    earlier tags winning. Each tag counts with one separator.
+    """
+    limited = []
+    length = 0
+    for tag in tags:
+        tag = " ".join(str(tag).replace("<", "").replace(">", "").split())
+        if not tag or tag in limited or length + len(tag) > max_length:
+            continue
+        limited.append(tag)
+        length += len(tag) + 1
+    return limited
+
+
+class CatalogEntry(object):
+    """A video found by the catalog. The stat result is fetched once and cached."""
+    __slots__ = ("path", "name", "_dir_entry", "_stat")
+
+    def __init__(self, dir_entry):
+        self.path = dir_entry.path
+        self.name = dir_entry.name
+        self._dir_entry = dir_entry
+        self._stat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = self._dir_entry.stat()
+        return self._stat
+
+    @property
+    def size(self):
+        return self.stat().st_size
+
+    @property
+    def mtime_ns(self):
+        return self.stat().st_mtime_ns
+
+    @property
+    def description_path(self):
+        return description_path_for(self.path)
+
+    def __repr__(self):
+        return "CatalogEntry(%r)" % self.path
+
+
+def is_video(name, extensions=VIDEO_EXTENSIONS):
+    """Returns True if a file name has one of the video extensions."""
+    return os.path.splitext(name)[1].lower() in extensions
+
+
+def is_scanned_directory(name):
+    """Returns True for subdirectories that are scanned; "Uploaded" and hidden folders are not."""
+    return name not in SKIPPED_DIRECTORIES and not name.startswith(".")
+
+
+def scan_folder(path, extensions=VIDEO_EXTENSIONS):
+    """
+    Lists what is directly inside one folder, in name order.
+
+    Args:
+        path (str): The folder to list.
+        extensions (set): Lower-case file extensions to accept.
+
+    Returns:
+        tuple: (list of CatalogEntry for the videos, list of the paths of
+            the subdirectories that are scanned).
+
+    Raises:
+        OSError: If the folder cannot be listed.
+    """
+    with os.scandir(path) as it:
+        dir_entries = sorted(it, key=lambda e: e.name)
+
+    videos, subdirs = [], []
+    for dir_entry in dir_entries:
+        try:
+            if dir_entry.is_dir(follow_symlinks=False):
+                if is_scanned_directory(dir_entry.name):
+                    subdirs.append(dir_entry.path)
+            elif is_video(dir_entry.name, extensions):
+                videos.append(CatalogEntry(dir_entry))
+        except OSError as e:
+            print(f"Could not read '{dir_entry.path}': {e}")
+    return videos, subdirs
+
+
+def iter_videos(directory, recursive=None, extensions=VIDEO_EXTENSIONS):
+    """
+    Lazily yields the videos under a directory, in name order within each
+    folder. Subdirectories are walked when recursive is on (the default comes
+    from config.SCAN_RECURSIVE); "Uploaded" and hidden folders are skipped.
+
+    Args:
+        directory (str): The directory to scan.
+        recursive (bool): Whether to descend into subdirectories.
+        extensions (set): Lower-case file extensions to accept.
+
+    Yields:
+        CatalogEntry: One entry per video file.
+    """
+    if recursive is None:
+        recursive = config.SCAN_RECURSIVE
+
+    pending_dirs = [directory]
+    while pending_dirs:
+        current = pending_dirs.pop()
+        try:
+            videos, subdirs = scan_folder(current, extensions)
+        except FileNotFoundError:
+            print(f"Error: The directory '{current}' was not found.")
+            continue
+        except OSError as e:
+            print(f"Could not scan '{current}': {e}")
+            continue
+
+        for entry in videos:
+            yield entry
+
+        # Visit subdirectories in name order after the files of this folder
+        if recursive:
+            pending_dirs.extend(reversed(subdirs))
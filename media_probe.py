@@ -0,0 +1,333 @@
+import os
+import struct
+import threading
+
+# Box types that may appear at the top level of an MP4/MOV file
+_MP4_TOP_LEVEL_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot", b"uuid", b"meta",
+                        b"moof", b"mfra", b"sidx", b"styp", b"pdin", b"emsg", b"prft"}
+
+# Matroska element IDs, with their length marker bits
+_EBML_HEADER = 0x1A45DFA3
+_EBML_SEGMENT = 0x18538067
+_EBML_INFO = 0x1549A966
+_EBML_TIMECODE_SCALE = 0x2AD7B1
+_EBML_DURATION = 0x4489
+_EBML_TRACKS = 0x1654AE6B
+_EBML_TRACK_ENTRY = 0xAE
+_EBML_VIDEO = 0xE0
+_EBML_PIXEL_WIDTH = 0xB0
+_EBML_PIXEL_HEIGHT = 0xBA
+
+_ASF_HEADER_GUID = bytes.fromhex("3026b2758e66cf11a6d900aa0062ce6c")
+
+# Top-level elements looked at before giving up on finding the MKV headers
+_MAX_EBML_ELEMENTS = 256
+
+
+class BrokenVideoError(ValueError):
+    """Raised for a video whose container headers show it is truncated or corrupt."""
+
+
+class _Broken(Exception):
+    pass
+
+
+class ProbeResult(object):
+    """
+    What the container headers say about a video. `duration` (seconds),
+    `width` and `height` are None when the headers do not record them or
+    the container is not one the probe reads. `problem` describes why the
+    file is broken, or is None when it looks intact.
+    """
+    def __init__(self, container, duration=None, width=None, height=None, problem=None):
+        self.container = container
+        self.duration = duration
+        self.width = width
+        self.height = height
+        self.problem = problem
+
+    @property
+    def ok(self):
+        return self.problem is None
+
+    def __repr__(self):
+        return "ProbeResult(%r, duration=%r, width=%r, height=%r, problem=%r)" % (
+            self.container, self.duration, self.width, self.height, self.problem)
+
+
+def _read_exact(f, offset, size):
+    f.seek(offset)
+    data = f.read(size)
+    if len(data) < size:
+        raise _Broken("the file ends in the middle of its headers")
+    return data
+
+
+def _iter_mp4_boxes(f, start, end, file_size):
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack(">I4s", _read_exact(f, offset, 8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", _read_exact(f, offset + 8, 8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            raise _Broken("box '%s' has an invalid size" % box_type.decode("latin-1"))
+        if offset + size > file_size:
+            raise _Broken("the file is truncated inside its '%s' box" % box_type.decode("latin-1"))
+        if offset + size > end:
+            raise _Broken("box '%s' overruns its parent" % box_type.decode("latin-1"))
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _probe_mp4(f, file_size):
+    result = ProbeResult("mp4")
+    if _read_exact(f, 4, 4) not in _MP4_TOP_LEVEL_BOXES:
+        raise _Broken("this is not an MP4/MOV file")
+    seen = set()
+    for box_type, start, end in _iter_mp4_boxes(f, 0, file_size, file_size):
+        seen.add(box_type)
+        if box_type != b"moov":
+            continue
+        for child_type, child_start, child_end in _iter_mp4_boxes(f, start, end, file_size):
+            if child_type == b"mvhd":
+                version = _read_exact(f, child_start, 1)[0]
+                if version == 1:
+                    timescale, duration = struct.unpack(">IQ", _read_exact(f, child_start + 20, 12))
+                    unknown = 0xFFFFFFFFFFFFFFFF
+                else:
+                    timescale, duration = struct.unpack(">II", _read_exact(f, child_start + 12, 8))
+                    unknown = 0xFFFFFFFF
+                if timescale and duration and duration != unknown:
+                    result.duration = float(duration) / timescale
+            elif child_type == b"trak":
+                for track_type, track_start, track_end in _iter_mp4_boxes(f, child_start, child_end, file_size):
+                    if track_type != b"tkhd":
+                        continue
+                    version = _read_exact(f, track_start, 1)[0]
+                    size_offset = 88 if version == 1 else 76
+                    width, height = struct.unpack(">II", _read_exact(f, track_start + size_offset, 8))
+                    # 16.16 fixed point; audio tracks report 0 x 0
+                    if width >> 16 and height >> 16 and (result.width or 0) < width >> 16:
+                        result.width, result.height = width >> 16, height >> 16
+    if b"moov" not in seen:
+        raise _Broken("it has no 'moov' header, so the recording was probably interrupted")
+    if b"mdat" not in seen:
+        raise _Broken("it has no media data")
+    return result
+
+
+def _read_ebml_id(f, offset):
+    first = _read_exact(f, offset, 1)[0]
+    length = 1
+    while length <= 4 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 4:
+        raise _Broken("it has an invalid Matroska element")
+    data = _read_exact(f, offset, length)
+    return int.from_bytes(data, "big"), offset + length
+
+
+def _read_ebml_size(f, offset):
+    first = _read_exact(f, offset, 1)[0]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise _Broken("it has an invalid Matroska element size")
+    data = bytearray(_read_exact(f, offset, length))
+    data[0] &= 0xFF >> length
+    value = int.from_bytes(data, "big")
+    # All value bits set means the size is unknown, as in live recordings
+    if value == (1 << (7 * length)) - 1:
+        value = None
+    return value, offset + length
+
+
+def _iter_ebml_elements(f, start, end, file_size):
+    offset = start
+    while offset < end:
+        element_id, offset = _read_ebml_id(f, offset)
+        size, data_start = _read_ebml_size(f, offset)
+        if size is not None and data_start + size > file_size:
+            raise _Broken("the file is truncated inside a Matroska element")
+        yield element_id, data_start, size
+        if size is None:
+            return
+        offset = data_start + size
+
+
+def _probe_mkv(f, file_size):
+    result = ProbeResult("mkv")
+    element_id, offset = _read_ebml_id(f, 0)
+    if element_id != _EBML_HEADER:
+        raise _Broken("this is not a Matroska/WebM file")
+    size, data_start = _read_ebml_size(f, offset)
+    if size is None:
+        raise _Broken("it has an invalid Matroska header")
+    offset = data_start + size
+
+    element_id, offset = _read_ebml_id(f, offset)
+    if element_id != _EBML_SEGMENT:
+        raise _Broken("it has no Matroska segment")
+    segment_size, segment_start = _read_ebml_size(f, offset)
+    if segment_size is not None and segment_start + segment_size > file_size:
+        raise _Broken("the file is shorter than its Matroska segment, so it was probably cut off")
+    segment_end = segment_start + segment_size if segment_size is not None else file_size
+
+    timecode_scale = 1000000
+    duration = None
+    found = set()
+    elements = _iter_ebml_elements(f, segment_start, segment_end, file_size)
+    for _, (element_id, start, size) in zip(range(_MAX_EBML_ELEMENTS), elements):
+        if size is None:
+            break
+        if element_id == _EBML_INFO:
+            found.add(element_id)
+            for child_id, child_start, child_size in _iter_ebml_elements(f, start, start + size, file_size):
+                if child_id == _EBML_TIMECODE_SCALE and child_size:
+                    timecode_scale = int.from_bytes(_read_exact(f, child_start, child_size), "big")
+                elif child_id == _EBML_DURATION and child_size in (4, 8):
+                    duration = struct.unpack(">f" if child_size == 4 else ">d",
+                                             _read_exact(f, child_start, child_size))[0]
+        elif element_id == _EBML_TRACKS:
+            found.add(element_id)
+            for entry_id, entry_start, entry_size in _iter_ebml_elements(f, start, start + size, file_size):
+                if entry_id != _EBML_TRACK_ENTRY or entry_size is None:
+                    continue
+                for track_id, track_start, track_size in _iter_ebml_elements(
+                        f, entry_start, entry_start + entry_size, file_size):
+                    if track_id != _EBML_VIDEO or track_size is None:
+                        continue
+                    for video_id, video_start, video_size in _iter_ebml_elements(
+                            f, track_start, track_start + track_size, file_size):
+                        if video_id in (_EBML_PIXEL_WIDTH, _EBML_PIXEL_HEIGHT) and video_size:
+                            value = int.from_bytes(_read_exact(f, video_start, video_size), "big")
+                            if video_id == _EBML_PIXEL_WIDTH:
+                                result.width = result.width or value
+                            else:
+                                result.height = result.height or value
+        if len(found) == 2:
+            break
+    if duration:
+        # Duration is counted in TimecodeScale nanosecond ticks
+        result.duration = duration * timecode_scale / 1e9
+    return result
+
+
+def _probe_avi(f, file_size):
+    result = ProbeResult("avi")
+    riff, riff_size, form = struct.unpack("<4sI4s", _read_exact(f, 0, 12))
+    if riff != b"RIFF" or form != b"AVI ":
+        raise _Broken("this is not an AVI file")
+    if 8 + riff_size > file_size:
+        raise _Broken("the file is shorter than its RIFF header says, so it was probably cut off")
+    offset = 12
+    end = 8 + riff_size
+    while offset + 8 <= end:
+        chunk_id, chunk_size = struct.unpack("<4sI", _read_exact(f, offset, 8))
+        if chunk_id == b"LIST" and _read_exact(f, offset + 8, 4) == b"hdrl":
+            avih_id, avih_size = struct.unpack("<4sI", _read_exact(f, offset + 12, 8))
+            if avih_id != b"avih" or avih_size < 40:
+                raise _Broken("its AVI header is missing")
+            fields = struct.unpack("<10I", _read_exact(f, offset + 20, 40))
+            microseconds_per_frame, total_frames, width, height = fields[0], fields[4], fields[8], fields[9]
+            if microseconds_per_frame and total_frames:
+                result.duration = total_frames * microseconds_per_frame / 1e6
+            result.width, result.height = width or None, height or None
+            return result
+        # Chunks are padded to an even length
+        offset += 8 + chunk_size + (chunk_size & 1)
+    raise _Broken("its AVI header is missing")
+
+
+def _probe_signature(f, container, signature):
+    if _read_exact(f, 0, len(signature)) != signature:
+        raise _Broken("this is not a %s file" % container.upper())
+    return ProbeResult(container)
+
+
+_PROBES = {
+    ".mp4": _probe_mp4,
+    ".mov": _probe_mp4,
+    ".m4v": _probe_mp4,
+    ".mkv": _probe_mkv,
+    ".webm": _probe_mkv,
+    ".avi": _probe_avi,
+    ".wmv": lambda f, file_size: _probe_signature(f, "wmv", _ASF_HEADER_GUID),
+    ".flv": lambda f, file_size: _probe_signature(f, "flv", b"FLV"),
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def probe(video_path):
+    """
+    Reads a video's container headers, without decoding any media, to find
+    its duration and resolution and to spot files that are truncated or
+    corrupt. MP4/MOV, Matroska/WebM and AVI are parsed; WMV and FLV only have
+    their signature checked. Results are cached until the file changes.
+
+    Returns:
+        ProbeResult: What the headers say about the video.
+    """
+    extension = os.path.splitext(video_path)[1].lower()
+    try:
+        stat = os.stat(video_path)
+    except OSError as e:
+        return ProbeResult(extension.lstrip("."), problem="it could not be read (%s)" % e)
+    key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+    with _cache_lock:
+        result = _cache.get(key)
+    if result is not None:
+        return result
+
+    probe_container = _PROBES.get(extension)
+    if not stat.st_size:
+        result = ProbeResult(extension.lstrip("."), problem="the file is empty")
+    elif probe_container is None:
+        result = ProbeResult(extension.lstrip("."))
+    else:
+        try:
+            with open(video_path, "rb") as f:
+                result = probe_container(f, stat.st_size)
+        except _Broken as e:
+            result = ProbeResult(extension.lstrip("."), problem=str(e))
+        except (OSError, struct.error) as e:
+            result = ProbeResult(extension.lstrip("."), problem="its headers could not be read (%s)" % e)
+
+    with _cache_lock:
+        _cache[key] = result
+    return result
+
+
+def ensure_intact(video_path):
+    """Raises BrokenVideoError if the probe finds the video truncated or corrupt."""
+    result = probe(video_path)
+    if not result.ok:
+        raise BrokenVideoError("'%s' was skipped because %s." % (os.path.basename(video_path), result.problem))
+    return result
+
+
+def order_by_duration(items, path_of, longest_first=False):
+    """
+    Sorts items by the duration of their video, shortest first unless
+    `longest_first` is set. Videos whose duration is unknown go last, by
+    size.
+    """
+    def sort_key(item):
+        path = path_of(item)
+        duration = probe(path).duration
+        if duration is None:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            return (1, -size if longest_first else size, path)
+        return (0, -duration if longest_first else duration, path)
+
+    return sorted(items, key=sort_key)
@@ -0,0 +1,196 @@
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+import config
+
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Metrics(object):
+    """
+    Lightweight, thread-safe run instrumentation: per-stage timers, event
+    counters and bytes transferred.
+
+    Entry points wrap their work in run(). The outermost run resets the
+    figures, prints a live summary every config.METRICS_SUMMARY_INTERVAL_SECONDS,
+    and on exit writes the JSON report and the Prometheus textfile if they
+    are configured.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._stop_summary = None
+        self._reset("")
+
+    def _reset(self, label):
+        self.label = label
+        self.started = time.time()
+        self.stage_seconds = {}
+        self.counters = {}
+        self.bytes = {}
+        self.expected = {}
+        self.expected_work = {}
+        self.work_done = {}
+
+    @contextlib.contextmanager
+    def run(self, label):
+        with self._lock:
+            self._depth += 1
+            outermost = self._depth == 1
+            if outermost:
+                self._reset(label)
+        if outermost and config.METRICS_SUMMARY_INTERVAL_SECONDS > 0:
+            self._stop_summary = threading.Event()
+            threading.Thread(target=self._summary_loop, args=(self._stop_summary,), daemon=True).start()
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._depth -= 1
+            if outermost:
+                if self._stop_summary is not None:
+                    self._stop_summary.set()
+                print(self.summary_line())
+                self.export()
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - started)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.stage_seconds.setdefault(stage, []).append(seconds)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_bytes(self, name, amount):
+        with self._lock:
+            self.bytes[name] = self.bytes.get(name, 0) + amount
+
+    def set_expected(self, name, total, work=None):
+        """
+        Sets how many `name` events the run expects in total, for the ETA.
+        When `work` (for example seconds of video) is given, the ETA is based
+        on the share of that work done, reported with add_work, instead of
+        the event count.
+        """
+        with self._lock:
+            self.expected[name] = total
+            if work:
+                self.expected_work[name] = work
+            else:
+                self.expected_work.pop(name, None)
+
+    def add_work(self, name, amount):
+        with self._lock:
+            self.work_done[name] = self.work_done.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.time() - self.started
+            stages = {}
+            for stage, values in self.stage_seconds.items():
+                ordered = sorted(values)
+                stages[stage] = {
+                    "count": len(ordered),
+                    "total_seconds": sum(ordered),
+                    "p50_seconds": _percentile(ordered, 0.50),
+                    "p95_seconds": _percentile(ordered, 0.95),
+                    "max_seconds": ordered[-1],
+                }
+            throughput = {name: count * 3600.0 / elapsed for name, count in self.counters.items() if elapsed > 0}
+            eta = {}
+            for name, total in self.expected.items():
+                done = self.counters.get(name, 0)
+                work = self.expected_work.get(name)
+                work_done = self.work_done.get(name, 0)
+                if work and work_done and total > done:
+                    eta[name] = max(0.0, work - work_done) * elapsed / work_done
+                elif done and total > done:
+                    eta[name] = (total - done) * elapsed / done
+            return {
+                "label": self.label,
+                "started": self.started,
+                "elapsed_seconds": elapsed,
+                "stages": stages,
+                "counters": dict(self.counters),
+                "bytes": dict(self.bytes),
+                "per_hour": throughput,
+                "eta_seconds": eta,
+            }
+
+    def summary_line(self):
+        snapshot = self.snapshot()
+        parts = ["[%s %.0fs]" % (snapshot["label"] or "run", snapshot["elapsed_seconds"])]
+        for name, per_hour in sorted(snapshot["per_hour"].items()):
+            parts.append("%s=%d (%.1f/h)" % (name, snapshot["counters"][name], per_hour))
+        for stage, values in sorted(snapshot["stages"].items()):
+            parts.append("%s p50=%.1fs p95=%.1fs" % (stage, values["p50_seconds"], values["p95_seconds"]))
+        for name, seconds in sorted(snapshot["eta_seconds"].items()):
+            parts.append("ETA %s %.0fm" % (name, seconds / 60))
+        return "Metrics: " + ", ".join(parts)
+
+    def _summary_loop(self, stop_event):
+        while not stop_event.wait(config.METRICS_SUMMARY_INTERVAL_SECONDS):
+            print(self.summary_line())
+
+    def export(self):
+        snapshot = self.snapshot()
+        if config.METRICS_REPORT_FILE:
+            _write_atomically(config.METRICS_REPORT_FILE, json.dumps(snapshot, indent=4))
+        if config.METRICS_PROMETHEUS_FILE:
+            _write_atomically(config.METRICS_PROMETHEUS_FILE, self.prometheus_text(snapshot))
+
+    def prometheus_text(self, snapshot=None):
+        """Renders the figures in the Prometheus text exposition format."""
+        snapshot = snapshot or self.snapshot()
+        lines = [
+            "# HELP yt_ai_stage_seconds Time spent per stage.",
+            "# TYPE yt_ai_stage_seconds summary",
+        ]
+        for stage, values in sorted(snapshot["stages"].items()):
+            lines.append('yt_ai_stage_seconds{stage="%s",quantile="0.5"} %f' % (stage, values["p50_seconds"]))
+            lines.append('yt_ai_stage_seconds{stage="%s",quantile="0.95"} %f' % (stage, values["p95_seconds"]))
+            lines.append('yt_ai_stage_seconds_sum{stage="%s"} %f' % (stage, values["total_seconds"]))
+            lines.append('yt_ai_stage_seconds_count{stage="%s"} %d' % (stage, values["count"]))
+        lines += ["# HELP yt_ai_events_total Events counted during the run.",
+                  "# TYPE yt_ai_events_total counter"]
+        for name, count in sorted(snapshot["counters"].items()):
+            lines.append('yt_ai_events_total{name="%s"} %d' % (name, count))
+        lines += ["# HELP yt_ai_bytes_total Bytes transferred during the run.",
+                  "# TYPE yt_ai_bytes_total counter"]
+        for name, count in sorted(snapshot["bytes"].items()):
+            lines.append('yt_ai_bytes_total{name="%s"} %d' % (name, count))
+        lines += ["# HELP yt_ai_run_elapsed_seconds Wall-clock time of the run.",
+                  "# TYPE yt_ai_run_elapsed_seconds gauge",
+                  "yt_ai_run_elapsed_seconds %f" % snapshot["elapsed_seconds"]]
+        return "\n".join(lines) + "\n"
+
+
+def _write_atomically(path, text):
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    except Exception as e:
+        print(f"Failed to write metrics to '{path}': {e}")
+
+
+# Shared by every module in the process
+metrics = Metrics()
@@ -0,0 +1,260 @@
+import contextlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import backpressure
+import config
+import job_ledger
+import media_catalog
+import media_probe
+import video_processor
+import youtube_uploader
+import usage_ledger
+from folder_watcher import FolderWatcher
+from manifest import Manifest
+from rate_limiter import RateLimiter
+from metrics import metrics
+
+
+def run_pipeline(directory, on_complete, upload_args=None, on_file_done=None, on_uploaded=None):
+    """
+    Generates descriptions and uploads videos at the same time.
+
+    Each video is handed to the upload workers as soon as its description
+    has been written. In incremental mode, videos skipped because they were
+    described by an earlier run are queued for upload as they are found, so
+    a video whose upload failed is tried again. The two stages are joined by a queue of at most
+    config.PIPELINE_QUEUE_SIZE videos, so generation pauses when uploads fall
+    behind, and uploads wait while generation catches up.
+
+    Args:
+        directory (str): The directory holding the videos.
+        on_complete (callable): Called when both stages have finished.
+        upload_args (argparse.Namespace): Upload and OAuth flags. Parsed
+            from the command line if not given.
+        on_file_done (callable): Called with the video and description paths
+            as each description is written.
+        on_uploaded (callable): Called with the video path and video ID
+            after each upload.
+
+    Returns:
+        dict: {"generate": summary of process_videos,
+               "upload": summary of run_upload_workers}
+    """
+    with metrics.run("pipeline"):
+        return _run_pipeline(directory, on_complete, upload_args, on_file_done, on_uploaded)
+
+
+def _run_pipeline(directory, on_complete, upload_args, on_file_done, on_uploaded):
+    # Authorize up front so a browser prompt does not appear mid-run
+    args = upload_args or youtube_uploader.parse_upload_args()
+    profiles = youtube_uploader.authorize_profiles(args)
+
+    upload_queue = youtube_uploader.UploadQueue(maxsize=config.PIPELINE_QUEUE_SIZE)
+    summary = {"generate": None, "upload": None}
+
+    def upload_stage():
+        summary["upload"] = youtube_uploader.run_upload_workers(upload_queue, directory, profiles,
+                                                                on_uploaded=on_uploaded)
+
+    uploader = threading.Thread(target=upload_stage, daemon=True)
+    uploader.start()
+
+    def queue_for_upload(video_path, description_path):
+        options = youtube_uploader.build_upload_options(args, video_path, profiles)
+        if upload_queue.put(options):
+            print(f"Queued '{os.path.basename(video_path)}' for upload.")
+
+    def on_described(video_path, description_path):
+        if on_file_done:
+            on_file_done(video_path, description_path)
+        queue_for_upload(video_path, description_path)
+
+    try:
+        summary["generate"] = video_processor.process_videos(directory, lambda: None, on_described,
+                                                             on_file_skipped=queue_for_upload)
+    finally:
+        upload_queue.close()
+        uploader.join()
+        print("\nPipeline finished.")
+        on_complete()
+    return summary
+
+
+def watch_folder(directory, stop_event, upload=False, upload_args=None, on_file_done=None, on_uploaded=None,
+                 on_complete=None):
+    """
+    Watches a directory and describes each new video once it has finished
+    being written, optionally uploading it afterwards, until stop_event is
+    set.
+
+    Videos that already have an up-to-date description are not described
+    again; with upload on they go straight to the upload queue.
+
+    The AI budget applies as in process_videos, with the watch as one run:
+    a video that would go over a daily budget waits for the reset, one that
+    needs more than the whole budget is skipped, and once a per-run budget
+    is used up watching stops.
+
+    Args:
+        directory (str): The directory to watch.
+        stop_event (threading.Event): Set to stop watching.
+        upload (bool): Whether to upload videos once they are described.
+        upload_args (argparse.Namespace): Upload and OAuth flags. Parsed
+            from the command line if not given.
+        on_file_done (callable): Called with the video and description paths
+            as each description is written.
+        on_uploaded (callable): Called with the video path and video ID
+            after each upload.
+        on_complete (callable): Called once watching has stopped.
+
+    Returns:
+        dict: Summary with the keys "described", "failed" (list of video
+            paths), "error" (why watching could not start, or None) and
+            "upload" (summary of run_upload_workers, or None).
+    """
+    try:
+        with metrics.run("watch"):
+            return _watch_folder(directory, stop_event, upload, upload_args, on_file_done, on_uploaded)
+    finally:
+        if on_complete:
+            on_complete()
+
+
+def _watch_folder(directory, stop_event, upload, upload_args, on_file_done, on_uploaded):
+    summary = {"described": 0, "failed": [], "error": None, "upload": None}
+    if not video_processor.configure_ai_service():
+        summary["error"] = "AI service is not configured."
+        return summary
+
+    args = None
+    profiles = None
+    if upload:
+        args = upload_args or youtube_uploader.parse_upload_args()
+        try:
+            profiles = youtube_uploader.authorize_profiles(args)
+        except (Exception, SystemExit) as e:
+            # run_flow exits when authorization fails
+            print(f"YouTube authorization failed: {e}")
+            summary["error"] = f"YouTube authorization failed: {e}"
+            return summary
+
+    video_processor.cleanup_orphaned_ai_files()
+    run_id = usage_ledger.start_run("watch")
+    budget = usage_ledger.BudgetGovernor(usage_ledger.get_shared_ledger(), run_id)
+    # Held while a video waits for room in the budget, so one worker waits and logs at a time
+    budget_lock = threading.Lock()
+    # Held for a whole video once most of the budget is used
+    one_at_a_time = threading.Lock()
+
+    manifest = Manifest(directory)
+    manifest_lock = threading.Lock()
+    max_workers = max(1, config.MAX_CONCURRENT_JOBS)
+    rate_limiter = RateLimiter(config.AI_REQUESTS_PER_MINUTE / 60.0, capacity=max_workers)
+
+    upload_queue = None
+    uploader = None
+    if upload:
+        upload_queue = youtube_uploader.UploadQueue(maxsize=config.PIPELINE_QUEUE_SIZE)
+
+        def upload_stage():
+            summary["upload"] = youtube_uploader.run_upload_workers(upload_queue, directory, profiles,
+                                                                    on_uploaded=on_uploaded)
+
+        uploader = threading.Thread(target=upload_stage, daemon=True)
+        uploader.start()
+
+    def queue_for_upload(video_path):
+        if upload_queue is not None and upload_queue.put(youtube_uploader.build_upload_options(args, video_path, profiles)):
+            print(f"Queued '{os.path.basename(video_path)}' for upload.")
+
+    def mark_failed(video_path, error):
+        with manifest_lock:
+            manifest.mark_failed(video_path, error)
+            manifest.save()
+            summary["failed"].append(video_path)
+
+    def reserve_budget(video_path):
+        """Waits until the video fits in the AI budget and reserves it. Returns False if it will not be described."""
+        probe = media_probe.probe(video_path) if config.PROBE_MEDIA else None
+        estimate = budget.estimate(probe.duration if probe is not None else None)
+        if budget.exceeds_budget(estimate):
+            print(f"Skipping '{os.path.basename(video_path)}' because {video_processor.OVER_BUDGET_PROBLEM}.")
+            mark_failed(video_path, video_processor.OVER_BUDGET_PROBLEM)
+            ledger = job_ledger.get_shared_ledger()
+            if ledger:
+                ledger.record(video_path, job_ledger.FAILED, os.stat(video_path),
+                              error=video_processor.OVER_BUDGET_PROBLEM)
+            metrics.increment("rejected")
+            return False
+        with budget_lock:
+            while not budget.can_start(estimate):
+                if not budget.wait_for_reset(stop_event):
+                    # A per-run budget is used up for as long as this watch runs
+                    stop_event.set()
+                    return False
+            budget.reserve(video_path, estimate)
+        return True
+
+    # Push-back retries per video, as in process_videos
+    service_retries = {}
+
+    def retry_later(video_path, error):
+        """Submits a video again after Gemini pushed back. Returns False if it is not retried."""
+        with manifest_lock:
+            retries = service_retries.get(video_path, 0)
+            if (backpressure.classify(error) is None or stop_event.is_set()
+                    or retries >= config.MAX_SERVICE_RETRIES):
+                return False
+            # Failures while the breaker holds an outage do not use up the retries
+            if not backpressure.get_guard("Gemini").breaker.is_open():
+                service_retries[video_path] = retries + 1
+        try:
+            executor.submit(describe, video_path)
+        except RuntimeError:
+            # Watching has stopped and the executor no longer takes work
+            return False
+        print(f"Gemini pushed back on '{os.path.basename(video_path)}' ({error}). It will be retried.")
+        return True
+
+    def describe(video_path):
+        if not reserve_budget(video_path):
+            return
+        try:
+            with one_at_a_time if budget.slowed() else contextlib.nullcontext():
+                description_path = video_processor.process_single_video(video_path, rate_limiter)
+        except Exception as e:
+            # Released first, since a retry reserves the same video again
+            budget.release(video_path)
+            if retry_later(video_path, e):
+                return
+            print(f"--- ERROR: Failed to process file '{os.path.basename(video_path)}' ---")
+            print(f"Issue: {e}")
+            mark_failed(video_path, e)
+            return
+        budget.release(video_path)
+
+        with manifest_lock:
+            manifest.mark_described(video_path, description_path)
+            manifest.save()
+            summary["described"] += 1
+        metrics.increment("described")
+        if on_file_done:
+            on_file_done(video_path, description_path)
+        queue_for_upload(video_path)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def on_ready(video_path):
+            with manifest_lock:
+                needs_description = manifest.needs_processing(video_path)
+            if needs_description:
+                executor.submit(describe, video_path)
+            elif os.path.exists(media_catalog.description_path_for(video_path)):
+                executor.submit(queue_for_upload, video_path)
+
+        FolderWatcher(directory, on_ready).run(stop_event)
+
+    if upload_queue is not None:
+        upload_queue.close()
+        uploader.join()
+    return summary
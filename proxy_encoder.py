@@ -0,0 +1,56 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import config
+
+
+def encoder_available():
+    """Returns True if the configured proxy encoder can be found on the PATH."""
+    return bool(config.PROXY_ENCODER_COMMAND) and shutil.which(config.PROXY_ENCODER_COMMAND[0]) is not None
+
+
+def create_proxy(video_path, temp_dir):
+    """
+    Encodes a small, low-resolution, low-frame-rate copy of a video.
+
+    The command is taken from config.PROXY_ENCODER_COMMAND, so any local
+    encoder can be plugged in. The placeholders {input}, {output}, {height}
+    and {fps} are substituted in each argument.
+
+    Args:
+        video_path (str): The full path to the original video.
+        temp_dir (str): The directory to write the proxy into.
+
+    Returns:
+        str: The full path to the proxy file. Each call writes into its own
+            subdirectory of temp_dir, so videos with the same name in
+            different folders never share a proxy.
+    """
+    filename = os.path.basename(video_path)
+    job_dir = tempfile.mkdtemp(dir=temp_dir)
+    proxy_path = os.path.join(job_dir, os.path.splitext(filename)[0] + ".proxy.mp4")
+    values = {
+        "input": video_path,
+        "output": proxy_path,
+        "height": config.PROXY_HEIGHT,
+        "fps": config.PROXY_FPS,
+    }
+    command = [arg.format(**values) for arg in config.PROXY_ENCODER_COMMAND]
+
+    print(f"Encoding proxy for '{filename}'...")
+    started = time.monotonic()
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0 or not os.path.exists(proxy_path):
+        shutil.rmtree(job_dir, ignore_errors=True)
+        error = result.stderr.decode("utf-8", "replace").strip()
+        raise RuntimeError(f"Proxy encoder exited with code {result.returncode}: {error}")
+
+    print(f"Encoded proxy for '{filename}' in {time.monotonic() - started:.1f}s.")
+    return proxy_path
+
+
+def remove_proxy(proxy_path):
+    """Deletes a proxy made by create_proxy, together with its subdirectory."""
+    shutil.rmtree(os.path.dirname(proxy_path), ignore_errors=True)
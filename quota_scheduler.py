@@ -0,0 +1,160 @@
+import datetime
+import fnmatch
+import json
+import os
+import threading
+import time
+import config
+
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception:
+    # zoneinfo has no tz database on some Windows installs; Pacific Standard
+    # Time is close enough to find the reset window.
+    _QUOTA_TIMEZONE = datetime.timezone(datetime.timedelta(hours=-8))
+
+
+class QuotaTracker(object):
+    """
+    Tracks YouTube Data API quota units spent against a daily budget and
+    saves the count across runs. The YouTube quota resets at midnight
+    Pacific time.
+    """
+    def __init__(self, daily_budget=None, state_file=None):
+        self.daily_budget = daily_budget if daily_budget is not None else config.YOUTUBE_DAILY_QUOTA
+        self.state_file = state_file or config.QUOTA_STATE_FILE
+        self._lock = threading.Lock()
+        self.day = self._today()
+        self.used = 0
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("day") == self.day:
+                    self.used = int(data.get("used", 0))
+            except Exception as e:
+                print("Could not read quota state '%s': %s" % (self.state_file, e))
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now(_QUOTA_TIMEZONE)
+
+    def _today(self):
+        return self._now().date().isoformat()
+
+    def _roll_over(self):
+        today = self._today()
+        if today != self.day:
+            self.day = today
+            self.used = 0
+
+    def _save(self):
+        try:
+            with open(self.state_file, "w", encoding="utf-8") as f:
+                json.dump({"day": self.day, "used": self.used}, f)
+        except Exception as e:
+            print("Failed to save quota state: %s" % e)
+
+    def remaining(self):
+        with self._lock:
+            self._roll_over()
+            return max(0, self.daily_budget - self.used)
+
+    def try_reserve(self, units):
+        """Records `units` as spent if they fit in today's budget. Returns False otherwise."""
+        with self._lock:
+            self._roll_over()
+            if self.used + units > self.daily_budget:
+                return False
+            self.used += units
+            self._save()
+            return True
+
+    def mark_exhausted(self):
+        """Called when the API reports the quota is used up, whatever our own count says."""
+        with self._lock:
+            self._roll_over()
+            self.used = max(self.used, self.daily_budget)
+            self._save()
+
+    def seconds_until_reset(self):
+        now = self._now()
+        tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1),
+                                             datetime.time(0, 0), tzinfo=now.tzinfo)
+        return max(0.0, (tomorrow - now).total_seconds())
+
+    def wait_for_reset(self, stop_event=None, label="YouTube", wait=None):
+        """
+        Sleeps until the quota resets, plus config.QUOTA_RESET_MARGIN_SECONDS.
+
+        Args:
+            stop_event (threading.Event): Set to cancel the wait.
+            label (str): Names the quota in the log.
+            wait (callable): Called with a number of seconds instead of
+                sleeping; returns False to end the wait early, for example
+                once nothing is left to upload.
+
+        Returns:
+            bool: False if the wait was cancelled or ended early.
+        """
+        deadline = time.time() + self.seconds_until_reset() + config.QUOTA_RESET_MARGIN_SECONDS
+        print("%s quota exhausted. Waiting %.1f hours for the daily reset..."
+              % (label, (deadline - time.time()) / 3600))
+        while time.time() < deadline:
+            timeout = min(60, max(0, deadline - time.time()))
+            if wait is not None:
+                if not wait(timeout) or (stop_event is not None and stop_event.is_set()):
+                    return False
+            elif stop_event is not None:
+                if stop_event.wait(timeout):
+                    return False
+            else:
+                time.sleep(timeout)
+        print("%s quota window reset. Resuming uploads." % label)
+        return True
+
+
+def queue_needs_ordering():
+    """Returns False when the catalog's name order is already the requested order."""
+    return config.UPLOAD_ORDER != "name" or bool(config.UPLOAD_PRIORITY_PATTERNS)
+
+
+def order_upload_queue(jobs, size_of, duration_of=None):
+    """
+    Orders the upload queue. Files matching config.UPLOAD_PRIORITY_PATTERNS
+    go first, in pattern order, then the rest by config.UPLOAD_ORDER
+    ("name", "smallest", "largest", "shortest" or "longest").
+
+    Args:
+        jobs (list): The jobs to order.
+        size_of (callable): Returns (filename, size in bytes) for a job.
+        duration_of (callable): Returns a job's duration in seconds, or
+            None if unknown. Needed for "shortest" and "longest"; videos
+            without a duration go after the rest, by size.
+
+    Returns:
+        list: The ordered jobs.
+    """
+    patterns = config.UPLOAD_PRIORITY_PATTERNS
+
+    def sort_key(job):
+        filename, size = size_of(job)
+        priority = len(patterns)
+        for index, pattern in enumerate(patterns):
+            if fnmatch.fnmatch(filename.lower(), pattern.lower()):
+                priority = index
+                break
+        if config.UPLOAD_ORDER == "smallest":
+            return (priority, size, filename)
+        if config.UPLOAD_ORDER == "largest":
+            return (priority, -size, filename)
+        if config.UPLOAD_ORDER in ("shortest", "longest") and duration_of is not None:
+            sign = -1 if config.UPLOAD_ORDER == "longest" else 1
+            duration = duration_of(job)
+            if duration is None:
+                return (priority, 1, sign * size, filename)
+            return (priority, 0, sign * duration, filename)
+        return (priority, filename)
+
+    return sorted(jobs, key=sort_key)
@@ -0,0 +1,48 @@
+import threading
+import time
+
+
+class RateLimiter(object):
+    """
+    A token bucket that can be shared between worker threads.
+
+    Tokens are refilled continuously at `rate` tokens per second, up to
+    `capacity`. Callers block in acquire() until enough tokens are available.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, amount=1):
+        """
+        Blocks until `amount` tokens are available and consumes them.
+
+        Args:
+            amount (float): The number of tokens to take from the bucket.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                # Requests larger than the bucket are allowed through once it is full
+                needed = min(amount, self.capacity)
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return waited
+                sleep_seconds = (needed - self._tokens) / self.rate
+            time.sleep(sleep_seconds)
+            waited += sleep_seconds
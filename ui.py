@@ -4,25 +4,118 @@ import sys
 import os
 import json
 import threading
+import importlib
+import logging
+import logging.handlers
 import config
-import video_processor
-import youtube_uploader
+import job_ledger
+
+# The processing modules pull in google.generativeai, googleapiclient and
+# oauth2client, which take long enough to import that the window would appear
+# late. They are imported in the background once the window is drawn, or on
+# the first action if that has not finished yet.
+WORKER_MODULES = ("video_processor", "youtube_uploader", "pipeline")
+
+PROGRESS_REFRESH_MS = 2000
+PROGRESS_LABELS = {
+    job_ledger.QUEUED: "queued",
+    job_ledger.AI_UPLOADED: "analysing",
+    job_ledger.DESCRIBED: "described",
+    job_ledger.YT_UPLOADED: "on YouTube",
+    job_ledger.MOVED: "moved",
+    job_ledger.FAILED: "failed",
+}
+
+
+def run_in_background(module_name, function_name, *args, on_error=None):
+    """
+    Imports a processing module if needed and runs one of its functions on a
+    worker thread. If the import or the function raises, the error is logged
+    and on_error is called, so the caller can re-enable its buttons.
+    """
+    def target():
+        try:
+            module = importlib.import_module(module_name)
+            getattr(module, function_name)(*args)
+        except Exception as e:
+            print(f"Error: {module_name}.{function_name} failed: {e}")
+            if on_error:
+                on_error()
+    threading.Thread(target=target, daemon=True).start()
 
-class TextRedirector(object):
-    """Redirects stdout/stderr to a Tkinter Text widget."""
-    def __init__(self, widget, tag="stdout"):
+
+def warm_up_modules():
+    for module_name in WORKER_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"Failed to load {module_name}: {e}")
+
+class LogSink(object):
+    """
+    Thread-safe buffer for log output shown in a Tkinter Text widget.
+
+    Writers only append to the buffer. The Tk loop drains it every
+    config.LOG_FLUSH_INTERVAL_MS in a single batch insert, and trims the widget
+    to config.LOG_MAX_LINES. When config.LOG_FILE is set, the full log is also
+    written to a rotating file.
+    """
+    def __init__(self, widget):
         self.widget = widget
+        self._pending = []
+        self._lock = threading.Lock()
+        self._file_logger = None
+        if config.LOG_FILE:
+            handler = logging.handlers.RotatingFileHandler(config.LOG_FILE, maxBytes=config.LOG_FILE_MAX_BYTES,
+                                                           backupCount=config.LOG_FILE_BACKUPS, encoding="utf-8")
+            # Fragments are written as they arrive, newlines included
+            handler.terminator = ""
+            self._file_logger = logging.getLogger("yt_ai_description_manager.log")
+            self._file_logger.propagate = False
+            self._file_logger.setLevel(logging.INFO)
+            self._file_logger.addHandler(handler)
+        self.widget.after(config.LOG_FLUSH_INTERVAL_MS, self.drain)
+
+    def write(self, text, tag):
+        with self._lock:
+            self._pending.append((tag, text))
+        if self._file_logger:
+            self._file_logger.info(text)
+
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        if pending:
+            # Merge consecutive fragments with the same tag into one insert
+            chunks = []
+            for tag, text in pending:
+                if chunks and chunks[-1][0] == tag:
+                    chunks[-1][1].append(text)
+                else:
+                    chunks.append((tag, [text]))
+
+            self.widget.configure(state="normal")
+            for tag, texts in chunks:
+                self.widget.insert("end", "".join(texts), (tag,))
+            line_count = int(self.widget.index("end-1c").split(".")[0])
+            if config.LOG_MAX_LINES and line_count > config.LOG_MAX_LINES:
+                self.widget.delete("1.0", "%d.0" % (line_count - config.LOG_MAX_LINES + 1))
+            self.widget.see("end")
+            self.widget.configure(state="disabled")
+
+        self.widget.after(config.LOG_FLUSH_INTERVAL_MS, self.drain)
+
+
+class TextRedirector(object):
+    """Redirects stdout/stderr to a LogSink."""
+    def __init__(self, sink, tag="stdout"):
+        self.sink = sink
         self.tag = tag
 
     def write(self, str):
-        # Use after() to ensure thread safety when updating UI from another thread
-        self.widget.after(0, self._write, str)
-
-    def _write(self, str):
-        self.widget.configure(state="normal")
-        self.widget.insert("end", str, (self.tag,))
-        self.widget.see("end")
-        self.widget.configure(state="disabled")
+        # Safe from any thread: the sink is drained on the Tk loop
+        self.sink.write(str, self.tag)
 
     def flush(self):
         pass
@@ -31,7 +124,7 @@ class SettingsDialog(tk.Toplevel):
     def __init__(self, parent):
         super().__init__(parent)
         self.title("Settings")
-        self.geometry("400x250")
+        self.geometry("400x310")
         self.transient(parent)
         self.grab_set()
         
@@ -39,10 +132,12 @@ class SettingsDialog(tk.Toplevel):
         self.original_api_key = config.GOOGLE_AI_API_KEY
         self.original_max_errors = str(config.MAX_CONSECUTIVE_ERRORS)
         self.original_max_retries = str(config.MAX_RETRIES)
+        self.original_max_jobs = str(config.MAX_CONCURRENT_JOBS)
 
         self.api_key_var = tk.StringVar(value=config.GOOGLE_AI_API_KEY)
         self.max_errors_var = tk.StringVar(value=str(config.MAX_CONSECUTIVE_ERRORS))
         self.max_retries_var = tk.StringVar(value=str(config.MAX_RETRIES))
+        self.max_jobs_var = tk.StringVar(value=str(config.MAX_CONCURRENT_JOBS))
 
         # UI Layout
         frame = tk.Frame(self, padx=20, pady=20)
@@ -57,6 +152,9 @@ class SettingsDialog(tk.Toplevel):
         tk.Label(frame, text="Max Upload Retries:").pack(anchor="w")
         tk.Entry(frame, textvariable=self.max_retries_var, width=10).pack(anchor="w", pady=(0, 20))
 
+        tk.Label(frame, text="Concurrent Jobs:").pack(anchor="w")
+        tk.Entry(frame, textvariable=self.max_jobs_var, width=10).pack(anchor="w", pady=(0, 20))
+
         btn_frame = tk.Frame(frame)
         btn_frame.pack(fill=tk.X, side=tk.BOTTOM)
 
@@ -69,11 +167,13 @@ class SettingsDialog(tk.Toplevel):
         self.api_key_var.trace_add("write", self.on_change)
         self.max_errors_var.trace_add("write", self.on_change)
         self.max_retries_var.trace_add("write", self.on_change)
+        self.max_jobs_var.trace_add("write", self.on_change)
 
     def on_change(self, *args):
         if (self.api_key_var.get() != self.original_api_key or 
             self.max_errors_var.get() != self.original_max_errors or
-            self.max_retries_var.get() != self.original_max_retries):
+            self.max_retries_var.get() != self.original_max_retries or
+            self.max_jobs_var.get() != self.original_max_jobs):
             self.save_btn.config(state=tk.NORMAL)
         else:
             self.save_btn.config(state=tk.DISABLED)
@@ -92,10 +192,17 @@ class SettingsDialog(tk.Toplevel):
             messagebox.showerror("Error", "Max Retries must be a number.")
             return
 
+        try:
+            new_max_jobs = int(self.max_jobs_var.get().strip())
+        except ValueError:
+            messagebox.showerror("Error", "Concurrent Jobs must be a number.")
+            return
+
         # Update globals
         config.GOOGLE_AI_API_KEY = new_key
         config.MAX_CONSECUTIVE_ERRORS = new_max_errors
         config.MAX_RETRIES = new_max_retries
+        config.MAX_CONCURRENT_JOBS = new_max_jobs
 
         # Persist to file
         data = {}
@@ -109,6 +216,7 @@ class SettingsDialog(tk.Toplevel):
         data["google_ai_api_key"] = config.GOOGLE_AI_API_KEY
         data["max_consecutive_errors"] = config.MAX_CONSECUTIVE_ERRORS
         data["max_upload_retries"] = config.MAX_RETRIES
+        data["max_concurrent_jobs"] = config.MAX_CONCURRENT_JOBS
 
         try:
             with open(config.CONFIG_FILE, 'w') as f:
@@ -124,9 +232,12 @@ class App(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("YouTube Description Generator")
-        self.geometry("700x500")
+        self.geometry("700x635")
 
         self.directory_var = tk.StringVar()
+        self.incremental_var = tk.BooleanVar(value=config.INCREMENTAL_MODE)
+        self.watch_upload_var = tk.BooleanVar(value=False)
+        self.watch_stop_event = None
         self.load_config()
 
         # Toolbar
@@ -150,6 +261,8 @@ class App(tk.Tk):
 
         tk.Button(dir_frame, text="Browse...", command=self.browse_directory).pack(side=tk.LEFT)
 
+        tk.Checkbutton(main_frame, text="Skip unchanged videos that already have descriptions", variable=self.incremental_var).pack(anchor="w", pady=(0, 10))
+
         # Generate Button
         self.generate_btn = tk.Button(main_frame, text="Generate Description", command=self.start_processing, bg="#4CAF50", fg="white", font=("Arial", 10, "bold"))
         self.generate_btn.pack(pady=(0, 10), fill=tk.X)
@@ -158,35 +271,61 @@ class App(tk.Tk):
         self.yt_upload_btn = tk.Button(main_frame, text="Upload to Youtube", command=self.start_yt_upload, bg="#4CAF50", fg="white", font=("Arial", 10, "bold"))
         self.yt_upload_btn.pack(pady=(0, 10), fill=tk.X)
 
+        # Combined Generate + Upload Button
+        self.pipeline_btn = tk.Button(main_frame, text="Generate and Upload", command=self.start_pipeline, bg="#4CAF50", fg="white", font=("Arial", 10, "bold"))
+        self.pipeline_btn.pack(pady=(0, 10), fill=tk.X)
+
+        # Watch Folder Button
+        watch_frame = tk.Frame(main_frame)
+        watch_frame.pack(fill=tk.X, pady=(0, 10))
+        self.watch_btn = tk.Button(watch_frame, text="Watch Folder", command=self.toggle_watch, bg="#2196F3", fg="white", font=("Arial", 10, "bold"))
+        self.watch_btn.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        tk.Checkbutton(watch_frame, text="Also upload to YouTube", variable=self.watch_upload_var).pack(side=tk.LEFT, padx=(10, 0))
+
+        # Progress from the job ledger
+        self.progress_var = tk.StringVar()
+        tk.Label(main_frame, textvariable=self.progress_var, anchor="w").pack(fill=tk.X, pady=(0, 5))
+
         # Log Area
         tk.Label(main_frame, text="Logs:").pack(anchor="w")
         self.log_area = scrolledtext.ScrolledText(main_frame, state='disabled', height=15)
         self.log_area.pack(fill=tk.BOTH, expand=True)
 
         # Redirect stdout/stderr
-        sys.stdout = TextRedirector(self.log_area, "stdout")
-        sys.stderr = TextRedirector(self.log_area, "stderr")
+        self.log_sink = LogSink(self.log_area)
+        sys.stdout = TextRedirector(self.log_sink, "stdout")
+        sys.stderr = TextRedirector(self.log_sink, "stderr")
+
+        # Warm up the heavy imports once the window has been drawn
+        self.after(100, lambda: threading.Thread(target=warm_up_modules, daemon=True).start())
+        self.after(PROGRESS_REFRESH_MS, self.refresh_progress)
 
     def browse_directory(self):
         directory = filedialog.askdirectory(initialdir=self.directory_var.get())
         if directory:
             self.directory_var.set(directory)
 
+    def refresh_progress(self):
+        """Shows the job ledger's counts for the selected directory, then reschedules itself."""
+        directory = self.directory_var.get()
+        if config.USE_JOB_LEDGER and directory and os.path.isdir(directory):
+            try:
+                counts = job_ledger.get_shared_ledger().counts(directory)
+                parts = ["%d %s" % (counts[state], PROGRESS_LABELS[state]) for state in job_ledger.STATES if counts[state]]
+                self.progress_var.set("Progress: " + ", ".join(parts) if parts else "")
+            except Exception as e:
+                self.progress_var.set(f"Progress unavailable: {e}")
+        else:
+            self.progress_var.set("")
+        self.after(PROGRESS_REFRESH_MS, self.refresh_progress)
+
     def open_settings(self):
         SettingsDialog(self)
 
     def load_config(self):
-        if os.path.exists(config.CONFIG_FILE):
-            try:
-                with open(config.CONFIG_FILE, 'r') as f:
-                    data = json.load(f)
-                    self.directory_var.set(data.get("last_directory", ""))
-                    
-                    config.GOOGLE_AI_API_KEY = data.get("google_ai_api_key", "")
-                    config.MAX_CONSECUTIVE_ERRORS = int(data.get("max_consecutive_errors", 3))
-                    config.MAX_RETRIES = int(data.get("max_upload_retries", 10))
-            except Exception as e:
-                print(f"Failed to load config: {e}")
+        data = config.load_settings()
+        self.directory_var.set(data.get("last_directory", ""))
+        self.incremental_var.set(config.INCREMENTAL_MODE)
 
     def save_config(self):
         data = {}
@@ -198,6 +337,7 @@ class App(tk.Tk):
                 pass
         
         data["last_directory"] = self.directory_var.get()
+        data["incremental_mode"] = self.incremental_var.get()
         
         try:
             with open(config.CONFIG_FILE, 'w') as f:
@@ -215,12 +355,16 @@ class App(tk.Tk):
             messagebox.showerror("Error", "Please select a valid directory.")
             return
 
+        config.INCREMENTAL_MODE = self.incremental_var.get()
         self.save_config()
         self.generate_btn.config(state=tk.DISABLED, text="Processing...")
         self.yt_upload_btn.config(state=tk.DISABLED, text="Processing...")
+        self.pipeline_btn.config(state=tk.DISABLED, text="Processing...")
+        self.watch_btn.config(state=tk.DISABLED)
 
         # Run in a separate thread to keep UI responsive
-        threading.Thread(target=video_processor.process_videos, args=(directory, self.on_process_complete), daemon=True).start()
+        run_in_background("video_processor", "process_videos", directory, self.on_process_complete,
+                          on_error=self.on_action_failed)
 
     def on_process_complete(self):
         # This needs to be scheduled on the main thread
@@ -229,12 +373,78 @@ class App(tk.Tk):
     def on_upload_complete(self):
         self.after(0, self._reset_button)
 
-    def _reset_button(self):
+    def on_action_failed(self):
+        self.after(0, self._reset_button, False)
+
+    def _reset_button(self, succeeded=True):
         self.generate_btn.config(state=tk.NORMAL, text="Generate Description")
         self.yt_upload_btn.config(state=tk.NORMAL, text="Upload to YouTube")
-        messagebox.showinfo("Complete", "Action finished.")
+        self.pipeline_btn.config(state=tk.NORMAL, text="Generate and Upload")
+        self.watch_btn.config(state=tk.NORMAL)
+        if succeeded:
+            messagebox.showinfo("Complete", "Action finished.")
+        else:
+            messagebox.showerror("Error", "Action failed. See the log for details.")
 
     def start_yt_upload(self):
         self.generate_btn.config(state=tk.DISABLED, text="Uploading...")
         self.yt_upload_btn.config(state=tk.DISABLED, text="Uploading...")
-        threading.Thread(target=youtube_uploader.start_yt_upload, args=(self.directory_var.get(), self.on_upload_complete), daemon=True).start()
+        self.pipeline_btn.config(state=tk.DISABLED, text="Uploading...")
+        self.watch_btn.config(state=tk.DISABLED)
+        run_in_background("youtube_uploader", "start_yt_upload", self.directory_var.get(), self.on_upload_complete,
+                          on_error=self.on_action_failed)
+
+    def start_pipeline(self):
+        if not config.GOOGLE_AI_API_KEY:
+            messagebox.showwarning("Missing API Key", "Please configure the Google AI API Key in Settings before uploading.")
+            return
+
+        directory = self.directory_var.get()
+        if not directory or not os.path.isdir(directory):
+            messagebox.showerror("Error", "Please select a valid directory.")
+            return
+
+        config.INCREMENTAL_MODE = self.incremental_var.get()
+        self.save_config()
+        self.generate_btn.config(state=tk.DISABLED, text="Processing...")
+        self.yt_upload_btn.config(state=tk.DISABLED, text="Processing...")
+        self.pipeline_btn.config(state=tk.DISABLED, text="Processing...")
+        self.watch_btn.config(state=tk.DISABLED)
+
+        run_in_background("pipeline", "run_pipeline", directory, self.on_process_complete,
+                          on_error=self.on_action_failed)
+
+    def toggle_watch(self):
+        if self.watch_stop_event is not None:
+            self.watch_stop_event.set()
+            self.watch_btn.config(state=tk.DISABLED, text="Stopping...")
+            return
+
+        if not config.GOOGLE_AI_API_KEY:
+            messagebox.showwarning("Missing API Key", "Please configure the Google AI API Key in Settings before uploading.")
+            return
+
+        directory = self.directory_var.get()
+        if not directory or not os.path.isdir(directory):
+            messagebox.showerror("Error", "Please select a valid directory.")
+            return
+
+        self.save_config()
+        self.watch_stop_event = threading.Event()
+        self.watch_btn.config(text="Stop Watching")
+        # Another action on the same folder would write the manifest and describe videos alongside the watch
+        self.generate_btn.config(state=tk.DISABLED, text="Watching...")
+        self.yt_upload_btn.config(state=tk.DISABLED, text="Watching...")
+        self.pipeline_btn.config(state=tk.DISABLED, text="Watching...")
+        run_in_background("pipeline", "watch_folder", directory, self.watch_stop_event, self.watch_upload_var.get(),
+                          None, None, None, self.on_watch_stopped, on_error=self.on_watch_stopped)
+
+    def on_watch_stopped(self):
+        self.after(0, self._reset_watch_button)
+
+    def _reset_watch_button(self):
+        self.watch_stop_event = None
+        self.watch_btn.config(state=tk.NORMAL, text="Watch Folder")
+        self.generate_btn.config(state=tk.NORMAL, text="Generate Description")
+        self.yt_upload_btn.config(state=tk.NORMAL, text="Upload to YouTube")
+        self.pipeline_btn.config(state=tk.NORMAL, text="Generate and Upload")
@@ -0,0 +1,77 @@
+import fnmatch
+import os
+import sys
+import config
+
+DEFAULT_PROFILE_NAME = "default"
+
+
+class UploadProfile(object):
+    """
+    One YouTube identity to upload with: its OAuth client secrets, the file
+    its token is stored in, its daily quota budget and how many uploads it
+    runs at once. Videos whose filename matches one of `patterns` are only
+    uploaded with this profile.
+    """
+    def __init__(self, name, client_secrets_file, token_file, daily_quota, quota_state_file, workers, patterns=None):
+        self.name = name
+        self.client_secrets_file = client_secrets_file
+        self.token_file = token_file
+        self.daily_quota = daily_quota
+        self.quota_state_file = quota_state_file
+        self.workers = max(1, workers)
+        self.patterns = patterns or []
+        self.credentials = None
+
+    @property
+    def label(self):
+        """Name used in the log; the single default profile is just "YouTube"."""
+        return "YouTube" if self.name == DEFAULT_PROFILE_NAME else "YouTube (%s)" % self.name
+
+    def matches(self, video_path):
+        filename = os.path.basename(video_path).lower()
+        return any(fnmatch.fnmatch(filename, pattern.lower()) for pattern in self.patterns)
+
+
+def default_profile():
+    """The profile used when config.UPLOAD_PROFILES is empty, with the original file names."""
+    return UploadProfile(DEFAULT_PROFILE_NAME, config.CLIENT_SECRETS_FILE, "%s-oauth2.json" % sys.argv[0],
+                         config.YOUTUBE_DAILY_QUOTA, config.QUOTA_STATE_FILE, config.MAX_CONCURRENT_UPLOADS)
+
+
+def load_profiles():
+    """
+    Builds the upload profiles from config.UPLOAD_PROFILES. Each entry needs
+    a "name"; "client_secrets", "token_file", "daily_quota", "quota_state_file",
+    "workers" and "patterns" fall back to the global settings.
+
+    Returns:
+        list: The UploadProfile objects, at least one.
+    """
+    if not config.UPLOAD_PROFILES:
+        return [default_profile()]
+
+    profiles = []
+    quota_file_base = os.path.splitext(config.QUOTA_STATE_FILE)[0]
+    for index, data in enumerate(config.UPLOAD_PROFILES):
+        name = str(data.get("name") or "profile%d" % (index + 1))
+        if any(profile.name == name for profile in profiles):
+            raise ValueError("Upload profile '%s' is defined more than once." % name)
+        profiles.append(UploadProfile(
+            name,
+            data.get("client_secrets", config.CLIENT_SECRETS_FILE),
+            data.get("token_file", "%s-%s-oauth2.json" % (sys.argv[0], name)),
+            int(data.get("daily_quota", config.YOUTUBE_DAILY_QUOTA)),
+            data.get("quota_state_file", "%s-%s.json" % (quota_file_base, name)),
+            int(data.get("workers", config.MAX_CONCURRENT_UPLOADS)),
+            list(data.get("patterns", [])),
+        ))
+    return profiles
+
+
+def profile_for(profiles, video_path):
+    """Returns the name of the profile a video is mapped to, or None if any profile may upload it."""
+    for profile in profiles:
+        if profile.matches(video_path):
+            return profile.name
+    return None
@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import config
+
+
+class UploadSessionStore(object):
+    """
+    Persists the resumable session URI and the confirmed byte offset of each
+    YouTube upload, so an interrupted upload resumes where it stopped instead
+    of starting again from byte zero.
+
+    Sessions are keyed by the video path and only reused while the file's
+    size and modification time are unchanged.
+    """
+    def __init__(self, directory):
+        self.path = os.path.join(directory, config.UPLOAD_SESSIONS_FILENAME)
+        self._lock = threading.Lock()
+        self.sessions = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    sessions = json.load(f)
+                # Entries that are not session records cannot be resumed
+                self.sessions = {key: session for key, session in sessions.items()
+                                 if isinstance(session, dict) and "uri" in session and "offset" in session}
+            except Exception as e:
+                print("Could not read upload sessions '%s', starting fresh: %s" % (self.path, e))
+
+    @staticmethod
+    def _fingerprint(video_path):
+        stat = os.stat(video_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def get(self, video_path, owner=None):
+        """
+        Returns (session_uri, offset) for the file, or None if there is no
+        usable session. A session can only be resumed by the upload profile
+        that started it, so with `owner`, sessions of other profiles are
+        ignored.
+        """
+        key = os.path.abspath(video_path)
+        with self._lock:
+            session = self.sessions.get(key)
+        if session is None or session.get("fingerprint") != self._fingerprint(video_path):
+            return None
+        if owner is not None and session.get("owner") not in (None, owner):
+            return None
+        return session["uri"], session["offset"]
+
+    def owner(self, video_path):
+        """Returns the name of the upload profile that started the file's session, if known."""
+        with self._lock:
+            session = self.sessions.get(os.path.abspath(video_path))
+        return session.get("owner") if session else None
+
+    def save(self, video_path, uri, offset, owner=None):
+        key = os.path.abspath(video_path)
+        session = {"uri": uri, "offset": offset, "fingerprint": self._fingerprint(video_path), "owner": owner}
+        with self._lock:
+            self.sessions[key] = session
+            self._write()
+
+    def clear(self, video_path):
+        key = os.path.abspath(video_path)
+        with self._lock:
+            if self.sessions.pop(key, None) is not None:
+                self._write()
+
+    def _write(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.sessions, f, indent=1)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print("Failed to save upload sessions: %s" % e)
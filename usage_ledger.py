@@ -0,0 +1,329 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+import config
+
+_TOTAL_COLUMNS = ("requests", "prompt_tokens", "video_tokens", "output_tokens", "total_tokens",
+                  "bytes_uploaded", "seconds", "cost")
+
+
+def cost_of(input_tokens, output_tokens):
+    """Returns the price in USD of a request, from the per-million-token prices in config."""
+    return (input_tokens * config.AI_INPUT_PRICE_PER_MILLION_TOKENS +
+            output_tokens * config.AI_OUTPUT_PRICE_PER_MILLION_TOKENS) / 1e6
+
+
+def tokens_from_response(response):
+    """
+    Reads the token counts from a generate_content response.
+
+    Returns:
+        dict: "prompt_tokens" (all input, video included), "video_tokens",
+            "output_tokens" (thinking included, as it is billed as output)
+            and "total_tokens". Counts the response does not report are 0.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = ((getattr(usage, "candidates_token_count", 0) or 0) +
+                     (getattr(usage, "thoughts_token_count", 0) or 0))
+    video_tokens = 0
+    for details in getattr(usage, "prompt_tokens_details", None) or []:
+        modality = getattr(details, "modality", "")
+        if "VIDEO" in str(getattr(modality, "name", modality)).upper():
+            video_tokens += getattr(details, "token_count", 0) or 0
+    total_tokens = getattr(usage, "total_token_count", 0) or prompt_tokens + output_tokens
+    return {"prompt_tokens": prompt_tokens, "video_tokens": video_tokens,
+            "output_tokens": output_tokens, "total_tokens": total_tokens}
+
+
+def _today():
+    return datetime.date.today().isoformat()
+
+
+class UsageLedger(object):
+    """
+    Record of every Gemini request: its tokens, the bytes uploaded for it,
+    the time it took and its cost, kept in SQLite so totals add up across
+    runs. Requests are grouped by run and by local day.
+    """
+    def __init__(self, path=None):
+        self.path = path or config.USAGE_LEDGER_FILE
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " label TEXT,"
+                " started REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " run_id INTEGER,"
+                " day TEXT NOT NULL,"
+                " path TEXT NOT NULL,"
+                " model TEXT,"
+                " prompt_tokens INTEGER NOT NULL,"
+                " video_tokens INTEGER NOT NULL,"
+                " output_tokens INTEGER NOT NULL,"
+                " total_tokens INTEGER NOT NULL,"
+                " bytes_uploaded INTEGER NOT NULL,"
+                " seconds REAL NOT NULL,"
+                " video_seconds REAL,"
+                " cost REAL NOT NULL,"
+                " recorded REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS usage_run ON usage (run_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS usage_day ON usage (day)")
+
+    def start_run(self, label):
+        """Starts a new run and returns its ID."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute("INSERT INTO runs (label, started) VALUES (?, ?)", (label, time.time()))
+            return cursor.lastrowid
+
+    def record(self, run_id, video_path, model, tokens, bytes_uploaded, seconds, video_seconds=None):
+        """
+        Records one request.
+
+        Args:
+            run_id (int): The run it belongs to, or None.
+            video_path (str): The video that was described.
+            model (str): The model name.
+            tokens (dict): As returned by tokens_from_response.
+            bytes_uploaded (int): Bytes sent to the AI service for this
+                request; 0 when an earlier upload was reused.
+            seconds (float): Wall time from start to answer.
+            video_seconds (float): The video's duration, if known.
+
+        Returns:
+            float: The cost of the request in USD.
+        """
+        cost = cost_of(tokens["prompt_tokens"], tokens["output_tokens"])
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO usage (run_id, day, path, model, prompt_tokens, video_tokens, output_tokens,"
+                " total_tokens, bytes_uploaded, seconds, video_seconds, cost, recorded)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, _today(), os.path.abspath(video_path), model, tokens["prompt_tokens"],
+                 tokens["video_tokens"], tokens["output_tokens"], tokens["total_tokens"], bytes_uploaded,
+                 seconds, video_seconds, cost, time.time()))
+        return cost
+
+    def totals(self, run_id=None, day=None):
+        """
+        Adds up the requests of one run, of one day (an ISO date), or of all
+        time when neither is given.
+
+        Returns:
+            dict: "requests", "prompt_tokens", "video_tokens",
+                "output_tokens", "total_tokens", "bytes_uploaded", "seconds"
+                and "cost".
+        """
+        query = ("SELECT COUNT(*), TOTAL(prompt_tokens), TOTAL(video_tokens), TOTAL(output_tokens),"
+                 " TOTAL(total_tokens), TOTAL(bytes_uploaded), TOTAL(seconds), TOTAL(cost) FROM usage")
+        conditions, values = [], []
+        if run_id is not None:
+            conditions.append("run_id = ?")
+            values.append(run_id)
+        if day is not None:
+            conditions.append("day = ?")
+            values.append(day)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            row = self._conn.execute(query, values).fetchone()
+        totals = dict(zip(_TOTAL_COLUMNS, row))
+        for name in _TOTAL_COLUMNS[:-2]:
+            totals[name] = int(totals[name])
+        return totals
+
+    def most_expensive(self, run_id=None, limit=5):
+        """Returns (video path, cost in USD, total tokens) for the costliest videos, most expensive first."""
+        query = "SELECT path, TOTAL(cost), TOTAL(total_tokens) FROM usage"
+        values = []
+        if run_id is not None:
+            query += " WHERE run_id = ?"
+            values.append(run_id)
+        query += " GROUP BY path ORDER BY TOTAL(cost) DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, values + [limit]).fetchall()
+        return [(path, cost, int(tokens)) for path, cost, tokens in rows]
+
+    def averages(self):
+        """
+        Returns what past requests used, for estimating the next one:
+        input tokens per second of video (or None), and the average input
+        and output tokens per request (or None without history).
+        """
+        with self._lock:
+            per_second = self._conn.execute(
+                "SELECT TOTAL(prompt_tokens), TOTAL(video_seconds) FROM usage WHERE video_seconds > 0").fetchone()
+            per_request = self._conn.execute(
+                "SELECT AVG(prompt_tokens), AVG(output_tokens) FROM usage").fetchone()
+        tokens_per_second = per_second[0] / per_second[1] if per_second[1] else None
+        return tokens_per_second, per_request[0], per_request[1]
+
+
+class BudgetGovernor(object):
+    """
+    Keeps description generation under config.AI_BUDGET_USD and
+    config.AI_TOKEN_BUDGET for the current config.AI_BUDGET_PERIOD ("run"
+    or "day").
+
+    Each video about to start reserves an estimate of its cost, from its
+    duration and what earlier requests used, until it finishes and its real
+    usage is in the ledger. can_start() refuses a video whose estimate would
+    take spending over a budget, and slowed() reports when
+    config.AI_BUDGET_SLOWDOWN_FRACTION of a budget is used, so videos can be
+    started one at a time. A video for which exceeds_budget() is true would
+    not fit even in an unused budget, so it should be skipped rather than
+    waited for.
+    """
+    def __init__(self, ledger, run_id):
+        self.ledger = ledger
+        self.run_id = run_id
+        self._reserved = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ledger is not None and (config.AI_BUDGET_USD > 0 or config.AI_TOKEN_BUDGET > 0)
+
+    def estimate(self, video_seconds=None):
+        """Returns the (tokens, cost in USD) a video is expected to use."""
+        if not self.enabled:
+            return 0, 0.0
+        tokens_per_second, average_input, average_output = self.ledger.averages()
+        if video_seconds:
+            input_tokens = video_seconds * (tokens_per_second or config.AI_TOKENS_PER_VIDEO_SECOND)
+        else:
+            input_tokens = average_input or config.AI_TOKENS_PER_VIDEO_SECOND * 60
+        output_tokens = average_output or 1000
+        return input_tokens + output_tokens, cost_of(input_tokens, output_tokens)
+
+    def _used(self):
+        if config.AI_BUDGET_PERIOD == "run":
+            totals = self.ledger.totals(run_id=self.run_id)
+        else:
+            totals = self.ledger.totals(day=_today())
+        with self._lock:
+            reserved_tokens = sum(tokens for tokens, _ in self._reserved.values())
+            reserved_cost = sum(cost for _, cost in self._reserved.values())
+        return totals["total_tokens"] + reserved_tokens, totals["cost"] + reserved_cost
+
+    def _fractions(self, tokens, cost):
+        fractions = []
+        if config.AI_TOKEN_BUDGET > 0:
+            fractions.append(tokens / float(config.AI_TOKEN_BUDGET))
+        if config.AI_BUDGET_USD > 0:
+            fractions.append(cost / config.AI_BUDGET_USD)
+        return fractions
+
+    def slowed(self):
+        if not self.enabled:
+            return False
+        return max(self._fractions(*self._used())) >= config.AI_BUDGET_SLOWDOWN_FRACTION
+
+    def can_start(self, estimate):
+        if not self.enabled:
+            return True
+        tokens, cost = self._used()
+        return max(self._fractions(tokens + estimate[0], cost + estimate[1])) <= 1.0
+
+    def exceeds_budget(self, estimate):
+        """Returns True if the estimate alone is more than a whole budget."""
+        if not self.enabled:
+            return False
+        return max(self._fractions(*estimate)) > 1.0
+
+    def reserve(self, video_path, estimate):
+        if self.enabled:
+            with self._lock:
+                self._reserved[video_path] = estimate
+
+    def release(self, video_path):
+        with self._lock:
+            self._reserved.pop(video_path, None)
+
+    def wait_for_reset(self, stop_event=None):
+        """
+        With a daily budget, sleeps until local midnight and returns True.
+        With a per-run budget there is nothing to wait for, so it returns
+        False at once.
+
+        Args:
+            stop_event (threading.Event): Set to cancel the wait, which then
+                returns False.
+        """
+        if stop_event is not None and stop_event.is_set():
+            return False
+        if config.AI_BUDGET_PERIOD == "run":
+            print("AI budget for this run is used up. Stopping description generation.")
+            return False
+        tomorrow = datetime.datetime.combine(datetime.date.today() + datetime.timedelta(days=1), datetime.time())
+        print("Daily AI budget is used up. Waiting %.1f hours for it to reset..."
+              % ((tomorrow - datetime.datetime.now()).total_seconds() / 3600))
+        while datetime.datetime.now() < tomorrow:
+            timeout = min(60, max(0, (tomorrow - datetime.datetime.now()).total_seconds()))
+            if stop_event is None:
+                time.sleep(timeout)
+            elif stop_event.wait(timeout):
+                return False
+        print("Daily AI budget reset. Resuming.")
+        return True
+
+
+def format_totals(totals):
+    """Renders totals as one log line."""
+    return ("%d request(s), %d input tokens (%d video), %d output tokens, %.1f MB uploaded, about $%.4f"
+            % (totals["requests"], totals["prompt_tokens"], totals["video_tokens"], totals["output_tokens"],
+               totals["bytes_uploaded"] / (1024.0 * 1024), totals["cost"]))
+
+
+def report(ledger, run_id):
+    """Prints the usage of a run, its most expensive videos and the all-time totals."""
+    totals = ledger.totals(run_id=run_id)
+    if not totals["requests"]:
+        return
+    print("Gemini usage this run: %s." % format_totals(totals))
+    expensive = ledger.most_expensive(run_id=run_id, limit=3)
+    if len(expensive) > 1:
+        print("Most expensive: " + ", ".join("'%s' ($%.4f)" % (os.path.basename(path), cost)
+                                             for path, cost, _ in expensive) + ".")
+    print("Gemini usage all time: %s." % format_totals(ledger.totals()))
+
+
+_shared_ledger = None
+_shared_ledger_lock = threading.Lock()
+_current_run = {"id": None}
+
+
+def get_shared_ledger():
+    """
+    Returns the process-wide usage ledger, opening it on first use, or None
+    when config.USAGE_LEDGER_FILE is empty.
+    """
+    global _shared_ledger
+    if not config.USAGE_LEDGER_FILE:
+        return None
+    with _shared_ledger_lock:
+        if _shared_ledger is None:
+            _shared_ledger = UsageLedger()
+        return _shared_ledger
+
+
+def start_run(label):
+    """Starts a run that following requests are recorded against, and returns its ID (None without a ledger)."""
+    ledger = get_shared_ledger()
+    _current_run["id"] = ledger.start_run(label) if ledger else None
+    return _current_run["id"]
+
+
+def current_run():
+    return _current_run["id"]
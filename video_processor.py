@@ -1,7 +1,27 @@
 import os
+import json
+import hashlib
+import functools
+import shutil
+import itertools
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import google.generativeai as genai
 import config
+from rate_limiter import RateLimiter
+from metrics import metrics
+from file_poller import get_shared_poller
+from manifest import Manifest
+import media_catalog
+import media_probe
+import proxy_encoder
+from description_cache import DescriptionCache, get_shared_cache, hash_file
+import job_ledger
+import ai_files
+import backpressure
+import usage_ledger
+import client_sessions
 
 def configure_ai_service():
     """Configures the Google AI service with the provided API key."""
@@ -18,126 +38,644 @@ def configure_ai_service():
         return False
 
 
-def get_video_files(directory):
+MODEL_NAME = "models/gemini-flash-latest"
+
+PROMPT_TEMPLATE = """
+    Based on the content of this video and its filename, "{filename}", please perform the following tasks:
+
+    1.  Write a compelling, concise, and SEO-friendly description for a YouTube video. The description should be a single, engaging paragraph that accurately summarizes the video's content. Please avoid using the word iconic or classic.
+    2.  If there is any relevant trivia about the company, product, or people who appear in the video, you can include a second brief paragraph that presents this info in an interesting way. If not, do not add a second paragraph.
+
+    The tone should be suitable for a general YouTube audience. Format the output clearly with line breaks, but do not use markdown or bullets or any kind, including numerical listing.
     """
-    Identifies video files in the specified directory based on common extensions.
+
+# Used when config.GENERATE_METADATA is on, so one request returns everything the upload needs
+METADATA_PROMPT_TEMPLATE = PROMPT_TEMPLATE + """
+    Return a JSON object with these fields:
+
+    description: The description written above.
+    title: A clear YouTube title of at most 100 characters. Keep the names and any year from the filename.
+    tags: Up to 15 short search tags.
+    category_id: The ID of the YouTube category that fits the video best. The categories are: """ + ", ".join(
+    "%s (%s)" % (category_id, name) for category_id, name in config.VIDEO_CATEGORIES.items()) + """.
+    """
+
+METADATA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string"},
+        "title": {"type": "string"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "category_id": {"type": "string", "format": "enum", "enum": list(config.VIDEO_CATEGORIES)},
+    },
+    "required": ["description", "title", "tags", "category_id"],
+}
+
+# Reported for a video whose estimated usage is more than a whole AI budget
+OVER_BUDGET_PROBLEM = "its estimated Gemini usage is more than the whole AI budget"
+
+# YouTube's limit on the length of a title
+MAX_TITLE_LENGTH = 100
+
+
+def parse_metadata(text):
+    """
+    Parses and tidies the JSON returned for METADATA_PROMPT_TEMPLATE.
 
     Args:
-        directory (str): The path to the directory to scan.
+        text (str): The model response.
 
     Returns:
-        list: A list of full paths to video files found.
+        dict: The keys "description", "title" (None if unusable), "tags"
+            (list) and "category_id" (None if not a known category).
+
+    Raises:
+        ValueError: If the response is not JSON or has no description.
     """
-    video_extensions = {".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv"}
-    found_files = []
-    print(f"\nScanning for video files in '{os.path.abspath(directory)}'...")
     try:
-        for filename in os.listdir(directory):
-            if os.path.splitext(filename)[1].lower() in video_extensions:
-                full_path = os.path.join(directory, filename)
-                found_files.append(full_path)
-        print(f"Found {len(found_files)} video file(s).")
-        return found_files
-    except FileNotFoundError:
-        print(f"Error: The directory '{directory}' was not found.")
-        return []
+        data = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"The model did not return valid JSON: {e}")
+    if not isinstance(data, dict) or not str(data.get("description") or "").strip():
+        raise ValueError("The model returned no description.")
+
+    # YouTube rejects titles containing angle brackets
+    title = " ".join(str(data.get("title") or "").replace("<", "").replace(">", "").split())
+    tags = media_catalog.limit_tags(data.get("tags") or [])
+    category_id = str(data.get("category_id") or "")
+
+    return {
+        "description": str(data["description"]).strip(),
+        "title": title[:MAX_TITLE_LENGTH] or None,
+        "tags": tags,
+        "category_id": category_id if category_id in config.VIDEO_CATEGORIES else None,
+    }
+
+
+def _gemini_guard():
+    """Adaptive concurrency and circuit breaker shared by everything that calls Gemini."""
+    return backpressure.get_guard("Gemini", max(1, config.MAX_CONCURRENT_JOBS))
+
+
+def _get_ai_file(name):
+    # Status checks cost the same for every file, so their latency shows how loaded the service is
+    with _gemini_guard().call(measure_latency=True):
+        return genai.get_file(name)
+
+
+def _reuse_ai_file(store, video_path, filename, rate_limiter=None):
+    """Returns the earlier upload of this video if it is still usable on the AI service, or None."""
+    name = store.get(video_path)
+    if name is None:
+        return None
+    if rate_limiter:
+        rate_limiter.acquire()
+    try:
+        video_file = _get_ai_file(name)
     except Exception as e:
-        print(f"An unexpected error occurred while scanning the directory: {e}")
-        return []
+        print(f"Earlier upload of '{filename}' is no longer available: {e}")
+        store.clear(video_path)
+        return None
+    if video_file.state.name == "FAILED":
+        store.clear(video_path)
+        return None
+    print(f"Reusing the earlier upload of '{filename}' on the AI service.")
+    metrics.increment("ai_file_reused")
+    return video_file
+
 
-def generate_description(video_path):
+def cleanup_orphaned_ai_files():
+    """Deletes uploads left on the AI service by earlier runs, if enabled. Never raises."""
+    if not config.AI_FILE_CLEANUP_ON_START:
+        return
+    try:
+        ai_files.sweep_orphaned_files(genai, ai_files.get_shared_store())
+    except Exception as e:
+        print(f"Could not clean up orphaned AI files: {e}")
+
+
+def generate_description(video_path, rate_limiter=None, make_proxy=None, prompt_template=None, keep_ai_file=False,
+                         structured=False):
     """
     Uploads a video, analyzes it with Gemini, and generates a description.
 
+    When the description cache is enabled, a video whose contents were
+    described before with the same prompt and model is answered from the
+    cache without any network traffic.
+
+    The uploaded file is remembered in the job ledger until the description
+    is written. If generation fails, the next attempt reuses the server copy
+    while it is still valid instead of uploading the video again.
+
+    The tokens, bytes uploaded and time of every answered request are
+    recorded in the usage ledger, against the current run.
+
     Args:
         video_path (str): The full path to the video file.
+        rate_limiter (RateLimiter): Optional limiter shared by all workers,
+            consulted before each request to the AI service.
+        make_proxy (callable): Optional function that encodes a smaller
+            proxy of the video and returns its path. It is only called when
+            the video has to be uploaded, and the proxy is uploaded in place
+            of the original and deleted afterwards. If encoding fails, the
+            original is uploaded.
+        prompt_template (str): Optional prompt to use instead of
+            PROMPT_TEMPLATE. It may contain a {filename} placeholder.
+        keep_ai_file (bool): Leave the uploaded file on the AI service
+            afterwards, so further prompts can be run against it.
+        structured (bool): Ask for METADATA_SCHEMA JSON (by default with
+            METADATA_PROMPT_TEMPLATE) and return the parsed metadata.
 
     Returns:
-        str: The generated description for the video.
+        str: The generated description for the video, or with `structured`
+            a dict as returned by parse_metadata.
     """
-    print(f"\nProcessing '{os.path.basename(video_path)}'...")
+    filename = os.path.basename(video_path)
+    prompt_template = prompt_template or (METADATA_PROMPT_TEMPLATE if structured else PROMPT_TEMPLATE)
+    print(f"\nProcessing '{filename}'...")
+    started = time.monotonic()
 
-    # 1. Upload the video file to the AI service
-    print("Uploading file to AI service...")
-    video_file = genai.upload_file(path=video_path)
+    cache_key = None
+    if config.USE_DESCRIPTION_CACHE:
+        # The template, not the rendered prompt, is part of the key so that a
+        # renamed or copied video still hits the cache. A structured answer
+        # has a title made from the filename, so it is keyed by the rendered
+        # prompt instead.
+        with metrics.timer("hash"):
+            video_hash = hash_file(video_path)
+        key_prompt = prompt_template.format(filename=filename) if structured else prompt_template
+        cache_key = DescriptionCache.make_key(video_hash, key_prompt, MODEL_NAME)
+        cached_text = get_shared_cache().get(cache_key)
+        if cached_text is not None:
+            print(f"Using cached description for '{filename}'.")
+            metrics.increment("cache_hits")
+            return parse_metadata(cached_text) if structured else cached_text
+
+    # 1. Upload the video file to the AI service, unless an earlier upload can be reused
+    store = ai_files.get_shared_store()
+    video_file = _reuse_ai_file(store, video_path, filename, rate_limiter)
+    upload_size = os.path.getsize(video_path)
+    bytes_uploaded = 0
+    if video_file is None:
+        upload_path = video_path
+        if make_proxy:
+            upload_path = _encode_proxy(make_proxy, filename) or video_path
+        try:
+            upload_size = os.path.getsize(upload_path)
+            if rate_limiter:
+                rate_limiter.acquire()
+            print(f"Uploading '{filename}' to AI service...")
+            upload_started = time.monotonic()
+            with _gemini_guard().call():
+                video_file = genai.upload_file(path=upload_path,
+                                               display_name=config.AI_FILE_DISPLAY_PREFIX + filename)
+            upload_seconds = time.monotonic() - upload_started
+        finally:
+            if upload_path != video_path:
+                proxy_encoder.remove_proxy(upload_path)
+        metrics.record("ai_upload", upload_seconds)
+        metrics.add_bytes("ai_uploaded", upload_size)
+        bytes_uploaded = upload_size
+        store.save(video_path, video_file)
 
-    # Wait for the upload and initial processing to complete
-    while video_file.state.name == "PROCESSING":
-        time.sleep(10)
-        video_file = genai.get_file(video_file.name)
+        if upload_path != video_path:
+            _report_proxy_savings(filename, os.path.getsize(video_path), upload_size, upload_seconds)
+
+    # Wait for the upload and initial processing to complete. One shared
+    # poller checks every in-flight file with backoff.
+    poller = get_shared_poller(_get_ai_file)
+    with metrics.timer("ai_processing_wait"):
+        video_file = poller.wait_until_ready(video_file, upload_size, filename)
 
     if video_file.state.name == "FAILED":
+        store.clear(video_path)
+        with _gemini_guard().call(measure_latency=True):
+            genai.delete_file(video_file.name)
         raise ValueError("Video file processing failed on the server.")
 
-    print("File uploaded successfully.")
+    print(f"'{filename}' uploaded successfully.")
 
     # 2. Define the prompt for the model
-    filename = os.path.basename(video_path)
-    prompt = f"""
-    Based on the content of this video and its filename, "{filename}", please perform the following tasks:
+    prompt = prompt_template.format(filename=filename)
 
-    1.  Write a compelling, concise, and SEO-friendly description for a YouTube video. The description should be a single, engaging paragraph that accurately summarizes the video's content. Please avoid using the word iconic or classic.
-    2.  If there is any relevant trivia about the company, product, or people who appear in the video, you can include a second brief paragraph that presents this info in an interesting way. If not, do not add a second paragraph.
+    # 3. Generate content using the Gemini Flash model. If this fails the
+    # file stays on the server, and the store lets the next attempt reuse it.
+    if rate_limiter:
+        rate_limiter.acquire()
+    print(f"Generating description for '{filename}' with Gemini...")
+    generation_config = None
+    if structured:
+        generation_config = {"response_mime_type": "application/json", "response_schema": METADATA_SCHEMA}
+    with _model_pool().client() as model, metrics.timer("ai_generate"), _gemini_guard().call():
+        response = model.generate_content([prompt, video_file], generation_config=generation_config,
+                                          request_options={"timeout": 600})
+    _record_usage(video_path, response, bytes_uploaded, time.monotonic() - started)
+    # Parse before cleaning up, so a malformed answer can be retried against the same upload
+    metadata = parse_metadata(response.text) if structured else None
 
-    The tone should be suitable for a general YouTube audience. Format the output clearly with line breaks, but do not use markdown or bullets or any kind, including numerical listing.
+    # 4. Clean up the uploaded file from the server
+    if not keep_ai_file:
+        with metrics.timer("ai_delete"), _gemini_guard().call(measure_latency=True):
+            genai.delete_file(video_file.name)
+        store.clear(video_path)
+        print(f"Cleaned up '{filename}' from server.")
+
+    if cache_key is not None:
+        get_shared_cache().put(cache_key, response.text)
+
+    return metadata if structured else response.text
+
+
+def _model_pool():
+    """
+    Pool of GenerativeModel objects, so each worker keeps one model across
+    videos and runs. A model keeps the client of the API key it was built
+    with, so a different key gets its own pool.
     """
+    key_hash = hashlib.sha256((config.GOOGLE_AI_API_KEY or "").encode("utf-8")).hexdigest()
+    return client_sessions.get_pool("Gemini", lambda: genai.GenerativeModel(model_name=MODEL_NAME),
+                                    key=(MODEL_NAME, key_hash))
 
 
-    # 3. Generate content using the Gemini 1.5 Flash model
-    print("Generating description with Gemini...")
-    model = genai.GenerativeModel(model_name="models/gemini-flash-latest")
-    response = model.generate_content([prompt, video_file], request_options={"timeout": 600})
+def _record_usage(video_path, response, bytes_uploaded, seconds):
+    """Adds a request's tokens to the usage ledger and the run metrics."""
+    tokens = usage_ledger.tokens_from_response(response)
+    metrics.increment("ai_tokens", tokens["total_tokens"])
+    ledger = usage_ledger.get_shared_ledger()
+    if ledger is None:
+        return
+    video_seconds = media_probe.probe(video_path).duration if config.PROBE_MEDIA else None
+    try:
+        ledger.record(usage_ledger.current_run(), video_path, MODEL_NAME, tokens, bytes_uploaded, seconds,
+                      video_seconds)
+    except Exception as e:
+        print(f"Could not record AI usage for '{os.path.basename(video_path)}': {e}")
 
 
-    # 4. Clean up the uploaded file from the server
-    genai.delete_file(video_file.name)
-    print("Cleaned up uploaded file from server.")
+def _report_proxy_savings(filename, original_size, proxy_size, upload_seconds):
+    """Logs the bytes and the estimated upload time saved by sending a proxy."""
+    bytes_saved = original_size - proxy_size
+    message = f"Proxy for '{filename}' saved {bytes_saved / (1024 * 1024):.1f} MB"
+    if upload_seconds > 0 and proxy_size > 0:
+        seconds_saved = bytes_saved / (proxy_size / upload_seconds)
+        message += f" and about {seconds_saved:.0f}s of upload time"
+    print(message + ".")
+
 
-    return response.text
+def _encode_proxy(make_proxy, filename):
+    """Returns the path of a freshly encoded proxy, or None if encoding failed."""
+    try:
+        return make_proxy()
+    except Exception as e:
+        print(f"Proxy encoding failed for '{filename}', uploading the original: {e}")
+        return None
+
+
+def _encode_in(proxy_executor, video_path, proxy_dir):
+    """Encodes a proxy on the proxy workers, which limit how many encodes run at once."""
+    return proxy_executor.submit(proxy_encoder.create_proxy, video_path, proxy_dir).result()
+
+
+def _resumable_description(job):
+    """
+    Returns the description a ledger job records as written for this version
+    of the video, or None if it has to be described. Only incremental runs
+    pick descriptions up again; other runs describe every video anew.
+    """
+    if not config.INCREMENTAL_MODE or job is None or job["state"] != job_ledger.DESCRIBED:
+        return None
+    description_path = job["description_path"]
+    if not description_path or not os.path.exists(description_path):
+        return None
+    if config.GENERATE_METADATA and not os.path.exists(media_catalog.metadata_path_for(job["path"])):
+        return None
+    return description_path
 
 
-def process_videos(directory, on_complete):
+def process_single_video(video_path, rate_limiter=None, make_proxy=None):
+    """
+    Generates the description for one video and saves it next to the video.
+    With config.GENERATE_METADATA, the suggested title, tags and category
+    from the same request are saved next to it as JSON.
+
+    A video the job ledger records as described, or as uploaded to the AI
+    service, carries on from that step instead of starting over (see
+    _resumable_description and ai_files.AIFileStore).
+
+    Args:
+        video_path (str): The full path to the video file.
+        rate_limiter (RateLimiter): Optional limiter shared by all workers.
+        make_proxy (callable): Optional proxy encoder for the video, see
+            generate_description. It is not called when the description is
+            cached or an earlier upload to the AI service is reused.
+
+    Returns:
+        str: The full path of the written description file.
+
+    Raises:
+        media_probe.BrokenVideoError: With config.PROBE_MEDIA, if the
+            video's headers show it is truncated or corrupt. Nothing is
+            uploaded in that case.
+    """
+    ledger = job_ledger.get_shared_ledger()
+    if ledger:
+        stat = os.stat(video_path)
+        job = ledger.get(video_path, stat)
+        description_filename = _resumable_description(job)
+        if description_filename:
+            print(f"'{os.path.basename(video_path)}' was already described before the last run stopped.")
+            metrics.increment("resumed")
+            return description_filename
+        # An earlier upload to the AI service is picked up again by generate_description
+        if job is None or job["state"] != job_ledger.AI_UPLOADED:
+            ledger.record(video_path, job_ledger.QUEUED, stat)
+
+    if config.PROBE_MEDIA:
+        try:
+            media_probe.ensure_intact(video_path)
+        except media_probe.BrokenVideoError as e:
+            if ledger:
+                ledger.record(video_path, job_ledger.FAILED, error=str(e))
+            raise
+
+    try:
+        # The slot limits how many videos are in progress while Gemini pushes back
+        with _gemini_guard().slot(), metrics.timer("describe"):
+            result = generate_description(video_path, rate_limiter, make_proxy, structured=config.GENERATE_METADATA)
+    except Exception as e:
+        if ledger:
+            ledger.record(video_path, job_ledger.FAILED, error=str(e))
+        raise
+
+    description_text = result
+    if config.GENERATE_METADATA:
+        # Written before the description, whose presence marks the video as done
+        description_text = result["description"]
+        with open(media_catalog.metadata_path_for(video_path), "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
+
+    # Save the description to a text file
+    description_filename = media_catalog.description_path_for(video_path)
+    with open(description_filename, "w", encoding="utf-8") as f:
+        f.write(description_text)
+    if ledger:
+        ledger.record(video_path, job_ledger.DESCRIBED, description_path=description_filename)
+
+    print(f"Successfully created description: '{os.path.basename(description_filename)}'")
+    return description_filename
+
+
+def process_videos(directory, on_complete, on_file_done=None, on_file_skipped=None, stop_event=None):
     """
     Orchestrates the video processing workflow.
+
+    Up to config.MAX_CONCURRENT_JOBS videos are uploaded, processed and
+    described at the same time. Requests to the AI service from all workers
+    share one rate limiter of config.AI_REQUESTS_PER_MINUTE. When Gemini
+    answers with 429/5xx errors or slows down, fewer videos are worked on at
+    once, and during a sustained outage calls pause until it recovers. A
+    video that failed because of such an error is retried up to
+    config.MAX_SERVICE_RETRIES times.
+
+    With config.INCREMENTAL_MODE, videos whose size and modification time
+    match the directory manifest and that already have a description are
+    skipped.
+
+    With config.PROBE_MEDIA, videos whose headers show they are truncated or
+    corrupt are reported as failed without being uploaded, and the ETA is
+    weighted by video duration. config.PROCESS_ORDER can put the shortest
+    or longest videos first.
+
+    With config.AI_BUDGET_USD or config.AI_TOKEN_BUDGET, videos are started
+    one at a time once most of the budget is used, and a video whose
+    estimated usage would go over it waits for the daily reset or ends the
+    run (see config.AI_BUDGET_PERIOD). A video estimated to need more than
+    the whole budget is reported as failed without being uploaded.
+
+    Setting stop_event stops handing out videos, including during a wait
+    for the budget reset; videos already in progress are finished.
+
+    on_file_done, if given, is called with the video path and description
+    path as each description is written. on_file_skipped is called the same
+    way for each video skipped in incremental mode because it is already
+    described. Both run on the thread that hands out work, so a blocking
+    callback holds back new submissions.
+
+    Returns:
+        dict: Summary of the run with the keys "described", "skipped",
+            "failed" (list of video paths), "stopped", "error" and "usage"
+            (the run's Gemini tokens and cost, see UsageLedger.totals).
     """
+    with metrics.run("generate"):
+        return _process_videos(directory, on_complete, on_file_done, on_file_skipped, stop_event)
+
+
+def _process_videos(directory, on_complete, on_file_done, on_file_skipped, stop_event):
+    summary = {"described": 0, "skipped": 0, "failed": [], "stopped": False, "error": None, "usage": None}
+
     if not configure_ai_service():
+        summary["error"] = "AI service is not configured."
         on_complete()
-        return
+        return summary
+    cleanup_orphaned_ai_files()
 
-    video_files = get_video_files(directory)
+    # Videos are handed out as the catalog finds them, so work starts before
+    # a large tree has been fully scanned.
+    print(f"\nScanning for video files in '{os.path.abspath(directory)}'...")
+    entries = media_catalog.iter_videos(directory)
 
-    if not video_files:
-        print("No video files to process.")
-        on_complete()
-        return
+    manifest = None
+    if config.INCREMENTAL_MODE:
+        manifest = Manifest(directory)
+        on_skipped = None
+        if on_file_skipped:
+            on_skipped = lambda entry: on_file_skipped(entry.path, entry.description_path)
+        entries = manifest.filter(entries, on_skipped)
 
+    if config.PROBE_MEDIA and config.PROCESS_ORDER in ("shortest", "longest"):
+        # Ordering needs the whole catalog, so this gives up starting work during the scan
+        entries = iter(media_probe.order_by_duration(list(entries), lambda entry: entry.path,
+                                                     longest_first=config.PROCESS_ORDER == "longest"))
+
+    proxy_executor = None
+    proxy_dir = None
+    if config.USE_PROXY:
+        if proxy_encoder.encoder_available():
+            proxy_dir = tempfile.mkdtemp(prefix="yt_ai_proxies_")
+            proxy_executor = ThreadPoolExecutor(max_workers=max(1, config.PROXY_WORKERS))
+        else:
+            print(f"Proxy encoder '{config.PROXY_ENCODER_COMMAND[0]}' not found, uploading original files.")
+
+    def proxy_for(video_path):
+        # Encoded only once the worker knows the video has to be uploaded
+        if proxy_executor is None:
+            return None
+        return functools.partial(_encode_in, proxy_executor, video_path, proxy_dir)
+
+    max_workers = max(1, config.MAX_CONCURRENT_JOBS)
+    rate_limiter = RateLimiter(config.AI_REQUESTS_PER_MINUTE / 60.0, capacity=max_workers)
+    usage = usage_ledger.get_shared_ledger()
+    run_id = usage_ledger.start_run("generate")
+    budget = usage_ledger.BudgetGovernor(usage, run_id)
     consecutive_error_count = 0
+    submitted_count = 0
+    # Seconds of video submitted and per video, for a duration-weighted ETA
+    expected_seconds = 0.0
+    durations = {}
+    stopped = False
+    # Videos that failed because Gemini pushed back are tried again; the
+    # circuit breaker holds them during an outage instead of ending the run.
+    retry_paths = []
+    service_retries = {}
 
-    for video_path in video_files:
-        try:
-            description_text = generate_description(video_path)
-
-            # Save the description to a text file
-            description_filename = os.path.splitext(video_path)[0] + ".txt"
-            with open(description_filename, "w", encoding="utf-8") as f:
-                f.write(description_text)
-
-            print(f"Successfully created description: '{os.path.basename(description_filename)}'")
-            # Reset error count on success
-            consecutive_error_count = 0
-
-        except Exception as e:
-            print(f"--- ERROR: Failed to process file '{os.path.basename(video_path)}' ---")
-            print(f"Issue: {e}")
-            print("-------------------------------------------------------------------")
-            consecutive_error_count += 1
-            if consecutive_error_count > config.MAX_CONSECUTIVE_ERRORS:
-                print(f"\nCRITICAL: Reached {consecutive_error_count} consecutive errors.")
-                print("Stopping process to prevent further issues.")
+    def reject(video_path, problem, stat=None):
+        # Rejected before any upload, and not counted as a run of errors
+        print(f"Skipping '{os.path.basename(video_path)}' because {problem}.")
+        if manifest:
+            manifest.mark_failed(video_path, problem)
+            manifest.save()
+        ledger = job_ledger.get_shared_ledger()
+        if ledger:
+            ledger.record(video_path, job_ledger.FAILED, stat, error=problem)
+        summary["failed"].append(video_path)
+        metrics.increment("rejected")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+
+        while True:
+            # Keep the pool full until we run out of files or have to stop
+            while not stopped and len(in_flight) < max_workers:
+                if stop_event is not None and stop_event.is_set():
+                    print("Stopping description generation.")
+                    stopped = True
+                    summary["stopped"] = True
+                    break
+                # Close to the budget, one video at a time so the estimates can catch up
+                if in_flight and budget.slowed():
+                    break
+                if retry_paths:
+                    # The earlier upload is reused if it can be, otherwise a proxy is encoded as before
+                    video_path = retry_paths[0]
+                    estimate = budget.estimate(durations.get(video_path))
+                    if budget.exceeds_budget(estimate):
+                        reject(retry_paths.pop(0), OVER_BUDGET_PROBLEM)
+                        continue
+                    if not budget.can_start(estimate):
+                        if in_flight:
+                            break
+                        if budget.wait_for_reset(stop_event):
+                            continue
+                        stopped = True
+                        summary["stopped"] = True
+                        break
+                    retry_paths.pop(0)
+                    budget.reserve(video_path, estimate)
+                    future = executor.submit(process_single_video, video_path, rate_limiter, proxy_for(video_path))
+                    in_flight[future] = video_path
+                    continue
+                entry = next(entries, None)
+                if entry is None:
+                    # The whole catalog has been seen, so the total is known
+                    weighted = config.PROBE_MEDIA and len(durations) == submitted_count
+                    metrics.set_expected("processed", submitted_count, expected_seconds if weighted else None)
+                    break
+                video_path = entry.path
+                if config.PROBE_MEDIA:
+                    probe = media_probe.probe(video_path)
+                    if not probe.ok:
+                        reject(video_path, probe.problem, entry.stat())
+                        continue
+                estimate = budget.estimate(probe.duration if config.PROBE_MEDIA else None)
+                if budget.exceeds_budget(estimate):
+                    # It would never fit, so waiting for the reset would only hold up the videos after it
+                    reject(video_path, OVER_BUDGET_PROBLEM, entry.stat())
+                    continue
+                if not budget.can_start(estimate):
+                    # Put the video back; finishing jobs or the daily reset may make room for it
+                    entries = itertools.chain([entry], entries)
+                    if in_flight:
+                        break
+                    if budget.wait_for_reset(stop_event):
+                        continue
+                    stopped = True
+                    summary["stopped"] = True
+                    break
+                budget.reserve(video_path, estimate)
+                if config.PROBE_MEDIA and probe.duration:
+                    durations[video_path] = probe.duration
+                    expected_seconds += probe.duration
+                submitted_count += 1
+                future = executor.submit(process_single_video, video_path, rate_limiter, proxy_for(video_path))
+                in_flight[future] = video_path
+
+            if not in_flight:
                 break
 
-        # A small delay to respect API rate limits
-        time.sleep(2)
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                video_path = in_flight.pop(future)
+                budget.release(video_path)
+                try:
+                    description_filename = future.result()
+                    if manifest:
+                        manifest.mark_described(video_path, description_filename)
+                        manifest.save()
+                    if on_file_done:
+                        on_file_done(video_path, description_filename)
+                    summary["described"] += 1
+                    metrics.increment("described")
+                    metrics.increment("processed")
+                    metrics.add_work("processed", durations.get(video_path, 0))
+                    # Reset error count on success
+                    consecutive_error_count = 0
+
+                except Exception as e:
+                    if (backpressure.classify(e) is not None and not stopped
+                            and service_retries.get(video_path, 0) < config.MAX_SERVICE_RETRIES):
+                        # Failures while the breaker holds an outage do not use up the retries
+                        if not _gemini_guard().breaker.is_open():
+                            service_retries[video_path] = service_retries.get(video_path, 0) + 1
+                        print(f"Gemini pushed back on '{os.path.basename(video_path)}' ({e}). It will be retried.")
+                        retry_paths.append(video_path)
+                        continue
+                    print(f"--- ERROR: Failed to process file '{os.path.basename(video_path)}' ---")
+                    print(f"Issue: {e}")
+                    print("-------------------------------------------------------------------")
+                    if manifest:
+                        manifest.mark_failed(video_path, e)
+                        manifest.save()
+                    summary["failed"].append(video_path)
+                    metrics.increment("describe_failed")
+                    metrics.increment("processed")
+                    metrics.add_work("processed", durations.get(video_path, 0))
+                    consecutive_error_count += 1
+                    if consecutive_error_count > config.MAX_CONSECUTIVE_ERRORS and not stopped:
+                        print(f"\nCRITICAL: Reached {consecutive_error_count} consecutive errors.")
+                        print("Stopping process to prevent further issues.")
+                        stopped = True
+                        summary["stopped"] = True
+
+    # Retries still waiting when the run was stopped
+    summary["failed"].extend(retry_paths)
+
+    if usage:
+        summary["usage"] = usage.totals(run_id=run_id)
+        usage_ledger.report(usage, run_id)
+
+    if proxy_executor:
+        proxy_executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(proxy_dir, ignore_errors=True)
+
+    if manifest:
+        summary["skipped"] = manifest.skipped_count
+        manifest.save()
+        if summary["skipped"]:
+            print(f"Skipped {summary['skipped']} unchanged video(s) that already have descriptions.")
+
+    if not submitted_count and not summary["failed"]:
+        print("No video files to process.")
 
     print("\nProcessing finished.")
     on_complete()
+    return summary
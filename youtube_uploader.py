@@ -1,42 +1,128 @@
 import os
-import sys
+import json
 import time
 import random
 import re
+import argparse
+import threading
+import collections
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import httplib2
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 from oauth2client.client import flow_from_clientsecrets
 from oauth2client.file import Storage
 from oauth2client.tools import argparser, run_flow
 import config
+from rate_limiter import RateLimiter
+from metrics import metrics
+import backpressure
+from upload_sessions import UploadSessionStore
+from quota_scheduler import QuotaTracker, order_upload_queue, queue_needs_ordering
+import media_catalog
+import media_probe
+import upload_profiles
+import job_ledger
+import client_sessions
 
-def get_authenticated_service(args):
-    flow = flow_from_clientsecrets(config.CLIENT_SECRETS_FILE,
+# Upload options layered on top of the oauth2client flags. Built once, since
+# adding the same arguments to a parser twice raises an error.
+upload_argparser = argparse.ArgumentParser(parents=[argparser])
+upload_argparser.add_argument("--category", default="22",
+                              help="Numeric video category. " +
+                                   "See https://developers.google.com/youtube/v3/docs/videoCategories/list")
+upload_argparser.add_argument("--keywords", help="Video keywords, comma separated",
+                              default="")
+upload_argparser.add_argument("--privacyStatus", choices=config.VALID_PRIVACY_STATUSES,
+                              default=config.VALID_PRIVACY_STATUSES[0], help="Video privacy status.")
+
+def parse_upload_args(argv=None):
+    args, _ = upload_argparser.parse_known_args(argv)
+    return args
+
+def get_credentials(args, profile=None):
+    profile = profile or upload_profiles.default_profile()
+    flow = flow_from_clientsecrets(profile.client_secrets_file,
                                    scope=config.YOUTUBE_UPLOAD_SCOPE,
                                    message=config.MISSING_CLIENT_SECRETS_MESSAGE)
 
-    storage = Storage("%s-oauth2.json" % sys.argv[0])
+    storage = Storage(profile.token_file)
     credentials = storage.get()
 
     if credentials is None or credentials.invalid:
         credentials = run_flow(flow, storage, args)
 
-    return build(config.YOUTUBE_API_SERVICE_NAME, config.YOUTUBE_API_VERSION,
-                 http=credentials.authorize(httplib2.Http()))
+    return credentials
+
+def build_service(credentials):
+    http = credentials.authorize(httplib2.Http())
+    # The parsed discovery document is shared, so a new service costs no file or network reads
+    document = client_sessions.discovery_document(config.YOUTUBE_API_SERVICE_NAME, config.YOUTUBE_API_VERSION)
+    if document is None:
+        return build(config.YOUTUBE_API_SERVICE_NAME, config.YOUTUBE_API_VERSION, http=http)
+    return build_from_document(document, http=http)
+
+def get_authenticated_service(args):
+    return build_service(get_credentials(args))
+
+def authorize_profiles(args):
+    """
+    Loads the upload profiles and authorizes each of them, so any browser
+    prompt appears before uploads start. Credentials are kept for later
+    runs and refreshed before they expire.
+
+    Returns:
+        list: The UploadProfile objects with their credentials set.
+    """
+    profiles = upload_profiles.load_profiles()
+    for profile in profiles:
+        if len(profiles) > 1:
+            print("Authorizing upload profile '%s'..." % profile.name)
+        profile.credentials = client_sessions.credentials_for(
+            profile.token_file, functools.partial(get_credentials, args, profile))
+    return profiles
 
-def initialize_upload(youtube, options):
+class AdaptiveMediaFileUpload(MediaFileUpload):
+    """
+    A resumable MediaFileUpload whose chunk size follows the measured
+    throughput, aiming for each chunk to take about
+    config.UPLOAD_CHUNK_TARGET_SECONDS. Chunk sizes stay multiples of 256 KB
+    as the resumable protocol requires.
+    """
+    CHUNK_ALIGNMENT = 256 * 1024
+
+    def __init__(self, filename):
+        super().__init__(filename, chunksize=config.UPLOAD_CHUNK_SIZE, resumable=True)
+        self._current_chunksize = config.UPLOAD_CHUNK_SIZE
+
+    def chunksize(self):
+        return self._current_chunksize
+
+    def record_chunk(self, bytes_sent, seconds):
+        if bytes_sent <= 0 or seconds <= 0:
+            return
+        target = bytes_sent / seconds * config.UPLOAD_CHUNK_TARGET_SECONDS
+        # Grow or shrink by at most a factor of two per chunk
+        target = max(self._current_chunksize / 2, min(target, self._current_chunksize * 2))
+        target = max(config.UPLOAD_MIN_CHUNK_SIZE, min(target, config.UPLOAD_MAX_CHUNK_SIZE))
+        self._current_chunksize = max(self.CHUNK_ALIGNMENT,
+                                      int(target) // self.CHUNK_ALIGNMENT * self.CHUNK_ALIGNMENT)
+
+def initialize_upload(youtube, options, bandwidth_limiter=None, session_store=None, guard=None):
     tags = None
-    if options.keywords:
-        tags = options.keywords.split(",")
+    if options.keywords or options.tags:
+        # --keywords come first, and the combined list is kept within YouTube's limit
+        keywords = options.keywords.split(",") if options.keywords else []
+        tags = media_catalog.limit_tags(keywords + list(options.tags))
 
     body=dict(
         snippet=dict(
             title=options.title,
             description=options.description,
             tags=tags,
-            categoryId=24
+            categoryId=options.category_id or config.DEFAULT_VIDEO_CATEGORY
         ),
         status=dict(
             privacyStatus="private",
@@ -44,45 +130,81 @@ def initialize_upload(youtube, options):
         )
     )
 
+    media_body = AdaptiveMediaFileUpload(options.file)
+
     # Call the API's videos.insert method to create and upload the video.
     insert_request = youtube.videos().insert(
         part=",".join(body.keys()),
         body=body,
-        # The chunksize parameter specifies the size of each chunk of data, in
-        # bytes, that will be uploaded at a time. Set a higher value for
-        # reliable connections as fewer chunks lead to faster uploads. Set a lower
-        # value for better recovery on less reliable connections.
-        #
-        # Setting "chunksize" equal to -1 in the code below means that the entire
-        # file will be uploaded in a single HTTP request. (If the upload fails,
-        # it will still be retried where it left off.) This is usually a best
-        # practice, but if you're using Python older than 2.6 or if you're
-        # running on App Engine, you should set the chunksize to something like
-        # 1024 * 1024 (1 megabyte).
-        media_body=MediaFileUpload(options.file, chunksize=-1, resumable=True)
+        # The file is sent in chunks whose size adapts to the measured
+        # throughput. Memory use is bounded by the chunk size, and after each
+        # chunk the confirmed offset is saved so that a crash or reboot can
+        # resume the upload where it left off.
+        media_body=media_body
     )
 
-    return resumable_upload(insert_request)
+    owner = getattr(options, "upload_profile", None)
+    resumed_session = session_store.get(options.file, owner) if session_store else None
+    if resumed_session is not None:
+        uri, offset = resumed_session
+        print("Resuming upload of '%s' from byte %d." % (os.path.basename(options.file), offset))
+        insert_request.resumable_uri = uri
+        insert_request.resumable_progress = offset
+        # Makes the next call ask the server for the offset it actually holds
+        # before sending any data.
+        insert_request._in_error_state = True
+
+    try:
+        with metrics.timer("yt_upload"):
+            return resumable_upload(insert_request, bandwidth_limiter, session_store, options.file, guard, owner)
+    except HttpError as e:
+        if resumed_session is not None and e.resp.status in (404, 410):
+            print("Saved upload session for '%s' has expired. Starting over." % os.path.basename(options.file))
+            session_store.clear(options.file)
+            return initialize_upload(youtube, options, bandwidth_limiter, session_store, guard)
+        raise
 
 # This method implements an exponential backoff strategy to resume a
 # failed upload.
-def resumable_upload(insert_request):
+def resumable_upload(insert_request, bandwidth_limiter=None, session_store=None, video_path=None, guard=None,
+                     session_owner=None):
+    guard = guard or backpressure.get_guard("YouTube")
     response = None
-    error = None
     retry = 0
+    media = insert_request.resumable
     while response is None:
+        error = None
         try:
-            print("Uploading file...")
-            status, response = insert_request.next_chunk()
+            chunk_size = media.chunksize()
+            if bandwidth_limiter:
+                bandwidth_limiter.acquire(chunk_size)
+            offset_before = insert_request.resumable_progress
+            chunk_started = time.monotonic()
+            with guard.call():
+                status, response = insert_request.next_chunk()
+            chunk_seconds = time.monotonic() - chunk_started
+            # The final chunk leaves resumable_progress untouched, so use the file size
+            offset_after = media.size() if response is not None else insert_request.resumable_progress
+            metrics.record("yt_chunk", chunk_seconds)
+            metrics.add_bytes("yt_uploaded", max(0, offset_after - offset_before))
+            if isinstance(media, AdaptiveMediaFileUpload):
+                media.record_chunk(offset_after - offset_before, chunk_seconds)
             if response is not None:
+                if session_store:
+                    session_store.clear(video_path)
                 if 'id' in response:
                     print("Video id '%s' was successfully uploaded." % response['id'])
-                    return True
+                    return response['id']
                 else:
                     print("The upload failed with an unexpected response: %s" % response)
                     return False
+            if status is not None:
+                print("Uploaded %d%% of '%s'." % (int(status.progress() * 100), os.path.basename(video_path or "file")))
+            if session_store and insert_request.resumable_uri:
+                session_store.save(video_path, insert_request.resumable_uri, insert_request.resumable_progress,
+                                   session_owner)
         except HttpError as e:
-            if e.resp.status in config.RETRIABLE_STATUS_CODES:
+            if backpressure.classify(e) == backpressure.THROTTLED:
                 error = "A retriable HTTP error %d occurred:\n%s" % (e.resp.status,
                                                                      e.content)
             else:
@@ -92,6 +214,10 @@ def resumable_upload(insert_request):
 
         if error is not None:
             print(error)
+            metrics.increment("yt_retries")
+            if guard.breaker.is_open():
+                # The next chunk waits out the outage, which does not use up a retry
+                continue
             retry += 1
             if retry > config.MAX_RETRIES:
                 print("No longer attempting to retry.")
@@ -100,65 +226,436 @@ def resumable_upload(insert_request):
             max_sleep = 2 ** retry
             sleep_seconds = random.random() * max_sleep
             print("Sleeping %f seconds and then retrying..." % sleep_seconds)
-            time.sleep(sleep_seconds)
+            with metrics.timer("yt_retry_sleep"):
+                time.sleep(sleep_seconds)
     return False
 
-def start_yt_upload(directory, on_complete):
-    argparser.add_argument("--category", default="22",
-                           help="Numeric video category. " +
-                                "See https://developers.google.com/youtube/v3/docs/videoCategories/list")
-    argparser.add_argument("--keywords", help="Video keywords, comma separated",
-                           default="")
-    argparser.add_argument("--privacyStatus", choices=config.VALID_PRIVACY_STATUSES,
-                           default=config.VALID_PRIVACY_STATUSES[0], help="Video privacy status.")
-    args = argparser.parse_args()
+def _format_title(filename):
+    # Format the title by replacing periods with spaces and wrapping a trailing year in parentheses
+    title = os.path.splitext(filename)[0]
+    title = title.replace('.', ' ')
+    return re.sub(r' (\d{4})$', r' (\1)', title)
 
-    youtube = get_authenticated_service(args)
+def _read_metadata(metadata_path):
+    """Reads the generated title, tags and category, or returns an empty dict."""
+    if not os.path.exists(metadata_path):
+        return {}
+    try:
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print("Could not read '%s', using the title from the filename: %s" % (os.path.basename(metadata_path), e))
+        return {}
 
-    uploaded_dir = os.path.join(directory, "Uploaded")
-    os.makedirs(uploaded_dir, exist_ok=True)
+def build_upload_options(args, video_path, profiles=None):
+    """
+    Builds a separate options namespace for one file so workers never share
+    state. The description comes from the .txt file next to the video, and
+    the title, tags and category from the generated .json file if there is
+    one. Without it the title is taken from the filename. If the video is
+    mapped to one of the upload `profiles`, only that profile uploads it.
+    """
+    filename = os.path.basename(video_path)
+    description_path = media_catalog.description_path_for(video_path)
+    metadata_path = media_catalog.metadata_path_for(video_path)
 
-    for filename in os.listdir(directory):
-        if filename.endswith(".mp4"):
-            video_path = os.path.join(directory, filename)
+    description = ""
+    if os.path.exists(description_path):
+        with open(description_path, "r", encoding="utf-8") as f:
+            description = f.read()
+    metadata = _read_metadata(metadata_path)
 
-            # Format the title by replacing periods with spaces and wrapping a trailing year in parentheses
-            title = os.path.splitext(filename)[0]
-            title = title.replace('.', ' ')
-            title = re.sub(r' (\d{4})$', r' (\1)', title)
+    options = argparse.Namespace(**vars(args))
+    options.file = video_path
+    options.title = metadata.get("title") or _format_title(filename)
+    options.description = description
+    options.description_path = description_path
+    options.metadata_path = metadata_path
+    options.tags = metadata.get("tags") or []
+    options.category_id = metadata.get("category_id")
+    options.profile = upload_profiles.profile_for(profiles, video_path) if profiles else None
+    return options
 
-            description_filename = filename.replace(".mp4", ".txt")
-            description_path = os.path.join(directory, description_filename)
+def _move_to_uploaded(options):
+    """Moves the video and its description into Uploaded. Returns the new video path, or None on failure."""
+    print("Upload of '%s' successful. Moving files..." % os.path.basename(options.file))
+    try:
+        uploaded_dir = os.path.join(os.path.dirname(options.file), "Uploaded")
+        os.makedirs(uploaded_dir, exist_ok=True)
+        moved_path = os.path.join(uploaded_dir, os.path.basename(options.file))
+        os.rename(options.file, moved_path)
 
-            description = ""
-            if os.path.exists(description_path):
-                with open(description_path, "r", encoding="utf-8") as f:
-                    description = f.read()
+        for path in (options.description_path, options.metadata_path):
+            if os.path.exists(path):
+                os.rename(path, os.path.join(uploaded_dir, os.path.basename(path)))
+        return moved_path
+    except IOError as e:
+        print("An IO error occurred. Upload succeeded but file movement failed. Continuing: %s" % e)
+        return None
 
-            # Add file-specific details to the args object
-            args.file = video_path
-            args.title = title
-            args.description = description
+def _previous_upload(ledger, video_path):
+    """
+    Returns the video ID of an earlier upload of this exact file that was
+    never moved into Uploaded, or None.
+    """
+    if ledger is None:
+        return None
+    try:
+        job = ledger.get(video_path, os.stat(video_path))
+    except OSError:
+        return None
+    if job and job["video_id"] and job["state"] != job_ledger.MOVED:
+        return job["video_id"]
+    return None
 
-            upload_successful = False
-            try:
-                upload_successful = initialize_upload(youtube, args)
-            except HttpError as e:
-                print("An HTTP error %d occurred:\n%s" % (e.resp.status, e.content))
-                if "quota" in e.content.decode('utf-8'):
-                    print("Quota exceeded. Quitting uploads.")
+class UploadQueue(object):
+    """
+    Thread-safe queue of upload jobs shared by the upload workers.
+
+    put() blocks while the queue holds maxsize jobs, which gives a producer
+    such as the generate-then-upload pipeline back-pressure. get() blocks
+    until a job arrives, and returns None once the queue is closed and empty
+    or the uploads were cancelled. Jobs whose `profile` is set are only
+    handed to workers of that upload profile.
+    """
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self._jobs = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._discarded_profiles = set()
+        self.cancelled = threading.Event()
+
+    def put(self, options):
+        """Adds a job. Returns False if the uploads were cancelled."""
+        with self._condition:
+            while self.maxsize and len(self._jobs) >= self.maxsize and not self.cancelled.is_set():
+                self._condition.wait()
+            if self.cancelled.is_set():
+                return False
+            if getattr(options, "profile", None) in self._discarded_profiles:
+                return True
+            self._jobs.append(options)
+            self._condition.notify_all()
+            return True
+
+    def requeue(self, options):
+        """Puts a job back at the front of the queue, ignoring maxsize."""
+        with self._condition:
+            self._jobs.appendleft(options)
+            self._condition.notify_all()
+
+    def _take(self, profile):
+        for index, options in enumerate(self._jobs):
+            pinned = getattr(options, "profile", None)
+            if profile is None or pinned is None or pinned == profile:
+                del self._jobs[index]
+                return options
+        return None
+
+    def get(self, profile=None):
+        """Returns the next job the given upload profile may take, or None once there are no more."""
+        with self._condition:
+            while True:
+                if self.cancelled.is_set():
+                    return None
+                options = self._take(profile)
+                if options is not None:
+                    self._condition.notify_all()
+                    return options
+                if self._closed:
+                    return None
+                self._condition.wait()
+
+    def wait_for_work(self, profile, timeout):
+        """
+        Waits up to `timeout` seconds, waking early when the queue changes.
+        Returns False once the uploads were cancelled, or the queue is
+        closed and holds no job the given profile may take.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self.cancelled.is_set():
+                    return False
+                if self._closed and not any(getattr(options, "profile", None) in (None, profile)
+                                            for options in self._jobs):
+                    return False
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._condition.wait(remaining)
+
+    def discard(self, profile):
+        """
+        Drops the jobs mapped to a profile that has stopped, now and when
+        they are added later. Returns how many were dropped.
+        """
+        with self._condition:
+            self._discarded_profiles.add(profile)
+            kept = [options for options in self._jobs if getattr(options, "profile", None) != profile]
+            dropped = len(self._jobs) - len(kept)
+            self._jobs = collections.deque(kept)
+            self._condition.notify_all()
+            return dropped
+
+    def close(self):
+        """Signals that no more jobs will be added."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def cancel(self):
+        """Stops the workers and releases any blocked producers."""
+        with self._condition:
+            self.cancelled.set()
+            self._condition.notify_all()
+
+def run_upload_workers(upload_queue, directory, profiles, on_uploaded=None):
+    """
+    Uploads jobs from the queue until the queue is closed and drained. Each
+    upload profile (see upload_profiles) runs its own workers, up to the
+    profile's "workers" setting, and each worker has its own authorized HTTP
+    transport. Workers pull the next job they may take, so videos mapped to
+    a profile go to that profile and the rest are spread over the profiles
+    that still have quota. When config.UPLOAD_BANDWIDTH_LIMIT_MBPS is set,
+    all workers together stay under that total bandwidth.
+
+    Quota units spent by videos.insert are tracked against each profile's
+    daily budget. When a profile's budget runs out, its workers sleep until
+    the daily reset and continue the queue, or stop once the queue is closed
+    and no job is left that the profile may take, unless
+    config.QUOTA_WAIT_FOR_RESET is off, in which case that profile stops and
+    the queue is cancelled once no profile is left.
+
+    on_uploaded, if given, is called with the video path and the new video
+    ID after each successful upload.
+
+    Fewer uploads run at once while YouTube answers with 429/5xx errors,
+    and during a sustained outage they pause until it recovers.
+
+    With config.USE_JOB_LEDGER, every upload is recorded with its video ID
+    before the files are moved. A video whose earlier upload was recorded
+    but never moved, for example after a crash, is moved without being
+    uploaded again.
+
+    With config.PROBE_MEDIA, videos whose headers show they are truncated
+    or corrupt are reported as failed without spending quota.
+
+    Args:
+        upload_queue (UploadQueue): The jobs to upload.
+        directory (str): The directory holding the videos.
+        profiles (list): Authorized UploadProfile objects, as returned by
+            authorize_profiles.
+        on_uploaded (callable): See above.
+
+    Returns:
+        dict: Summary with the keys "uploaded", "failed" (list of video
+            paths) and "stopped".
+    """
+    summary = {"uploaded": 0, "failed": [], "stopped": False}
+    summary_lock = threading.Lock()
+
+    bandwidth_limiter = None
+    if config.UPLOAD_BANDWIDTH_LIMIT_MBPS > 0:
+        bytes_per_second = config.UPLOAD_BANDWIDTH_LIMIT_MBPS * 1000 * 1000 / 8
+        bandwidth_limiter = RateLimiter(bytes_per_second, capacity=config.UPLOAD_CHUNK_SIZE)
+
+    session_store = UploadSessionStore(directory)
+    ledger = job_ledger.get_shared_ledger()
+    if ledger:
+        ledger.recover(directory)
+
+    quotas = {}
+    for profile in profiles:
+        quotas[profile.name] = QuotaTracker(profile.daily_quota, profile.quota_state_file)
+        print("%s quota remaining today: %d of %d units."
+              % (profile.label, quotas[profile.name].remaining(), profile.daily_quota))
+    stopped_profiles = set()
+    active_profiles = {profile.name for profile in profiles}
+
+    def quota_exhausted(profile):
+        """
+        Waits for the profile's quota reset, or stops the profile if waiting
+        is disabled. Returns False if the profile's workers should exit.
+        """
+        if config.QUOTA_WAIT_FOR_RESET:
+            # Only wait while the queue may still hold work for this profile;
+            # once it is closed and the other profiles have taken the rest, stop.
+            wait = functools.partial(upload_queue.wait_for_work, profile.name)
+            if wait(0) and quotas[profile.name].wait_for_reset(upload_queue.cancelled, profile.label, wait):
+                return True
+            if not upload_queue.cancelled.is_set():
+                print("%s quota exhausted and nothing left for it to upload. Stopping its workers." % profile.label)
+            return False
+        with summary_lock:
+            newly_stopped = profile.name not in stopped_profiles
+            stopped_profiles.add(profile.name)
+            all_stopped = stopped_profiles >= active_profiles
+        if newly_stopped:
+            dropped = upload_queue.discard(profile.name)
+            print("%s quota exceeded. Quitting uploads for this profile%s."
+                  % (profile.label, " and skipping %d video(s) mapped to it" % dropped if dropped else ""))
+        if all_stopped:
+            if not upload_queue.cancelled.is_set():
+                print("Quota exceeded. Quitting uploads.")
+            upload_queue.cancel()
+        return False
+
+    def take_job(profile):
+        """Returns the next job for the profile, leaving those whose resumable session belongs to another one."""
+        while True:
+            options = upload_queue.get(profile.name)
+            if options is None:
+                return None
+            owner = session_store.owner(options.file)
+            if (getattr(options, "profile", None) is None and owner and owner != profile.name
+                    and owner in active_profiles and owner not in stopped_profiles):
+                # The session can only be resumed with the credentials that started it
+                options.profile = owner
+                upload_queue.requeue(options)
+                continue
+            return options
+
+    def upload_worker(profile, guard, pool):
+        quota = quotas[profile.name]
+        youtube = None
+
+        try:
+            while True:
+                options = take_job(profile)
+                if options is None:
                     return
+                options.upload_profile = profile.name
+                error = "YouTube upload failed"
+
+                # A crash between the upload and the move must not upload the video twice
+                video_id = _previous_upload(ledger, options.file)
+                probe = media_probe.probe(options.file) if config.PROBE_MEDIA and not video_id else None
+                if video_id:
+                    print("'%s' was already uploaded as %s. Moving it without uploading again."
+                          % (os.path.basename(options.file), video_id))
+                elif probe is not None and not probe.ok:
+                    error = probe.problem
+                    print("Skipping upload of '%s' because %s." % (os.path.basename(options.file), probe.problem))
+                else:
+                    stat = None
+                    try:
+                        # httplib2.Http is not thread-safe, so every worker holds its own service
+                        if youtube is None:
+                            youtube = pool.checkout()
 
+                        # A resumed upload was already charged when its session started
+                        cost = 0 if session_store.get(options.file, profile.name) else config.VIDEOS_INSERT_QUOTA_COST
+                        if not quota.try_reserve(cost):
+                            upload_queue.requeue(options)
+                            if not quota_exhausted(profile):
+                                return
+                            continue
+
+                        stat = os.stat(options.file) if ledger and os.path.exists(options.file) else None
+                        with guard.slot():
+                            video_id = initialize_upload(youtube, options, bandwidth_limiter, session_store, guard)
+                    except HttpError as e:
+                        print("An HTTP error %d occurred:\n%s" % (e.resp.status, e.content))
+                        if "quota" in e.content.decode('utf-8'):
+                            quota.mark_exhausted()
+                            upload_queue.requeue(options)
+                            if not quota_exhausted(profile):
+                                return
+                            continue
+                    except Exception as e:
+                        error = str(e)
+                        print("An unexpected error occurred while uploading '%s': %s" % (os.path.basename(options.file), e))
+
+                    if video_id and ledger:
+                        ledger.record(options.file, job_ledger.YT_UPLOADED, stat, video_id=video_id,
+                                      description_path=options.description_path)
+
+                if video_id:
+                    moved_path = _move_to_uploaded(options)
+                    if moved_path and ledger:
+                        ledger.record(options.file, job_ledger.MOVED, moved_path=moved_path)
+                    with summary_lock:
+                        summary["uploaded"] += 1
+                    metrics.increment("uploaded")
+                    if on_uploaded:
+                        on_uploaded(options.file, video_id)
+                else:
+                    with summary_lock:
+                        summary["failed"].append(options.file)
+                    metrics.increment("upload_failed")
+                    if ledger:
+                        ledger.record(options.file, job_ledger.FAILED, error=error)
+        finally:
+            # The service and its open connection are kept for the next worker
+            if youtube is not None:
+                pool.checkin(youtube)
+
+    workers = []
+    pools = []
+    for profile in profiles:
+        guard = backpressure.get_guard(profile.label, profile.workers)
+        pool = client_sessions.get_pool(profile.label, functools.partial(build_service, profile.credentials),
+                                        key=id(profile.credentials))
+        pools.append(pool)
+        workers += [(profile, guard, pool)] * profile.workers
+    with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+        for future in [executor.submit(upload_worker, *worker) for worker in workers]:
+            try:
+                future.result()
+            except Exception as e:
+                print("An unexpected error occurred during upload: %s" % e)
+    for pool in pools:
+        if pool.created:
+            print(pool.summary_line())
+
+    summary["stopped"] = upload_queue.cancelled.is_set() or bool(stopped_profiles)
+    return summary
+
+def start_yt_upload(directory, on_complete, args=None, on_uploaded=None):
+    """
+    Uploads every video the media catalog finds in the directory with its
+    description. See run_upload_workers for concurrency, bandwidth and quota
+    handling. Unless the queue has to be reordered, uploads start as soon as
+    the first video is found.
+
+    Args:
+        directory (str): The directory holding the videos.
+        on_complete (callable): Called when the run has finished.
+        args (argparse.Namespace): Upload and OAuth flags. Parsed from the
+            command line if not given.
+        on_uploaded (callable): See run_upload_workers.
+
+    Returns:
+        dict: The summary returned by run_upload_workers.
+    """
+    with metrics.run("upload"):
+        return _start_yt_upload(directory, on_complete, args, on_uploaded)
+
+def _duration_of_entry(entry):
+    return media_probe.probe(entry.path).duration if config.PROBE_MEDIA else None
+
+def _start_yt_upload(directory, on_complete, args, on_uploaded):
+    args = args or parse_upload_args()
+    profiles = authorize_profiles(args)
+
+    upload_queue = UploadQueue()
+
+    def fill_queue():
+        try:
+            entries = media_catalog.iter_videos(directory)
+            if queue_needs_ordering():
+                entries = order_upload_queue(list(entries), lambda entry: (entry.name, entry.size),
+                                             _duration_of_entry)
+            for entry in entries:
+                if not upload_queue.put(build_upload_options(args, entry.path, profiles)):
+                    break
+        finally:
+            upload_queue.close()
 
-            if upload_successful:
-                print("Upload successful. Moving files...")
-                try:
-                    dest_video_path = os.path.join(uploaded_dir, filename)
-                    os.rename(video_path, dest_video_path)
+    threading.Thread(target=fill_queue, daemon=True).start()
 
-                    if os.path.exists(description_path):
-                        dest_description_path = os.path.join(uploaded_dir, description_filename)
-                        os.rename(description_path, dest_description_path)
-                except IOError as e:
-                    print("An IO error occurred. Upload succeeded but file movement failed. Continuing: %s" % e)
+    summary = run_upload_workers(upload_queue, directory, profiles, on_uploaded=on_uploaded)
     on_complete()
+    return summary